@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from typing import List
+import os
 
 
 class Settings(BaseSettings):
@@ -16,17 +17,130 @@ class Settings(BaseSettings):
     
     # Download Settings
     MAX_CONCURRENT_DOWNLOADS: int = 3
+    MAX_CONCURRENT_PER_PLATFORM: int = 2  # Limite por plataforma na fila em lote
     TEMP_DOWNLOAD_PATH: str = "./temp_downloads"
     MAX_FILE_SIZE_MB: int = 500
     
+    # Pools de threads para trabalho bloqueante (yt-dlp, requests, ffmpeg)
+    INFO_WORKERS: int = 8  # Extrações de metadados (/info) simultâneas
+    DOWNLOAD_WORKERS: int = 3  # Downloads completos simultâneos
+    FFMPEG_MAX_JOBS: int = 0  # Processos do ffmpeg simultâneos (0 = número de CPUs disponíveis)
+    FFMPEG_THREADS: int = 0  # Threads por processo do ffmpeg (0 = CPUs divididas entre as vagas)
+    
+    # Cache de metadados (/info)
+    INFO_CACHE_MAX_ENTRIES: int = 1000
+    INFO_CACHE_TTL_SECONDS: int = 600  # URLs assinadas de mídia expiram, não guardar por muito tempo
+    RAW_INFO_CACHE_MAX_ENTRIES: int = 100  # Dicionários completos do yt-dlp (grandes: até centenas de KB)
+    RAW_INFO_CACHE_TTL_SECONDS: int = 300  # Reuso no download dentro da validade das URLs assinadas
+    
+    # Pool de instâncias do yt-dlp para extração (reaproveita extractors e conexões HTTP)
+    YDL_POOL_MAX_IDLE: int = 4  # Instâncias ociosas por perfil (plataforma + opções)
+    YDL_POOL_MAX_USES: int = 200  # Depois disso a instância é recriada (cookies/estado acumulados)
+    YDL_POOL_IDLE_SECONDS: int = 300  # Ociosa por mais tempo: conexões provavelmente já caíram
+    
+    # Inicialização: a porta responde logo e o trabalho pesado roda em segundo plano
+    STARTUP_WARMUP: bool = True  # Importa o yt-dlp, carrega extractors e resolve FFmpeg/cookies depois do startup
+    
+    # Armazenamento persistente dos arquivos baixados (downloads repetidos saem do disco)
+    MEDIA_STORE_PATH: str = ""  # Padrão: {TEMP_DOWNLOAD_PATH}/store
+    MEDIA_STORE_MAX_MB: int = 2048
+    MEDIA_STORE_GRACE_SECONDS: int = 900  # Mantém o arquivo após o envio para permitir retomadas (Range)
+    MEDIA_STORE_INDEX_FLUSH_SECONDS: int = 30  # Acessos (último acesso) vão para o índice em lote neste intervalo
+    
+    # Repasse do arquivo ao cliente enquanto ainda está sendo baixado da origem
+    STREAMING_ENABLED: bool = True
+    STREAM_CHUNK_SIZE: int = 262144  # 256KB
+    
+    # Download direto de URLs de mídia (CDN do TikTok, formatos HTTP progressivos)
+    DIRECT_FETCH_MAX_CONNECTIONS: int = 4  # Intervalos de bytes baixados em paralelo por arquivo
+    DIRECT_FETCH_MIN_SEGMENT_KB: int = 2048  # Arquivos menores que 2 intervalos vão numa conexão só
+    DIRECT_FETCH_BUFFER_KB: int = 1024  # Tamanho de cada leitura/escrita
+    DIRECT_FETCH_SEGMENT_RETRIES: int = 3  # Retomadas de um intervalo antes de desistir do arquivo
+    
+    # Provedores do TikTok em corrida (TikWM, SnapTik, yt-dlp): o próximo entra se o anterior demorar
+    TIKTOK_HEDGE_DELAY_SECONDS: float = 1.5  # Atraso do SnapTik em relação ao TikWM
+    TIKTOK_PROVIDER_TIMEOUT_SECONDS: float = 10.0
+    TIKTOK_RACE_YTDLP: bool = True  # yt-dlp também corre no /info do TikTok
+    TIKTOK_YTDLP_HEDGE_SECONDS: float = 3.0  # Atraso do yt-dlp (as APIs costumam responder antes)
+    TIKTOK_YTDLP_TIMEOUT_SECONDS: float = 0  # Limite do yt-dlp na corrida (0 = sem limite, como fora dela)
+    
+    # Circuit breaker das fontes (yt-dlp, APIs alternativas) por plataforma
+    SOURCE_BREAKER_FAILURES: int = 5  # Falhas seguidas que abrem o circuito
+    SOURCE_BREAKER_COOLDOWN_SECONDS: float = 30.0  # Tempo aberto antes do teste (dobra a cada teste que falha)
+    SOURCE_BREAKER_MAX_COOLDOWN_SECONDS: float = 600.0
+    SOURCE_HEALTH_WINDOW: int = 50  # Resultados recentes usados na taxa de sucesso e latência
+    SOURCE_HEALTH_WINDOW_SECONDS: float = 600.0
+    
+    # Ajuste automático de fragmentos em paralelo e tamanho de chunk por plataforma + CDN
+    TUNER_MIN_CONCURRENCY: int = 1
+    TUNER_MAX_CONCURRENCY: int = 16
+    TUNER_INITIAL_CONCURRENCY: int = 4  # Ponto de partida de um host ainda não medido
+    TUNER_MAX_TOTAL_CONNECTIONS: int = 32  # Orçamento dividido entre os downloads em andamento
+    TUNER_MIN_CHUNK_KB: int = 1024
+    TUNER_MAX_CHUNK_KB: int = 32768
+    TUNER_INITIAL_CHUNK_KB: int = 10240
+    TUNER_STALE_SECONDS: int = 900  # Medição de um nível mais velha que isso é refeita
+    
+    # Progresso via WebSocket: no máximo N mensagens por segundo por cliente (valores repetidos são pulados)
+    PROGRESS_UPDATES_PER_SECOND: float = 4.0
+    
+    # Cache do proxy de thumbnails
+    THUMBNAIL_CACHE_PATH: str = ""  # Padrão: {TEMP_DOWNLOAD_PATH}/thumbnails
+    THUMBNAIL_MEMORY_CACHE_MB: int = 32
+    THUMBNAIL_DISK_CACHE_MB: int = 256
+    THUMBNAIL_CACHE_TTL_SECONDS: int = 3600  # Depois disso revalida com a origem (ETag/Last-Modified)
+    THUMBNAIL_MAX_BYTES: int = 2097152  # Imagens maiores são repassadas mas não guardadas
+    
+    # Estado compartilhado entre workers/instâncias (fila em lote, progresso, cache de /info)
+    SHARED_STATE_BACKEND: str = "memory"  # memory | redis
+    REDIS_URL: str = "redis://localhost:6379/0"
+    SHARED_STATE_PREFIX: str = "mediavid"  # Prefixo das chaves (várias instalações no mesmo Redis)
+    
+    # Fila em lote gravada em disco (SQLite): sobrevive a deploys e reinícios
+    QUEUE_PERSISTENCE: bool = True
+    QUEUE_DB_PATH: str = ""  # Padrão: {TEMP_DOWNLOAD_PATH}/state/queue.db (fora da raiz dos downloads)
+    BATCH_PREFETCH_CONCURRENCY: int = 4  # Extrações simultâneas ao adicionar um lote (não ocupa todo o pool de /info)
+    BATCH_PREFETCH_TIMEOUT_SECONDS: int = 20  # Sem resposta nesse tempo, o item fica pendente sem metadados
+    TEMP_ORPHAN_GRACE_SECONDS: int = 300  # Arquivos temporários sem escrita há mais tempo que isso são removidos no startup
+    
     # Rate Limiting
     MAX_REQUESTS_PER_MINUTE: int = 30
     
+    # Rate limiting adaptativo das requisições às plataformas e CDNs (token bucket por chave)
+    RATE_LIMIT_HOST_PER_SECOND: float = 10.0  # Taxa inicial por host de CDN/thumbnail
+    RATE_LIMIT_HOST_BURST: int = 20
+    RATE_LIMIT_RAMP_AFTER: int = 10  # Sucessos seguidos para voltar a aumentar a taxa após um 429
+    RATE_LIMIT_MAX_BACKOFF_SECONDS: int = 300  # Bloqueio máximo quando a origem não envia Retry-After
+    RATE_LIMIT_MAX_WAIT_SECONDS: int = 20  # Espera máxima por vaga antes de acessar a plataforma (acima disso: 429 com Retry-After; 0 = sem limite)
+    
     # YouTube Cookies (opcional - para produção)
     # Exportar cookies do navegador em modo anônimo seguindo:
     # https://github.com/yt-dlp/yt-dlp/wiki/Extractors#exporting-youtube-cookies
     YOUTUBE_COOKIES: str = ""  # Conteúdo do arquivo cookies.txt
     
+    # Cadeia de estratégias do YouTube (yt-dlp, scraping da página, pytubefix se instalado)
+    YOUTUBE_STRATEGIES: str = "ytdlp,scraper,pytubefix"  # Ordem padrão (a última que funcionou e a saúde recente reordenam)
+    YOUTUBE_YTDLP_TIMEOUT_SECONDS: float = 45.0
+    YOUTUBE_SCRAPER_TIMEOUT_SECONDS: float = 10.0
+    YOUTUBE_PYTUBEFIX_TIMEOUT_SECONDS: float = 30.0
+    YOUTUBE_STRATEGY_MEMORY_SECONDS: int = 1800  # Por quanto tempo a última estratégia que funcionou vai primeiro
+    
+    @property
+    def media_store_path(self) -> str:
+        return self.MEDIA_STORE_PATH or os.path.join(self.TEMP_DOWNLOAD_PATH, "store")
+    
+    @property
+    def thumbnail_cache_path(self) -> str:
+        return self.THUMBNAIL_CACHE_PATH or os.path.join(self.TEMP_DOWNLOAD_PATH, "thumbnails")
+    
+    @property
+    def queue_db_path(self) -> str:
+        return self.QUEUE_DB_PATH or os.path.join(self.TEMP_DOWNLOAD_PATH, "state", "queue.db")
+    
+    @property
+    def youtube_strategies(self) -> List[str]:
+        return [name.strip() for name in self.YOUTUBE_STRATEGIES.split(",") if name.strip()]
+    
     @property
     def cors_origins(self) -> List[str]:
         return [origin.strip() for origin in self.ALLOWED_ORIGINS.split(",")]
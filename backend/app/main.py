@@ -1,6 +1,12 @@
+import time
+
+# Tempo de import da aplicação (exposto em /api/health/ready e nas métricas)
+_IMPORT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
+import asyncio
 import logging
 
 # Configurar logging
@@ -18,9 +24,9 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins,
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
+    allow_methods=["GET", "HEAD", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
     allow_headers=["*"],
-    expose_headers=["Content-Disposition", "Content-Length", "Content-Type"],
+    expose_headers=["Content-Disposition", "Content-Length", "Content-Type", "Content-Range", "Accept-Ranges", "ETag", "Content-Location"],
     max_age=3600,  # Cache preflight por 1 hora
 )
 
@@ -30,6 +36,86 @@ async def startup_event():
     logger.info("🚀 MediaVid API iniciando...")
     logger.info(f"✅ Ambiente: {settings.DEBUG and 'development' or 'production'}")
     logger.info(f"✅ CORS Origins: {len(settings.cors_origins)} configurados")
+    
+    # Threads de download publicam progresso (e correm os provedores do TikTok) neste loop
+    from app.services.progress_bus import progress_bus
+    from app.services.tiktok_fallback import tiktok_fallback
+    progress_bus.bind_loop(asyncio.get_running_loop())
+    tiktok_fallback.bind_loop(asyncio.get_running_loop())
+    
+    # Observadores registrados aqui, não no import dos módulos
+    from app.services.shared_state import shared_state, PROGRESS_CHANNEL
+    from app.services.queue_manager import queue_manager
+    from app.routes.websocket import deliver_progress
+    shared_state.on(PROGRESS_CHANNEL, deliver_progress)
+    # Progresso dos downloads (client_id = id do item) também atualiza o item da fila
+    progress_bus.add_observer(queue_manager.record_progress)
+    
+    # Tudo o que espera disco ou rede roda em segundo plano: o uvicorn só abre a porta
+    # quando este hook termina, e os health checks do cold start não podem esperar
+    from app.services.downloader import downloader
+    from app.services.direct_fetcher import direct_fetcher
+    from app.services.thumbnail_cache import thumbnail_cache
+    from app.services.warmup import startup_warmup
+    
+    async def connect_shared_state():
+        # Estado compartilhado entre workers (fila em lote, progresso, cache de /info)
+        await shared_state.start()
+        logger.info(f"✅ Estado compartilhado: {shared_state.name}")
+    
+    async def restore_queue():
+        # Fila em lote gravada em disco: abre o banco, restaura itens e retoma downloads interrompidos
+        restored = await queue_manager.restore(has_file=downloader.media_store.contains)
+        orphans = await asyncio.to_thread(
+            downloader.cleanup_orphan_files, queue_manager.referenced_files(), settings.TEMP_ORPHAN_GRACE_SECONDS
+        )
+        logger.info(
+            f"✅ Fila restaurada: {restored['loaded']} itens ({restored['resumed']} retomados, "
+            f"{restored['expired']} com arquivo expirado), {orphans} arquivos órfãos removidos"
+        )
+        if restored['resumed']:
+            from app.routes.batch import download_item
+            queue_manager.start(download_item)
+    
+    # Estado: sempre (índice do armazenamento e do cache de thumbnails lidos fora do loop)
+    steps = [
+        ('shared_state', connect_shared_state),
+        ('media_store', lambda: downloader.media_store),
+        ('thumbnail_cache', thumbnail_cache.open),
+        ('queue_restore', restore_queue),
+    ]
+    # yt-dlp, extractors, FFmpeg e cookies: sem STARTUP_WARMUP, carregados no primeiro uso
+    if settings.STARTUP_WARMUP:
+        steps += [
+            ('yt_dlp', downloader.load_extractors),
+            ('ffmpeg', lambda: downloader.ffmpeg_location),
+            ('youtube_cookies', lambda: downloader.youtube_cookies_file),
+            ('http_session', lambda: direct_fetcher.session),
+        ]
+    startup_warmup.start(steps, required=('shared_state', 'media_store', 'queue_restore'))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    from app.services.downloader import downloader
+    from app.services.http_client import close_http_client
+    from app.services.queue_manager import queue_manager
+    from app.services.progress_bus import progress_bus
+    from app.services.shared_state import shared_state
+    from app.services.warmup import startup_warmup
+    await startup_warmup.stop()
+    await queue_manager.stop()
+    await queue_manager.close()
+    await progress_bus.flush()
+    await shared_state.close()
+    downloader.executors.shutdown(wait=False)
+    downloader.close_media_store()
+    from app.services.ydl_pool import ydl_pool
+    ydl_pool.close()
+    from app.services.direct_fetcher import direct_fetcher
+    direct_fetcher.close()
+    await close_http_client()
+    logger.info("👋 MediaVid API encerrada")
 
 
 @app.get("/")
@@ -47,7 +133,7 @@ async def health_check():
 
 
 # Import routes
-from app.routes import video, websocket, batch, health
+from app.routes import video, websocket, batch, health, metrics
 from app.services.downloader import downloader
 
 # Injeta WebSocket manager no downloader
@@ -57,3 +143,7 @@ app.include_router(video.router)
 app.include_router(websocket.router)
 app.include_router(batch.router)
 app.include_router(health.router)
+app.include_router(metrics.router)
+
+from app.services.warmup import startup_warmup
+startup_warmup.import_seconds = round(time.perf_counter() - _IMPORT_STARTED, 3)
@@ -31,6 +31,7 @@ class VideoInfo(BaseModel):
     view_count: Optional[int] = None
     formats: List[VideoFormat] = []
     platform: Optional[str] = None
+    filesize_approx: Optional[int] = None  # Tamanho do formato padrão, quando a plataforma informa
 
 
 class DownloadRequest(BaseModel):
@@ -40,6 +41,7 @@ class DownloadRequest(BaseModel):
     quality: Optional[str] = Field(None, description="Qualidade desejada (e.g., '1080p', '720p')")
     output_format: Optional[str] = Field(None, description="Formato de saída (mp4, webm, mp3, etc)")
     client_id: Optional[str] = Field(None, description="ID do cliente para WebSocket")
+    priority: int = Field(0, description="Prioridade na fila em lote (maior = antes)")
 
 
 class DownloadResponse(BaseModel):
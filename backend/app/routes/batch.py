@@ -1,20 +1,63 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, StreamingResponse
-from typing import List
-from app.models.video import DownloadRequest
-from app.services.downloader import downloader
+from fastapi import APIRouter, HTTPException, Query, Request
+from starlette.background import BackgroundTask
+from typing import List, Optional, Tuple
+from app.models.video import DownloadRequest, VideoInfo
+from app.services.downloader import downloader, ExtractionError
 from app.services.queue_manager import queue_manager, DownloadStatus
-from app.utils.validators import validate_url
+from app.services.metrics import STAGE_LATENCY, ERRORS, ACTIVE_DOWNLOADS, error_class
+from app.utils.validators import validate_url, canonical_key
+from app.utils.file_response import ranged_file_response
+from app.config import settings
+from datetime import datetime
 import asyncio
-import os
+import uuid
 
 router = APIRouter(prefix="/api/batch", tags=["batch"])
 
+# Máximo de itens por página em /queue
+MAX_QUEUE_PAGE = 500
+
+# Extrações simultâneas no pré-carregamento dos lotes
+_prefetch_slots = asyncio.Semaphore(settings.BATCH_PREFETCH_CONCURRENCY)
+
+
+async def prefetch_info(url: str) -> Tuple[Optional[VideoInfo], Optional[Exception]]:
+    """
+    Resolve os metadados de uma URL antes do download (usa o cache de /info).
+    O resultado fica no cache: o download do item não extrai de novo o que já foi resolvido.
+    """
+    await _prefetch_slots.acquire()
+    # shield: o timeout só para a espera; a extração continua e preenche o cache
+    # (cancelá-la descartaria o resultado e o download extrairia de novo)
+    load = asyncio.ensure_future(downloader.get_video_info_async(url))
+    
+    def finished(task: asyncio.Future):
+        # A vaga só volta quando a extração termina, não quando a espera acaba:
+        # extrações que estouraram o tempo continuam contando no limite
+        _prefetch_slots.release()
+        task.cancelled() or task.exception()
+    
+    load.add_done_callback(finished)
+    try:
+        info = await asyncio.wait_for(asyncio.shield(load), timeout=settings.BATCH_PREFETCH_TIMEOUT_SECONDS)
+        return info, None
+    except Exception as e:
+        return None, e
+
 
 @router.post("/add")
-async def add_to_batch(items: List[DownloadRequest]):
+async def add_to_batch(
+    items: List[DownloadRequest],
+    batch_id: Optional[str] = Query(None, max_length=64, description="Lote/sessão (reutilize para agrupar várias adições)"),
+    prefetch: bool = Query(True, description="Resolver título, duração e tamanho antes de enfileirar")
+):
     """
-    Adiciona múltiplos vídeos à fila de download em lote
+    Adiciona múltiplos vídeos à fila de download em lote.
+    O batch_id retornado é usado para acompanhar o lote em /ws/queue.
+    
+    Com prefetch, os metadados de todas as URLs são resolvidos em paralelo (limitado):
+    cada item volta com título, duração e tamanho estimado, e links mortos ou
+    privados já entram na fila como falha em vez de esperar a vez de baixar.
     """
     if not items:
         raise HTTPException(status_code=400, detail="Lista de itens vazia")
@@ -25,21 +68,71 @@ async def add_to_batch(items: List[DownloadRequest]):
             raise HTTPException(status_code=400, detail=f"URL inválida: {item.url}")
     
     try:
-        # Adiciona itens à fila
+        # Chaves canônicas (resolve links curtos fora do event loop)
+        content_keys = await asyncio.gather(*[
+            downloader.executors.run_info(canonical_key, item.url) for item in items
+        ])
+        
+        # Metadados de todas as URLs em paralelo (cada conteúdo resolvido uma única vez)
+        resolved = {}
+        if prefetch:
+            unique = {content_key: item.url for item, content_key in zip(items, content_keys)}
+            results = await asyncio.gather(*[prefetch_info(url) for url in unique.values()])
+            resolved = dict(zip(unique.keys(), results))
+        
+        # Adiciona itens à fila (o mesmo conteúdo colado duas vezes vira um único item)
+        batch_id = batch_id or uuid.uuid4().hex[:12]
         item_ids = []
-        for item in items:
+        for item, content_key in zip(items, content_keys):
             item_id = queue_manager.add_to_queue(
                 url=item.url,
                 quality=item.quality,
                 output_format=item.output_format or ('mp3' if item.audio_only else 'mp4'),
-                audio_only=item.audio_only
+                audio_only=item.audio_only,
+                content_key=content_key,
+                priority=item.priority,
+                batch_id=batch_id
             )
+            if item_id in item_ids:
+                continue
             item_ids.append(item_id)
+            
+            info, error = resolved.get(content_key, (None, None))
+            queued = queue_manager.get_item(item_id)
+            if info:
+                queue_manager.set_metadata(
+                    item_id,
+                    title=info.title,
+                    duration=info.duration,
+                    filesize_estimate=downloader.estimate_filesize(info, item.quality, item.audio_only),
+                    thumbnail=info.thumbnail
+                )
+            elif isinstance(error, ExtractionError) and error.permanent and queued.status == DownloadStatus.PENDING:
+                # Privado, removido, URL inválida: não ocupa vaga de download
+                queue_manager.set_error(item_id, str(error))
+            # Erros temporários (timeout, 429) deixam o item pendente: o download tenta de novo
+        
+        added = [queue_manager.get_item(item_id) for item_id in item_ids]
+        failed = sum(1 for queued in added if queued.status == DownloadStatus.FAILED)
         
         return {
             "success": True,
-            "message": f"{len(item_ids)} itens adicionados à fila",
+            "message": f"{len(item_ids)} itens adicionados à fila" + (f" ({failed} indisponíveis)" if failed else ""),
             "item_ids": item_ids,
+            "items": [
+                {
+                    "id": queued.id,
+                    "url": queued.url,
+                    "title": queued.title,
+                    "duration": queued.duration,
+                    "filesize_estimate": queued.filesize_estimate,
+                    "thumbnail": queued.thumbnail,
+                    "status": queued.status,
+                    "error": queued.error
+                }
+                for queued in added
+            ],
+            "batch_id": batch_id,
             "queue_status": queue_manager.get_queue_status()
         }
     
@@ -47,40 +140,79 @@ async def add_to_batch(items: List[DownloadRequest]):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def serialize_item(item) -> dict:
+    """Representação de um item da fila na API"""
+    return {
+        "id": item.id,
+        "batch_id": item.batch_id,
+        "batch_ids": item.batch_ids,
+        "url": item.url,
+        "title": item.title,
+        "duration": item.duration,
+        "filesize_estimate": item.filesize_estimate,
+        "thumbnail": item.thumbnail,
+        "quality": item.quality,
+        "output_format": item.output_format,
+        "audio_only": item.audio_only,
+        "status": item.status,
+        "progress": item.progress,
+        "message": item.message,
+        "filepath": item.filepath,
+        "error": item.error,
+        "downloaded": item.downloaded,
+        "tuning": item.tuning,
+        "created_at": item.created_at.isoformat() if item.created_at else None,
+        "started_at": item.started_at.isoformat() if item.started_at else None,
+        "completed_at": item.completed_at.isoformat() if item.completed_at else None
+    }
+
+
 @router.get("/queue")
-async def get_queue():
+async def get_queue(
+    since: Optional[int] = Query(None, description="Versão da resposta anterior: só itens alterados depois dela"),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_QUEUE_PAGE)
+):
     """
     Retorna o estado atual da fila
+    
+    - Sem parâmetros: todos os itens
+    - offset/limit: uma página da listagem completa
+    - since=<version>: só itens alterados (`items`) e removidos (`removed`) desde a
+      versão devolvida na resposta anterior. `reset: true` indica que a versão não é
+      mais conhecida (ex: servidor reiniciado) e a listagem completa foi enviada.
     """
+    status = queue_manager.get_queue_status()
+    
+    if since is not None:
+        changes = queue_manager.changes_since(since, limit or MAX_QUEUE_PAGE)
+        if changes is not None:
+            return {
+                "items": [serialize_item(item) for item in changes['items']],
+                "removed": changes['removed'],
+                "version": changes['version'],
+                "has_more": changes['has_more'],
+                "reset": False,
+                "status": status
+            }
+    
+    version = queue_manager.version
     items = queue_manager.get_all_items()
+    page = items[offset:offset + limit] if limit else items[offset:]
     return {
-        "items": [
-            {
-                "id": item.id,
-                "url": item.url,
-                "quality": item.quality,
-                "output_format": item.output_format,
-                "audio_only": item.audio_only,
-                "status": item.status,
-                "progress": item.progress,
-                "message": item.message,
-                "filepath": item.filepath,
-                "error": item.error,
-                "downloaded": item.downloaded,
-                "created_at": item.created_at.isoformat() if item.created_at else None,
-                "started_at": item.started_at.isoformat() if item.started_at else None,
-                "completed_at": item.completed_at.isoformat() if item.completed_at else None
-            }
-            for item in items
-        ],
-        "status": queue_manager.get_queue_status()
+        "items": [serialize_item(item) for item in page],
+        "version": version,
+        "has_more": offset + len(page) < len(items),
+        "reset": since is not None,
+        "status": status
     }
 
 
 @router.post("/start")
-async def start_batch_download(background_tasks: BackgroundTasks):
+async def start_batch_download():
     """
     Inicia o processamento da fila de downloads
+    (idempotente: chamar de novo não cria processadores duplicados)
     """
     items = queue_manager.get_all_items()
     pending_items = [item for item in items if item.status == DownloadStatus.PENDING]
@@ -88,64 +220,54 @@ async def start_batch_download(background_tasks: BackgroundTasks):
     if not pending_items:
         raise HTTPException(status_code=400, detail="Não há itens pendentes na fila")
     
-    # Inicia processamento em background
-    background_tasks.add_task(process_queue)
+    # Agendador com workers de longa duração (itens adicionados depois entram automaticamente)
+    queue_manager.start(download_item)
     
     return {
         "success": True,
         "message": f"Processando {len(pending_items)} itens",
-        "queue_status": queue_manager.get_queue_status()
+        "queue_status": queue_manager.get_queue_status(),
+        "scheduler": queue_manager.scheduler_status()
     }
 
 
-async def process_queue():
-    """
-    Processa a fila de downloads (até max_concurrent simultâneos)
-    """
-    items = queue_manager.get_all_items()
-    pending_items = [item for item in items if item.status == DownloadStatus.PENDING]
-    
-    async def download_item(item):
-        """Download de um item individual"""
-        try:
-            queue_manager.update_status(item.id, DownloadStatus.DOWNLOADING, 0, "Iniciando download...")
-            
-            # Cria request para o downloader
-            request = DownloadRequest(
-                url=item.url,
-                format_id=None,  # Não usamos format_id específico
-                quality=item.quality,
-                output_format=item.output_format,
-                audio_only=item.audio_only,
-                client_id=item.id  # Usa o ID do item como client_id para WebSocket
-            )
-            
-            # Executa download
-            result = downloader.download_video(request)
-            
-            if result['success']:
-                queue_manager.set_filepath(item.id, result['filepath'])
-                queue_manager.update_status(item.id, DownloadStatus.COMPLETED, 100, "Download concluído!")
-            else:
-                queue_manager.set_error(item.id, "Falha no download")
+async def download_item(item):
+    """Download de um item individual (executado pelos workers do agendador)"""
+    STAGE_LATENCY.observe(
+        (datetime.now() - item.created_at).total_seconds(), stage='queue_wait', platform=item.platform or 'Unknown'
+    )
+    ACTIVE_DOWNLOADS.inc(kind='batch')
+    try:
+        queue_manager.update_status(item.id, DownloadStatus.DOWNLOADING, 0, "Iniciando download...")
         
-        except Exception as e:
-            queue_manager.set_error(item.id, str(e))
-    
-    # Processa itens com semáforo (controle de concorrência)
-    tasks = []
-    for item in pending_items:
-        if item.status == DownloadStatus.PENDING:  # Verifica novamente (pode ter sido cancelado)
-            async with queue_manager.semaphore:
-                task = asyncio.create_task(download_item(item))
-                queue_manager.active_downloads[item.id] = task
-                tasks.append(task)
-    
-    # Aguarda todos completarem
-    await asyncio.gather(*tasks, return_exceptions=True)
+        # Cria request para o downloader
+        request = DownloadRequest(
+            url=item.url,
+            format_id=None,  # Não usamos format_id específico
+            quality=item.quality,
+            output_format=item.output_format,
+            audio_only=item.audio_only,
+            client_id=item.id  # Usa o ID do item como client_id para WebSocket
+        )
+        
+        # Executa download no pool de downloads (não trava o event loop)
+        result = await downloader.download_video_async(request)
+        
+        if result['success']:
+            # O arquivo continua no armazenamento; a referência é adquirida de novo quando o usuário baixar
+            downloader.media_store.release(result.get('store_key'))
+            queue_manager.set_filepath(item.id, result['filepath'], result.get('store_key'), result.get('tuning'))
+            queue_manager.update_status(item.id, DownloadStatus.COMPLETED, 100, "Download concluído!")
+        else:
+            queue_manager.set_error(item.id, "Falha no download")
     
-    # Limpa downloads ativos
-    queue_manager.active_downloads.clear()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        ERRORS.inc(endpoint='batch', platform=item.platform or 'Unknown', error_class=error_class(e))
+        queue_manager.set_error(item.id, str(e))
+    finally:
+        ACTIVE_DOWNLOADS.dec(kind='batch')
 
 
 @router.post("/item/{item_id}/cancel")
@@ -227,9 +349,10 @@ async def clear_all():
 
 
 @router.get("/item/{item_id}/download")
-async def download_batch_item(item_id: str, background_tasks: BackgroundTasks):
+@router.head("/item/{item_id}/download")
+async def download_batch_item(item_id: str, request: Request):
     """
-    Faz download de um item específico que já foi baixado
+    Faz download de um item específico que já foi baixado (suporta Range para retomar)
     """
     item = queue_manager.get_item(item_id)
     if not item:
@@ -238,19 +361,18 @@ async def download_batch_item(item_id: str, background_tasks: BackgroundTasks):
     if item.status != DownloadStatus.COMPLETED or not item.filepath:
         raise HTTPException(status_code=400, detail="Item ainda não foi baixado ou falhou")
     
-    if not os.path.exists(item.filepath):
+    entry = downloader.media_store.acquire(item.store_key) if item.store_key else None
+    if not entry:
         raise HTTPException(status_code=404, detail="Arquivo não encontrado no servidor")
     
-    filename = os.path.basename(item.filepath)
-    
-    # Agenda limpeza do arquivo após enviar
-    background_tasks.add_task(downloader.cleanup_file, item.filepath)
-    
     # Marca que o arquivo foi baixado pelo usuário
     queue_manager.mark_as_downloaded(item_id)
     
-    return FileResponse(
-        path=item.filepath,
-        media_type='application/octet-stream',
-        filename=filename
+    # Libera a referência no armazenamento após enviar (o arquivo fica durante o período de carência)
+    return ranged_file_response(
+        request,
+        str(downloader.media_store.path_for(entry)),
+        filename=entry.download_name,
+        etag=entry.key,
+        background=BackgroundTask(downloader.media_store.release, entry.key)
     )
@@ -27,18 +27,91 @@ async def ping():
     Endpoint para keep-alive automático
     Suporta GET e HEAD requests
     """
+    from app.services.metrics import PROCESS_START
     global _last_ping
     current = time.time()
-    uptime = current - _last_ping
+    since_last_ping = current - _last_ping
     _last_ping = current
     
     return {
         "status": "alive",
-        "uptime_seconds": round(uptime, 2),
+        "uptime_seconds": round(current - PROCESS_START, 2),
+        "since_last_ping_seconds": round(since_last_ping, 2),
         "timestamp": current
     }
 
 
+@router.get("/ready")
+@router.head("/ready")
+async def readiness():
+    """
+    Prontidão: 503 enquanto o aquecimento do startup (estado, fila, yt-dlp, FFmpeg, cookies)
+    roda, ou se uma etapa obrigatória falhou.
+    /api/health/ping responde desde o primeiro instante; este só quando está tudo carregado.
+    """
+    from app.services.warmup import startup_warmup
+    stats = startup_warmup.stats()
+    return JSONResponse(content=stats, status_code=200 if stats['ready'] else 503)
+
+
+@router.get("/cache")
+async def cache_status():
+    """
+    Estatísticas dos caches de metadados (hits, misses, coalescências)
+    """
+    from app.services.downloader import downloader
+    from app.services.thumbnail_cache import thumbnail_cache
+    return {
+        **downloader.cache_stats(),
+        'thumbnails': thumbnail_cache.stats(),
+    }
+
+
+@router.get("/rate-limits")
+async def rate_limits_status():
+    """
+    Estado dos token buckets por plataforma e por host (taxa atual, fila, bloqueios por 429)
+    """
+    from app.services.rate_limiter import rate_limiter
+    return rate_limiter.snapshot()
+
+
+@router.get("/tuner")
+async def tuner_status():
+    """
+    Tuner de download: conexões, chunk, vazão por nível e taxa de erro por plataforma + CDN
+    """
+    from app.services.download_tuner import download_tuner
+    return download_tuner.stats()
+
+
+@router.get("/sources")
+async def sources_status():
+    """
+    Saúde das fontes (yt-dlp, APIs alternativas, CDN) por plataforma: circuito, taxa de sucesso e latência
+    """
+    from app.services.source_health import source_health
+    return source_health.stats()
+
+
+@router.get("/youtube")
+async def youtube_strategies_status():
+    """
+    Cadeia de estratégias do YouTube: tempo limite de cada uma e a última que funcionou por classe de vídeo
+    """
+    from app.services.downloader import downloader
+    return downloader.youtube_strategies.stats()
+
+
+@router.get("/shared-state")
+async def shared_state_status():
+    """
+    Backend de estado compartilhado em uso (memory/redis) e identificação deste worker
+    """
+    from app.services.shared_state import shared_state
+    return shared_state.stats()
+
+
 @router.get("/cors")
 async def check_cors():
     """
@@ -0,0 +1,206 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.services.downloader import downloader
+from app.services.queue_manager import queue_manager, DownloadStatus
+from app.services.rate_limiter import rate_limiter
+from app.services.thumbnail_cache import thumbnail_cache
+from app.services.metrics import registry, PROCESS_START
+from app.services.progress_bus import progress_bus
+from app.services.ydl_pool import ydl_pool
+from app.services.warmup import startup_warmup
+from app.services.postprocess import postprocessor
+from app.services.download_tuner import download_tuner
+from app.services.source_health import source_health
+import time
+
+router = APIRouter(tags=["metrics"])
+
+
+def _collect_caches():
+    """Hits/misses dos caches de metadados, do armazenamento e das thumbnails"""
+    stats = downloader.cache_stats()
+    hits, misses, coalesced, size = [], [], [], []
+
+    for name in ('video_info', 'tiktok_api', 'raw_info'):
+        cache = stats[name]
+        hits.append(({'cache': name}, cache['hits']))
+        misses.append(({'cache': name}, cache['misses']))
+        coalesced.append(({'cache': name}, cache['coalesced']))
+        size.append(({'cache': name}, cache['size']))
+
+    store = stats['media_store']
+    hits.append(({'cache': 'media_store'}, store['hits']))
+    misses.append(({'cache': 'media_store'}, store['misses']))
+    size.append(({'cache': 'media_store'}, store['files']))
+
+    thumbnails = thumbnail_cache.stats()
+    hits.append(({'cache': 'thumbnails'}, thumbnails['memory_hits'] + thumbnails['disk_hits'] + thumbnails['revalidated']))
+    misses.append(({'cache': 'thumbnails'}, thumbnails['misses']))
+    size.append(({'cache': 'thumbnails'}, thumbnails['memory_entries']))
+
+    return [
+        ('mediavid_cache_hits_total', 'counter', 'Acertos por cache', hits),
+        ('mediavid_cache_misses_total', 'counter', 'Faltas por cache', misses),
+        ('mediavid_cache_coalesced_total', 'counter', 'Requisições que aguardaram uma carga em andamento', coalesced),
+        ('mediavid_cache_entries', 'gauge', 'Entradas por cache', size),
+        ('mediavid_media_store_bytes', 'gauge', 'Bytes no armazenamento de mídia', [({}, store['total_bytes'])]),
+    ]
+
+
+def _collect_queue():
+    """Itens da fila em lote por status e downloads ativos do agendador"""
+    counts = queue_manager.get_queue_status()
+
+    scheduler = queue_manager.scheduler_status()
+    store = queue_manager.store.stats() if queue_manager.store else {'batches': 0, 'writes': 0, 'errors': 0}
+    return [
+        ('mediavid_queue_items', 'gauge', 'Itens da fila em lote por status',
+         [({'status': status.value}, counts[status.value]) for status in DownloadStatus]),
+        ('mediavid_queue_scheduled', 'gauge', 'Itens aguardando vaga no agendador',
+         [({}, scheduler['queued'])]),
+        ('mediavid_queue_active_by_platform', 'gauge', 'Downloads do agendador em andamento por plataforma',
+         [({'platform': platform}, count) for platform, count in scheduler['active_by_platform'].items()]),
+        ('mediavid_queue_store_batches_total', 'counter', 'Transações de gravação da fila em disco',
+         [({}, store['batches'])]),
+        ('mediavid_queue_store_writes_total', 'counter', 'Itens gravados/removidos na fila em disco',
+         [({}, store['writes'])]),
+        ('mediavid_queue_store_errors_total', 'counter', 'Erros ao gravar a fila em disco',
+         [({}, store['errors'])]),
+    ]
+
+
+def _collect_executors():
+    """Saturação dos pools de threads (workers, ocupados, aguardando)"""
+    workers, busy, queued = [], [], []
+    for pool, stats in downloader.executors.stats().items():
+        workers.append(({'pool': pool}, stats['workers']))
+        busy.append(({'pool': pool}, stats['busy']))
+        queued.append(({'pool': pool}, stats['queued']))
+    return [
+        ('mediavid_executor_workers', 'gauge', 'Threads por pool', workers),
+        ('mediavid_executor_busy', 'gauge', 'Threads ocupadas por pool', busy),
+        ('mediavid_executor_queued', 'gauge', 'Tarefas aguardando thread livre por pool', queued),
+    ]
+
+
+def _collect_rate_limits():
+    """Respostas 429 e taxa atual de cada bucket do rate limiter"""
+    throttled, rate, waiting = [], [], []
+    for key, state in rate_limiter.snapshot().items():
+        labels = {'bucket': key}
+        throttled.append((labels, state['throttled']))
+        rate.append((labels, state['rate_per_second']))
+        waiting.append((labels, state['waiting']))
+    return [
+        ('mediavid_rate_limited_total', 'counter', 'Respostas 429 / Too Many Requests por bucket', throttled),
+        ('mediavid_rate_limit_rate', 'gauge', 'Taxa atual (requisições/s) por bucket', rate),
+        ('mediavid_rate_limit_waiting', 'gauge', 'Requisições aguardando vaga por bucket', waiting),
+    ]
+
+
+def _collect_progress():
+    """Mensagens de progresso publicadas pelas threads vs enviadas pelo WebSocket"""
+    stats = progress_bus.stats()
+    return [
+        ('mediavid_progress_messages_total', 'counter', 'Mensagens de progresso publicadas e enviadas',
+         [({'kind': 'published'}, stats['published']), ({'kind': 'sent'}, stats['sent'])]),
+    ]
+
+
+def _collect_ydl_pool():
+    """Reuso das instâncias do yt-dlp (created = instância nova, reused = conexões aproveitadas)"""
+    stats = ydl_pool.stats()
+    return [
+        ('mediavid_ydl_instances_total', 'counter', 'Empréstimos de instâncias do yt-dlp por resultado',
+         [({'result': result}, stats[result]) for result in ('created', 'reused', 'discarded')]),
+        ('mediavid_ydl_idle_instances', 'gauge', 'Instâncias ociosas do yt-dlp por perfil',
+         [({'profile': profile}, count) for profile, count in stats['idle_by_profile'].items()]),
+    ]
+
+
+def _collect_postprocess():
+    """Vagas do ffmpeg: processos em execução e aguardando vaga (saturação de CPU)"""
+    stats = postprocessor.stats()
+    return [
+        ('mediavid_ffmpeg_slots', 'gauge', 'Processos do ffmpeg: limite, em execução e aguardando vaga',
+         [({'state': 'limit'}, stats['max_jobs']), ({'state': 'running'}, stats['running']),
+          ({'state': 'waiting'}, stats['waiting'])]),
+        ('mediavid_ffmpeg_skipped_total', 'counter', 'Áudios que já estavam no formato pedido (sem ffmpeg)',
+         [({}, stats['skipped'])]),
+    ]
+
+
+def _collect_tuner():
+    """Parâmetros atuais do tuner por plataforma + CDN (estáveis = convergiu)"""
+    stats = download_tuner.stats()
+    concurrency, chunk, throughput, errors, converged = [], [], [], [], []
+    for key, state in stats['hosts'].items():
+        platform, _, host = key.partition('|')
+        labels = {'platform': platform, 'host': host}
+        concurrency.append((labels, state['concurrency']))
+        chunk.append((labels, state['chunk_size'] or 0))
+        if state['throughput']:
+            throughput.append((labels, max(state['throughput'].values())))
+        errors.append((labels, state['error_rate']))
+        converged.append((labels, 1 if state['converged'] else 0))
+    return [
+        ('mediavid_tuner_concurrency', 'gauge', 'Fragmentos/conexões em paralelo do próximo download', concurrency),
+        ('mediavid_tuner_chunk_bytes', 'gauge', 'Tamanho de chunk HTTP do próximo download (0 = sem chunk)', chunk),
+        ('mediavid_tuner_throughput_bytes', 'gauge', 'Melhor vazão medida (EWMA, bytes/s)', throughput),
+        ('mediavid_tuner_error_rate', 'gauge', 'Retries por fragmento (EWMA)', errors),
+        ('mediavid_tuner_converged', 'gauge', 'Vizinhos do nível atual já medidos e mais lentos (1)', converged),
+        ('mediavid_tuner_active_jobs', 'gauge', 'Downloads dividindo o orçamento de conexões', [({}, stats['active'])]),
+    ]
+
+
+def _collect_source_health():
+    """Circuito (0 = fechado, 1 = meio-aberto, 2 = aberto), taxa de sucesso e latência por fonte e plataforma"""
+    states = {'closed': 0, 'half_open': 1, 'open': 2}
+    state, success, latency = [], [], []
+    for platform, sources in source_health.stats().items():
+        for source, stats in sources.items():
+            labels = {'source': source, 'platform': platform}
+            state.append((labels, states[stats['state']]))
+            if stats['success_rate'] is not None:
+                success.append((labels, stats['success_rate']))
+            if stats['mean_latency'] is not None:
+                latency.append((labels, stats['mean_latency']))
+    return [
+        ('mediavid_source_breaker_state', 'gauge', 'Circuito da fonte (0 = fechado, 1 = meio-aberto, 2 = aberto)', state),
+        ('mediavid_source_success_rate', 'gauge', 'Taxa de sucesso na janela recente', success),
+        ('mediavid_source_latency_seconds', 'gauge', 'Latência média das chamadas com sucesso na janela recente', latency),
+    ]
+
+
+def _collect_process():
+    return [
+        ('mediavid_uptime_seconds', 'gauge', 'Tempo desde o início do processo', [({}, round(time.time() - PROCESS_START, 3))]),
+    ]
+
+
+def _collect_startup():
+    """Cold start: import da aplicação e etapas do aquecimento em segundo plano"""
+    stats = startup_warmup.stats()
+    samples = [
+        ('mediavid_startup_ready', 'gauge', 'Aquecimento do startup concluído (1) ou em andamento (0)',
+         [({}, 1 if stats['ready'] else 0)]),
+        ('mediavid_startup_warmup_step_seconds', 'gauge', 'Duração de cada etapa do aquecimento',
+         [({'step': step, 'ok': str(result['ok']).lower()}, result['seconds']) for step, result in stats['steps'].items()]),
+    ]
+    if stats['import_seconds'] is not None:
+        samples.append(('mediavid_startup_import_seconds', 'gauge', 'Tempo de import da aplicação',
+                        [({}, stats['import_seconds'])]))
+    return samples
+
+
+for collector in (_collect_caches, _collect_queue, _collect_executors, _collect_rate_limits, _collect_progress, _collect_ydl_pool, _collect_process,
+                  _collect_startup, _collect_postprocess, _collect_tuner, _collect_source_health):
+    registry.register_collector(collector)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Métricas no formato de texto do Prometheus
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
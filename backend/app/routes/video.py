@@ -1,10 +1,18 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
 from app.models.video import VideoInfo, DownloadRequest, DownloadResponse
 from app.services.downloader import downloader
+from app.services.media_streamer import media_streamer
+from app.services.thumbnail_cache import thumbnail_cache
+from app.services.metrics import REQUEST_LATENCY, ERRORS, ACTIVE_DOWNLOADS, error_class
+from app.services.source_health import CircuitOpenError
+from app.services.rate_limiter import RateLimitedError
 from app.utils.validators import validate_url, detect_platform
+from app.utils.file_response import ranged_file_response
 import os
-import requests
+import time
+import httpx
 
 router = APIRouter(prefix="/api/video", tags=["video"])
 
@@ -30,13 +38,23 @@ async def get_video_info(request: dict):
             detail="Plataforma não suportada. Atualmente suportamos: Instagram, TikTok, Twitter/X, Facebook, Reddit e Pinterest."
         )
     
+    trace = {}
     try:
-        video_info = downloader.get_video_info(url)
+        with REQUEST_LATENCY.time(endpoint='info', platform=platform, source='error') as labels:
+            video_info = await downloader.get_video_info_async(url, trace)
+            labels['source'] = trace.get('source', 'ytdlp')
         return video_info
+    except CircuitOpenError as e:
+        ERRORS.inc(endpoint='info', platform=platform, error_class=error_class(e))
+        raise _unavailable(e)
+    except RateLimitedError as e:
+        ERRORS.inc(endpoint='info', platform=platform, error_class=error_class(e))
+        raise _too_many_requests(e)
     except Exception as e:
+        ERRORS.inc(endpoint='info', platform=platform, error_class=error_class(e))
         error_msg = str(e)
         # Se demorar muito ou falhar, retorna mensagem amigável
-        if 'timeout' in error_msg.lower() or 'timed out' in error_msg.lower():
+        if error_class(e) == 'timeout' or 'timeout' in error_msg.lower() or 'timed out' in error_msg.lower():
             raise HTTPException(
                 status_code=408, 
                 detail="Tempo limite excedido. Tente novamente ou verifique se o vídeo é público."
@@ -45,46 +63,110 @@ async def get_video_info(request: dict):
 
 
 @router.post("/download")
-async def download_video(request: DownloadRequest, background_tasks: BackgroundTasks):
+async def download_video(request: DownloadRequest, http_request: Request):
     """
     Faz o download do vídeo e retorna o arquivo
     """
     if not validate_url(request.url):
         raise HTTPException(status_code=400, detail="URL inválida")
     
+    platform = detect_platform(request.url)
+    
     try:
-        # Baixa o vídeo (agora com suporte a client_id para WebSocket)
-        result = downloader.download_video(request)
+        # Repasse: envia os bytes enquanto baixa da origem (arquivo único ou mux fragmentado)
+        # (a latência medida é até o primeiro byte, só quando há repasse; a duração total vai para a etapa 'download')
+        stream_started = time.perf_counter()
+        stream = await media_streamer.open_stream(request)
+        if stream:
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - stream_started, endpoint='download', platform=platform, source='stream'
+            )
+            return StreamingResponse(
+                stream.iter_bytes(),
+                media_type=stream.media_type,
+                headers=stream.headers
+            )
+        
+        # Baixa o vídeo no pool de downloads (com suporte a client_id para WebSocket)
+        with REQUEST_LATENCY.time(endpoint='download', platform=platform, source='error') as labels, \
+                ACTIVE_DOWNLOADS.track_inprogress(kind='direct'):
+            result = await downloader.download_video_async(request)
+            labels['source'] = result.get('source', 'ytdlp')
         
         if not result['success']:
             raise HTTPException(status_code=500, detail="Erro ao baixar vídeo")
         
         filepath = result['filepath']
+        store_key = result.get('store_key')
         
         if not os.path.exists(filepath):
+            downloader.media_store.release(store_key)
             raise HTTPException(status_code=404, detail="Arquivo não encontrado")
         
-        # Agenda limpeza do arquivo após enviar
-        background_tasks.add_task(downloader.cleanup_file, filepath)
-        
-        # Retorna o arquivo para download com header correto
-        headers = {
-            'Content-Disposition': f'attachment; filename="{result["filename"]}"'
-        }
-        
-        return FileResponse(
-            path=filepath,
+        # Retorna o arquivo com suporte a Range (retomada) e libera a referência no
+        # armazenamento após enviar (o arquivo fica para retomadas e próximos downloads)
+        return ranged_file_response(
+            http_request,
+            filepath,
             filename=result['filename'],
-            media_type='application/octet-stream',
-            headers=headers
+            etag=store_key,
+            headers={'Content-Location': f'/api/video/file/{store_key}'},
+            background=BackgroundTask(downloader.media_store.release, store_key)
         )
         
     except HTTPException:
         raise
+    except CircuitOpenError as e:
+        ERRORS.inc(endpoint='download', platform=platform, error_class=error_class(e))
+        raise _unavailable(e)
+    except RateLimitedError as e:
+        ERRORS.inc(endpoint='download', platform=platform, error_class=error_class(e))
+        raise _too_many_requests(e)
     except Exception as e:
+        ERRORS.inc(endpoint='download', platform=platform, error_class=error_class(e))
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _unavailable(e: CircuitOpenError) -> HTTPException:
+    """503 imediato quando todas as fontes da plataforma estão com o circuito aberto"""
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={'Retry-After': str(max(1, round(e.retry_after)))}
+    )
+
+
+def _too_many_requests(e: RateLimitedError) -> HTTPException:
+    """429 quando a plataforma limitou ou a vaga no rate limiter demoraria demais"""
+    headers = None
+    if e.retry_after is not None:
+        headers = {'Retry-After': str(max(1, round(e.retry_after)))}
+    return HTTPException(status_code=429, detail=str(e), headers=headers)
+
+
+@router.get("/file/{store_key}")
+@router.head("/file/{store_key}")
+async def get_stored_file(store_key: str, request: Request):
+    """
+    Serve um arquivo já baixado do armazenamento (suporta Range, If-Range e ETag).
+    Permite retomar downloads interrompidos e baixar em partes sem novo acesso à origem.
+    """
+    if not downloader.media_store.is_valid_key(store_key):
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado ou expirado")
+    
+    entry = downloader.media_store.acquire(store_key)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado ou expirado")
+    
+    return ranged_file_response(
+        request,
+        str(downloader.media_store.path_for(entry)),
+        filename=entry.download_name,
+        etag=entry.key,
+        background=BackgroundTask(downloader.media_store.release, entry.key)
+    )
+
+
 @router.get("/formats")
 async def get_available_formats():
     """
@@ -101,36 +183,33 @@ async def get_available_formats():
 
 
 @router.get("/proxy-thumbnail")
-async def proxy_thumbnail(url: str):
+async def proxy_thumbnail(url: str, request: Request):
     """
     Proxy para thumbnails de todas as plataformas (evita bloqueio CORS)
+    Usa cache em memória/disco e cliente HTTP assíncrono com keep-alive
     """
     if not url:
         raise HTTPException(status_code=400, detail="URL da thumbnail é obrigatória")
     
     try:
-        # Headers genéricos que funcionam para todas as plataformas
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
-            'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Sec-Fetch-Dest': 'image',
-            'Sec-Fetch-Mode': 'no-cors',
-            'Sec-Fetch-Site': 'cross-site',
-        }
-        
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        # Retorna a imagem com headers CORS apropriados
-        return StreamingResponse(
-            iter([response.content]),
-            media_type=response.headers.get('content-type', 'image/jpeg'),
-            headers={
-                'Access-Control-Allow-Origin': '*',
-                'Cache-Control': 'public, max-age=3600'
-            }
-        )
-        
-    except requests.RequestException as e:
+        result = await thumbnail_cache.get(url)
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar thumbnail: {str(e)}")
+    
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Cache-Control': 'public, max-age=3600',
+        'X-Cache': result.cache_status
+    }
+    if result.etag:
+        headers['ETag'] = result.etag
+        # Navegador já tem essa versão
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match and result.etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return Response(status_code=304, headers=headers)
+    
+    if result.body is not None:
+        return Response(content=result.body, media_type=result.content_type, headers=headers)
+    
+    # Primeira busca: repassa os bytes conforme chegam da origem
+    return StreamingResponse(result.stream, media_type=result.content_type, headers=headers)
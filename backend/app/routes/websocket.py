@@ -1,5 +1,10 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import Dict, Set
+from typing import Dict, Optional, Set
+from app.config import settings
+from app.services.progress_bus import progress_bus
+from app.services.queue_manager import queue_manager
+from app.routes.batch import serialize_item
+import asyncio
 import json
 
 router = APIRouter()
@@ -15,6 +20,7 @@ class ConnectionManager:
         print(f"✓ Cliente WebSocket conectado: {client_id}")
     
     def disconnect(self, client_id: str):
+        progress_bus.forget(client_id)
         if client_id in self.active_connections:
             del self.active_connections[client_id]
             print(f"✗ Cliente WebSocket desconectado: {client_id}")
@@ -31,6 +37,14 @@ class ConnectionManager:
 manager = ConnectionManager()
 
 
+async def deliver_progress(message: dict):
+    """
+    Entrega o progresso publicado (por qualquer worker) se o cliente estiver conectado aqui.
+    Registrado no canal de progresso pelo startup da aplicação.
+    """
+    await manager.send_progress(message['client_id'], message['data'])
+
+
 @router.websocket("/ws/progress/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
     await manager.connect(websocket, client_id)
@@ -46,3 +60,109 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
     except Exception as e:
         print(f"Erro no WebSocket {client_id}: {e}")
         manager.disconnect(client_id)
+
+
+# Alterações enviadas por mensagem na assinatura da fila
+QUEUE_EVENT_PAGE = 500
+
+
+def _compact_item(item) -> dict:
+    """Campos que mudam durante o download (o restante já foi enviado no primeiro evento do item)"""
+    return {
+        "id": item.id,
+        "status": item.status,
+        "progress": item.progress,
+        "message": item.message,
+        "error": item.error,
+        "downloaded": item.downloaded
+    }
+
+
+async def _pump_queue_changes(websocket: WebSocket, batch_id: Optional[str], since: Optional[int],
+                              event: asyncio.Event):
+    """Envia as alterações da fila (do lote) agrupadas, a partir da versão `since`"""
+    interval = 1 / max(0.1, settings.PROGRESS_UPDATES_PER_SECOND)
+    known: Set[str] = set()
+    
+    def in_batch(item) -> bool:
+        return batch_id is None or item.in_batch(batch_id)
+    
+    async def send_snapshot() -> int:
+        seq = queue_manager.version
+        items = [item for item in queue_manager.get_all_items() if in_batch(item)]
+        known.clear()
+        known.update(item.id for item in items)
+        await websocket.send_json({
+            "type": "snapshot",
+            "seq": seq,
+            "batch_id": batch_id,
+            "items": [serialize_item(item) for item in items]
+        })
+        return seq
+    
+    if since is None:
+        since = await send_snapshot()
+    
+    while True:
+        event.clear()
+        changes = queue_manager.changes_since(since, QUEUE_EVENT_PAGE)
+        if changes is None:
+            # Versão não é mais conhecida (histórico cortado ou servidor reiniciado)
+            since = await send_snapshot()
+            continue
+        
+        items = [item for item in changes['items'] if in_batch(item)]
+        removed = [
+            item_id for item_id in changes['removed']
+            if batch_id is None or batch_id in changes['removed_batches'].get(item_id, [])
+        ]
+        if items or removed:
+            await websocket.send_json({
+                "type": "changes",
+                "seq": changes['version'],
+                "items": [
+                    _compact_item(item) if item.id in known else serialize_item(item)
+                    for item in items
+                ],
+                "removed": removed
+            })
+            known.update(item.id for item in items)
+            known.difference_update(removed)
+        since = changes['version']
+        
+        if not changes['has_more']:
+            await event.wait()
+            # Junta as alterações do intervalo numa única mensagem
+            await asyncio.sleep(interval)
+
+
+@router.websocket("/ws/queue")
+async def queue_subscription(websocket: WebSocket, batch_id: Optional[str] = None, since: Optional[int] = None):
+    """
+    Assinatura das alterações da fila em lote numa única conexão.
+    
+    - batch_id: só os itens do lote/sessão (sem ele, a fila inteira)
+    - since: última `seq` recebida; retoma após reconexão sem perder alterações
+    
+    Mensagens:
+    - {"type": "snapshot", "seq", "items"}: estado completo (sem `since` ou quando a
+      versão não é mais conhecida)
+    - {"type": "changes", "seq", "items", "removed"}: alterações agrupadas; itens já
+      enviados nesta conexão vêm compactos (status, progress, message, error, downloaded)
+    """
+    await websocket.accept()
+    event = queue_manager.watch()
+    pump = asyncio.create_task(_pump_queue_changes(websocket, batch_id, since, event))
+    try:
+        while True:
+            data = await websocket.receive_text()
+            if data == "ping":
+                await websocket.send_text("pong")
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Erro na assinatura da fila: {e}")
+    finally:
+        queue_manager.unwatch(event)
+        pump.cancel()
+        await asyncio.gather(pump, return_exceptions=True)
@@ -3,7 +3,6 @@ Extrai cookies do navegador do usuário para usar no yt-dlp e pytubefix.
 Permite downloads autenticados usando a sessão do YouTube do navegador.
 """
 
-import browser_cookie3
 import tempfile
 import os
 from typing import Optional
@@ -34,6 +33,9 @@ class BrowserCookieExtractor:
         try:
             print("🍪 Tentando extrair cookies do navegador...")
             
+            # Importado aqui: só o ambiente de desenvolvimento usa (e o import é pesado)
+            import browser_cookie3
+            
             # Lista de funções de extração de cookies por navegador
             extractors = [
                 ('Chrome', browser_cookie3.chrome),
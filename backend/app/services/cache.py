@@ -0,0 +1,200 @@
+"""
+Cache em memória com limite de tamanho (LRU), expiração (TTL) e
+coalescência de requisições (single-flight).
+
+Várias buscas simultâneas pela mesma chave compartilham uma única
+execução do loader: a primeira thread executa, as demais aguardam o
+mesmo resultado (ou a mesma exceção).
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+def _consume_exception(task: "asyncio.Future"):
+    """Marca a exceção da carga como lida (o dono pode ter desistido de esperar)"""
+    if not task.cancelled():
+        task.exception()
+
+
+class TTLCache:
+    """Cache LRU com TTL, contadores de hit/miss e single-flight"""
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 600, name: str = "cache"):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+        # Contadores
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _get_locked(self, key: Hashable) -> Tuple[bool, Any]:
+        """Busca a chave (lock já adquirido). Remove entradas expiradas."""
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            return False, None
+
+        self._data.move_to_end(key)
+        return True, value
+
+    def _set_locked(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Grava a chave (lock já adquirido) e aplica o limite de tamanho"""
+        ttl = self.ttl_seconds if ttl is None else ttl
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Retorna o valor em cache ou `default`"""
+        with self._lock:
+            found, value = self._get_locked(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Grava um valor no cache"""
+        with self._lock:
+            self._set_locked(key, value, ttl)
+
+    def delete(self, key: Hashable):
+        """Remove uma chave do cache"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Limpa o cache (não afeta cargas em andamento)"""
+        with self._lock:
+            self._data.clear()
+
+    def _begin(self, key: Hashable) -> Tuple[bool, Any, Optional[Future], bool]:
+        """
+        Inicia uma busca single-flight.
+        Retorna (encontrado, valor, future, é_dono_da_carga).
+        """
+        with self._lock:
+            found, value = self._get_locked(key)
+            if found:
+                self.hits += 1
+                return True, value, None, False
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return False, None, future, False
+
+            self.misses += 1
+            future = Future()
+            self._inflight[key] = future
+            return False, None, future, True
+
+    def _finish(self, key: Hashable, future: Future, value: Any = None,
+                error: Optional[BaseException] = None):
+        """Conclui a carga: grava no cache (se houver valor) e libera os que aguardam"""
+        with self._lock:
+            self._inflight.pop(key, None)
+            if error is None and value is not None:
+                self._set_locked(key, value)
+
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Retorna o valor em cache ou executa `loader()` uma única vez,
+        mesmo com várias threads pedindo a mesma chave ao mesmo tempo.
+        Resultados `None` e exceções não são guardados.
+        """
+        found, value, future, owner = self._begin(key)
+        if found:
+            return value
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = loader()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+
+        self._finish(key, future, value=value)
+        return value
+
+    async def aget_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Versão async de get_or_load: `loader()` deve retornar uma coroutine"""
+        found, value, future, owner = self._begin(key)
+        if found:
+            return value
+
+        if not owner:
+            # shield: cancelar um dos que aguardam não cancela a carga compartilhada
+            return await asyncio.shield(asyncio.wrap_future(future))
+
+        # A carga roda numa task própria: cancelar o dono (timeout, cliente desconectou)
+        # só para a espera dele; a carga termina, preenche o cache e libera os demais
+        task = asyncio.ensure_future(self._load(key, future, loader))
+        task.add_done_callback(_consume_exception)
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, future: Future, loader: Callable[[], Any]) -> Any:
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            # Só a própria carga cancelada (ex.: desligamento): quem aguarda recebe um erro comum,
+            # nunca o CancelledError, que passaria pelo `except Exception` das rotas
+            self._finish(key, future, error=RuntimeError(f"Carga de {key!r} cancelada"))
+            raise
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+
+        self._finish(key, future, value=value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna estatísticas do cache"""
+        with self._lock:
+            size = len(self._data)
+            inflight = len(self._inflight)
+
+        lookups = self.hits + self.misses
+        return {
+            'name': self.name,
+            'size': size,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'inflight': inflight,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,264 @@
+"""
+Download direto de URLs de mídia simples (CDN do TikTok, formatos HTTP
+progressivos escolhidos pelo yt-dlp) com várias conexões em paralelo.
+
+Uma única conexão fica bem abaixo da banda disponível: as CDNs limitam a
+taxa por conexão. O fetcher:
+
+- Sonda a URL com um GET de 1 byte (Range: bytes=0-0): 206 + Content-Range
+  informam o tamanho e o suporte a intervalos; se o servidor ignora o Range
+  (200), a própria resposta vira o download em uma conexão
+- Arquivos grandes são divididos em intervalos baixados em paralelo, cada um
+  escrito na sua posição de um arquivo pré-alocado, com buffers grandes
+- Intervalo que falha é retomado de onde parou (só ele, não o arquivo todo)
+- Conexões keep-alive de uma sessão compartilhada entre todos os downloads
+"""
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.metrics import DIRECT_FETCH, DIRECT_FETCH_RETRIES
+
+
+# (bytes recebidos, tamanho total ou None)
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+
+class FetchError(Exception):
+    """Download direto falhou (status inesperado ou intervalo sem sucesso após as tentativas)"""
+
+
+@dataclass
+class FetchResult:
+    path: Path
+    size: int
+    segments: int  # 1 = download em uma conexão
+    retries: int
+    seconds: float
+
+    @property
+    def ranged(self) -> bool:
+        return self.segments > 1
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.size / self.seconds if self.seconds > 0 else 0.0
+
+
+class _Progress:
+    """Soma os bytes de todos os intervalos e repassa ao callback"""
+
+    def __init__(self, total: Optional[int], callback: Optional[ProgressCallback]):
+        self.total = total
+        self.callback = callback
+        self.done = 0
+        self._lock = threading.Lock()
+
+    def add(self, amount: int):
+        with self._lock:
+            self.done += amount
+            done = self.done
+        if self.callback:
+            self.callback(done, self.total)
+
+
+def _content_range_total(value: Optional[str]) -> Optional[int]:
+    """Tamanho total de 'bytes 0-0/12345' (None se desconhecido: 'bytes 0-0/*')"""
+    if not value or '/' not in value:
+        return None
+    total = value.rsplit('/', 1)[1].strip()
+    return int(total) if total.isdigit() else None
+
+
+class DirectFetcher:
+    def __init__(self, max_connections: int = 4, min_segment_bytes: int = 4 * 1024 * 1024,
+                 buffer_bytes: int = 1024 * 1024, segment_retries: int = 3, timeout: float = 30):
+        self.max_connections = max(1, max_connections)
+        self.min_segment_bytes = max(1, min_segment_bytes)
+        self.buffer_bytes = buffer_bytes
+        self.segment_retries = segment_retries
+        self.timeout = timeout
+
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """Sessão compartilhada (requests importado no primeiro uso)"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    # Conexões por host suficientes para os intervalos de todos os downloads simultâneos
+                    # (o tuner de download pode passar de DIRECT_FETCH_MAX_CONNECTIONS dentro do orçamento global)
+                    adapter = HTTPAdapter(
+                        pool_connections=16,
+                        pool_maxsize=max(self.max_connections * max(1, settings.DOWNLOAD_WORKERS),
+                                         settings.TUNER_MAX_TOTAL_CONNECTIONS)
+                    )
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def fetch(self, url: str, dest: Path, headers: Optional[Dict[str, str]] = None,
+              progress: Optional[ProgressCallback] = None, connections: Optional[int] = None) -> FetchResult:
+        """
+        Baixa `url` para `dest`. `connections` limita os intervalos em paralelo
+        (padrão: DIRECT_FETCH_MAX_CONNECTIONS). Levanta FetchError se não conseguir.
+        """
+        started = time.perf_counter()
+        headers = dict(headers or {})
+        connections = max(1, connections or self.max_connections)
+        mode = 'single'
+        try:
+            probe = self.session.get(url, headers={**headers, 'Range': 'bytes=0-0'}, stream=True, timeout=self.timeout)
+            if probe.status_code == 200:
+                # Range ignorado: aproveita a resposta como download em uma conexão
+                length = probe.headers.get('Content-Length')
+                tracker = _Progress(int(length) if length and length.isdigit() else None, progress)
+                with probe, open(dest, 'wb') as f:
+                    size = self._copy(probe, f, tracker)
+                result = FetchResult(dest, size, segments=1, retries=0, seconds=time.perf_counter() - started)
+            elif probe.status_code == 206:
+                with probe:
+                    probe.content  # 1 byte: lido para a conexão voltar ao pool
+                total = _content_range_total(probe.headers.get('Content-Range'))
+                if total is None:
+                    raise FetchError("Servidor aceitou Range mas não informou o tamanho")
+                segments = self._plan(total, connections)
+                mode = 'ranged' if len(segments) > 1 else 'single'
+                retries = self._fetch_segments(url, headers, dest, total, segments, _Progress(total, progress))
+                result = FetchResult(dest, total, segments=len(segments), retries=retries,
+                                     seconds=time.perf_counter() - started)
+            else:
+                probe.close()
+                raise FetchError(f"HTTP {probe.status_code} ao acessar a mídia")
+        except Exception as e:
+            DIRECT_FETCH.inc(mode=mode, result='error')
+            Path(dest).unlink(missing_ok=True)
+            if isinstance(e, FetchError):
+                raise
+            raise FetchError(f"Falha no download direto: {e}") from e
+
+        DIRECT_FETCH.inc(mode=mode, result='ok')
+        print(f"⬇ Download direto: {result.size / 1024 / 1024:.1f}MB em {result.seconds:.2f}s "
+              f"({result.bytes_per_second / 1024 / 1024:.1f}MB/s, {result.segments} conexões, {result.retries} retomadas)")
+        return result
+
+    def _plan(self, total: int, connections: int) -> List[Tuple[int, int]]:
+        """Intervalos [início, fim] (inclusivos) de tamanho parecido, nenhum menor que o mínimo"""
+        count = max(1, min(connections, total // self.min_segment_bytes))
+        size = math.ceil(total / count)
+        return [(start, min(start + size, total) - 1) for start in range(0, total, size)]
+
+    def _copy(self, response, f, tracker: _Progress) -> int:
+        written = 0
+        for chunk in response.iter_content(self.buffer_bytes):
+            if chunk:
+                f.write(chunk)
+                written += len(chunk)
+                tracker.add(len(chunk))
+        return written
+
+    @staticmethod
+    def _preallocate(dest: Path, total: int):
+        with open(dest, 'wb') as f:
+            try:
+                os.posix_fallocate(f.fileno(), 0, total)
+            except (AttributeError, OSError):
+                # Windows ou sistema de arquivos sem fallocate: arquivo esparso do tamanho final
+                f.truncate(total)
+
+    def _fetch_segments(self, url: str, headers: Dict[str, str], dest: Path, total: int,
+                        segments: List[Tuple[int, int]], tracker: _Progress) -> int:
+        """Baixa os intervalos em paralelo; retorna o total de retomadas"""
+        self._preallocate(dest, total)
+        failed = threading.Event()
+        with ThreadPoolExecutor(max_workers=len(segments), thread_name_prefix='mediavid-fetch') as pool:
+            futures = [
+                pool.submit(self._fetch_segment, url, headers, dest, start, end, tracker, failed)
+                for start, end in segments
+            ]
+            retries = 0
+            error = None
+            for future in futures:
+                try:
+                    retries += future.result()
+                except Exception as e:
+                    failed.set()
+                    error = error or e
+        if error:
+            raise error
+        return retries
+
+    def _fetch_segment(self, url: str, headers: Dict[str, str], dest: Path, start: int, end: int,
+                       tracker: _Progress, failed: threading.Event) -> int:
+        """
+        Um intervalo [start, end]; em caso de erro retoma a partir do último byte gravado.
+        O limite de tentativas vale para falhas seguidas sem avançar. Retorna as retomadas.
+        """
+        position = start
+        attempts = 0
+        retries = 0
+        failed_at = start
+        with open(dest, 'r+b', buffering=0) as f:
+            while position <= end:
+                try:
+                    response = self.session.get(
+                        url, headers={**headers, 'Range': f'bytes={position}-{end}'}, stream=True, timeout=self.timeout
+                    )
+                    with response:
+                        if response.status_code != 206:
+                            raise FetchError(f"HTTP {response.status_code} no intervalo {position}-{end}")
+                        f.seek(position)
+                        for chunk in response.iter_content(self.buffer_bytes):
+                            if failed.is_set():
+                                raise FetchError("Download cancelado: outro intervalo falhou")
+                            if not chunk:
+                                continue
+                            chunk = chunk[:end - position + 1]
+                            f.write(chunk)
+                            position += len(chunk)
+                            tracker.add(len(chunk))
+                            if position > end:
+                                break
+                    if position <= end:
+                        raise FetchError(f"Conexão encerrada no byte {position} do intervalo {start}-{end}")
+                except Exception as e:
+                    if failed.is_set():
+                        raise
+                    if position > failed_at:
+                        attempts = 0
+                    failed_at = position
+                    attempts += 1
+                    retries += 1
+                    if attempts > self.segment_retries:
+                        failed.set()  # Os outros intervalos param no próximo bloco
+                        raise FetchError(f"Intervalo {start}-{end} falhou após {self.segment_retries} tentativas: {e}")
+                    DIRECT_FETCH_RETRIES.inc()
+                    print(f"⚠ Intervalo {start}-{end} interrompido em {position} ({e}), retomando...")
+                    time.sleep(min(2.0, 0.25 * 2 ** attempts))
+        return retries
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+
+# Instância global do fetcher
+direct_fetcher = DirectFetcher(
+    max_connections=settings.DIRECT_FETCH_MAX_CONNECTIONS,
+    min_segment_bytes=settings.DIRECT_FETCH_MIN_SEGMENT_KB * 1024,
+    buffer_bytes=settings.DIRECT_FETCH_BUFFER_KB * 1024,
+    segment_retries=settings.DIRECT_FETCH_SEGMENT_RETRIES
+)
@@ -0,0 +1,356 @@
+"""
+Ajuste automático de fragmentos em paralelo e tamanho de chunk por
+plataforma + host da CDN.
+
+Antes, todo download usava 10 fragmentos simultâneos e chunks de 10MB
+(Reddit/Pinterest: 1 fragmento, sem chunk), valores fixos que não servem
+para todas as CDNs: umas limitam por conexão (mais fragmentos = mais rápido),
+outras derrubam conexões demais (mais fragmentos = mais retries).
+
+- Cada download registra vazão (bytes/s) e taxa de erro (retries por
+  fragmento/chunk/intervalo) na chave 'Plataforma|domínio da CDN'
+- Concorrência anda numa escada (1, 2, 3, 4, 6, 8, 12, 16...) por subida de
+  encosta: mede o vizinho ainda não medido e volta ao melhor nível conhecido
+- Taxa de erro alta corta concorrência e chunk pela metade; downloads sem
+  erro dobram o chunk até o limite
+- Medições envelhecem: depois de TUNER_STALE_SECONDS o nível é medido de novo
+- A concorrência de cada download é limitada pelo orçamento global de
+  conexões dividido pelos downloads em andamento
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from ipaddress import ip_address
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from app.config import settings
+from app.services.metrics import TUNER_ADJUSTMENTS
+
+
+# Plataformas em que fragmentos em paralelo e chunks já causaram problemas: começam no mínimo, sem chunk
+CONSERVATIVE_PLATFORMS = ('Reddit', 'Pinterest')
+
+LADDER = (1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 48, 64)
+
+ERROR_BACKOFF_RATE = 0.1  # Retries por fragmento acima disso cortam concorrência e chunk
+MIN_SAMPLE_BYTES = 1024 * 1024  # Downloads menores medem mais latência que vazão
+BETTER_MARGIN = 0.05  # Outro nível precisa ser 5% mais rápido para valer a troca
+EWMA_ALPHA = 0.3
+
+
+def cdn_host(url: Optional[str]) -> str:
+    """Domínio base do host da mídia ('rr3---sn-abc.googlevideo.com' -> 'googlevideo.com')"""
+    host = (urlparse(url or '').hostname or '').lower()
+    if not host:
+        return 'unknown'
+    try:
+        ip_address(host)
+        return host
+    except ValueError:
+        return '.'.join(host.split('.')[-2:])
+
+
+@dataclass
+class _Level:
+    throughput: float  # EWMA em bytes/s
+    samples: int
+    updated: float
+
+
+@dataclass
+class _HostState:
+    concurrency: int
+    chunk_size: Optional[int]
+    levels: Dict[int, _Level] = field(default_factory=dict)
+    error_rate: float = 0.0  # EWMA de retries por fragmento
+    direction: int = 1
+    jobs: int = 0
+    converged: bool = False
+    last_adjustment: str = 'initial'
+
+
+class TuningSession:
+    """
+    Parâmetros escolhidos para um download e o que foi medido nele.
+    Usado como context manager: a medição é entregue ao tuner na saída.
+    """
+
+    def __init__(self, tuner: 'DownloadTuner', key: str, platform: str, concurrency: int, chunk_size: Optional[int]):
+        self.tuner = tuner
+        self.key = key
+        self.platform = platform
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+
+        self.bytes = 0
+        self.seconds = 0.0
+        self.units = 0  # Fragmentos, chunks ou intervalos baixados
+        self.errors = 0  # Retries (fragmento, chunk HTTP, intervalo do direct_fetcher)
+        self.limited = False  # Alguma amostra teve menos partes que a concorrência (não mede o nível)
+        self._fragment_count = 0
+        self._lock = threading.Lock()
+
+    def ydl_params(self) -> Dict[str, Any]:
+        """Opções do yt-dlp com os valores escolhidos e o logger que conta os retries"""
+        return {
+            'concurrent_fragment_downloads': self.concurrency,
+            'http_chunk_size': self.chunk_size,
+            'logger': _RetryCounter(self),
+        }
+
+    def progress_hook(self, d: Dict[str, Any]):
+        """Hook de progresso do yt-dlp: cada formato concluído vira uma amostra"""
+        if d.get('fragment_count'):
+            self._fragment_count = d['fragment_count']
+        if d.get('status') != 'finished' or not d.get('elapsed'):
+            return
+        size = d.get('total_bytes') or d.get('downloaded_bytes') or 0
+        if self._fragment_count:
+            self.record(size, d['elapsed'], self._fragment_count, parallel=self._fragment_count)
+        else:
+            # HTTP progressivo: chunks em sequência, a concorrência não se aplica
+            self.record(size, d['elapsed'], math.ceil(size / self.chunk_size) if self.chunk_size else 1, parallel=1)
+        self._fragment_count = 0
+
+    def record_fetch(self, result):
+        """Amostra de um download do direct_fetcher (FetchResult)"""
+        self.record(result.size, result.seconds, result.segments, result.retries, parallel=result.segments)
+
+    def record(self, size: int, seconds: float, units: int, errors: int = 0, parallel: Optional[int] = None):
+        with self._lock:
+            self.bytes += size
+            self.seconds += seconds
+            self.units += max(1, units)
+            self.errors += errors
+            if parallel is not None and parallel < self.concurrency:
+                self.limited = True
+
+    def add_error(self):
+        with self._lock:
+            self.errors += 1
+
+    @property
+    def throughput(self) -> Optional[float]:
+        return self.bytes / self.seconds if self.seconds > 0 else None
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / max(1, self.units)
+
+    def summary(self) -> Dict[str, Any]:
+        """Parâmetros e medição do download (vai no resultado do job)"""
+        throughput = self.throughput
+        return {
+            'key': self.key,
+            'concurrency': self.concurrency,
+            'chunk_size': self.chunk_size,
+            'bytes': self.bytes,
+            'seconds': round(self.seconds, 3),
+            'throughput': round(throughput) if throughput else None,
+            'fragments': self.units,
+            'retries': self.errors,
+            'limited': self.limited,
+        }
+
+    def __enter__(self) -> 'TuningSession':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            # Download que falhou com retries conta como erro no nível usado
+            # (falha sem retries, como um 404, não diz nada sobre a concorrência)
+            with self._lock:
+                self.units = max(1, self.units)
+        self.tuner.finish(self)
+        return False
+
+
+class _RetryCounter:
+    """Logger do yt-dlp: conta as mensagens de retry e de fragmento pulado"""
+
+    def __init__(self, session: TuningSession):
+        self.session = session
+
+    def debug(self, message: str):
+        # Com logger, o yt-dlp manda as mensagens de tela (to_screen) para debug
+        if 'Got error' in message or 'Skipping fragment' in message:
+            self.session.add_error()
+
+    def info(self, message: str):
+        pass
+
+    def warning(self, message: str):
+        pass
+
+    def error(self, message: str):
+        print(f"⚠ yt-dlp: {message}")
+
+
+class DownloadTuner:
+    def __init__(self, min_concurrency: int = 1, max_concurrency: int = 16, initial_concurrency: int = 4,
+                 max_total_connections: int = 32, min_chunk: int = 1024 * 1024, max_chunk: int = 32 * 1024 * 1024,
+                 initial_chunk: int = 10 * 1024 * 1024, stale_seconds: float = 900, max_keys: int = 256):
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.initial_concurrency = min(max(initial_concurrency, self.min_concurrency), self.max_concurrency)
+        self.max_total_connections = max(1, max_total_connections)
+        self.min_chunk = min_chunk
+        self.max_chunk = max(min_chunk, max_chunk)
+        self.initial_chunk = min(max(initial_chunk, self.min_chunk), self.max_chunk)
+        self.stale_seconds = stale_seconds
+        self.max_keys = max_keys
+
+        self.ladder: List[int] = sorted(
+            {level for level in LADDER if self.min_concurrency <= level <= self.max_concurrency}
+            | {self.min_concurrency, self.max_concurrency}
+        )
+        self._states: 'OrderedDict[str, _HostState]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.active = 0
+
+    def begin(self, platform: str, url: Optional[str]) -> TuningSession:
+        """Parâmetros para um download da mídia em `url` (use com `with`)"""
+        key = f"{platform}|{cdn_host(url)}"
+        with self._lock:
+            state = self._state(key, platform)
+            self.active += 1
+            # Orçamento global de conexões dividido entre os downloads em andamento
+            budget = max(self.min_concurrency, self.max_total_connections // self.active)
+            concurrency = self._floor(min(state.concurrency, budget))
+            chunk_size = state.chunk_size
+        return TuningSession(self, key, platform, concurrency, chunk_size)
+
+    def _state(self, key: str, platform: str) -> _HostState:
+        state = self._states.get(key)
+        if state is None:
+            conservative = platform in CONSERVATIVE_PLATFORMS
+            state = _HostState(
+                concurrency=self.min_concurrency if conservative else self.initial_concurrency,
+                chunk_size=None if conservative else self.initial_chunk
+            )
+            self._states[key] = state
+            while len(self._states) > self.max_keys:
+                self._states.popitem(last=False)
+        self._states.move_to_end(key)
+        return state
+
+    def finish(self, session: TuningSession):
+        """Registra a medição do download e escolhe os parâmetros do próximo"""
+        with self._lock:
+            self.active = max(0, self.active - 1)
+            state = self._states.get(session.key)
+            if state is None:
+                return
+            state.jobs += 1
+            reason = None
+            error_rate = session.error_rate
+            state.error_rate += EWMA_ALPHA * (error_rate - state.error_rate)
+
+            now = time.monotonic()
+            for level in [level for level, data in state.levels.items() if now - data.updated > self.stale_seconds]:
+                del state.levels[level]
+
+            if error_rate > ERROR_BACKOFF_RATE:
+                reason = self._back_off(state, session)
+            else:
+                throughput = session.throughput
+                if throughput and session.bytes >= MIN_SAMPLE_BYTES and not session.limited:
+                    level = state.levels.get(session.concurrency)
+                    if level is None:
+                        state.levels[session.concurrency] = _Level(throughput, 1, now)
+                    else:
+                        level.throughput += EWMA_ALPHA * (throughput - level.throughput)
+                        level.samples += 1
+                        level.updated = now
+                    reason = self._climb(state, session.concurrency)
+                if session.errors == 0 and state.chunk_size and state.chunk_size < self.max_chunk:
+                    state.chunk_size = min(self.max_chunk, state.chunk_size * 2)
+            if reason:
+                state.last_adjustment = reason
+            next_concurrency = state.concurrency
+
+        if reason:
+            TUNER_ADJUSTMENTS.inc(platform=session.platform, reason=reason)
+        throughput = session.throughput
+        print(f"🎛 Tuner {session.key}: {session.concurrency} conexões, "
+              f"{throughput / 1024 / 1024 if throughput else 0:.1f}MB/s, {session.errors} retries "
+              f"-> próximo: {next_concurrency} conexões ({reason or 'sem medição'})")
+
+    def _back_off(self, state: _HostState, session: TuningSession) -> str:
+        """Erros demais: metade da concorrência e do chunk, e os níveis acima são medidos de novo"""
+        state.concurrency = self._floor(max(self.min_concurrency, session.concurrency // 2))
+        if state.chunk_size:
+            state.chunk_size = max(self.min_chunk, state.chunk_size // 2)
+        for level in [level for level in state.levels if level > state.concurrency]:
+            del state.levels[level]
+        state.direction = -1
+        state.converged = False
+        return 'backoff'
+
+    def _climb(self, state: _HostState, used: int) -> str:
+        """Subida de encosta na escada de concorrência"""
+        current = state.levels[used].throughput
+        best = max(state.levels, key=lambda level: state.levels[level].throughput)
+        if best != used and state.levels[best].throughput > current * (1 + BETTER_MARGIN):
+            state.concurrency = best
+            state.direction = 1 if best > used else -1
+            return 'best'
+
+        # O nível usado é o melhor conhecido: mede o vizinho que falta, na direção atual primeiro
+        index = self.ladder.index(used)
+        for direction in (state.direction, -state.direction):
+            neighbor = index + direction
+            if 0 <= neighbor < len(self.ladder) and self.ladder[neighbor] not in state.levels:
+                state.concurrency = self.ladder[neighbor]
+                state.direction = direction
+                state.converged = False
+                return 'explore'
+
+        state.concurrency = used
+        state.converged = True
+        return 'hold'
+
+    def _floor(self, value: int) -> int:
+        """Maior nível da escada que não passa de `value`"""
+        return max([level for level in self.ladder if level <= value] or [self.ladder[0]])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'active': self.active,
+                'max_total_connections': self.max_total_connections,
+                'bounds': {
+                    'concurrency': [self.min_concurrency, self.max_concurrency],
+                    'chunk_size': [self.min_chunk, self.max_chunk],
+                },
+                'hosts': {
+                    key: {
+                        'concurrency': state.concurrency,
+                        'chunk_size': state.chunk_size,
+                        'error_rate': round(state.error_rate, 4),
+                        'throughput': {
+                            level: round(data.throughput) for level, data in sorted(state.levels.items())
+                        },
+                        'jobs': state.jobs,
+                        'converged': state.converged,
+                        'last_adjustment': state.last_adjustment,
+                    }
+                    for key, state in self._states.items()
+                },
+            }
+
+
+# Instância global do tuner
+download_tuner = DownloadTuner(
+    min_concurrency=settings.TUNER_MIN_CONCURRENCY,
+    max_concurrency=settings.TUNER_MAX_CONCURRENCY,
+    initial_concurrency=settings.TUNER_INITIAL_CONCURRENCY,
+    max_total_connections=settings.TUNER_MAX_TOTAL_CONNECTIONS,
+    min_chunk=settings.TUNER_MIN_CHUNK_KB * 1024,
+    max_chunk=settings.TUNER_MAX_CHUNK_KB * 1024,
+    initial_chunk=settings.TUNER_INITIAL_CHUNK_KB * 1024,
+    stale_seconds=settings.TUNER_STALE_SECONDS
+)
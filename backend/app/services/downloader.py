@@ -1,21 +1,131 @@
-import yt_dlp
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Set, Tuple
+import copy
 import os
 import shutil
 import subprocess
 import re
 import asyncio
-import requests
 import random
 import string
-import time
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 from app.models.video import VideoInfo, VideoFormat, DownloadRequest
-from app.utils.validators import detect_platform, sanitize_filename
+from app.utils.validators import detect_platform, sanitize_filename, canonicalize_url, canonical_key, is_short_link
 from app.config import settings
-from app.services.tiktok_fallback import TikTokFallback
+from app.services.tiktok_fallback import tiktok_fallback, Provider, DOWNLOAD_HEADERS as TIKTOK_DOWNLOAD_HEADERS
+from app.services.cache import TTLCache
+from app.services.media_store import MediaStore, StoredMedia
 from app.services.browser_cookies import BrowserCookieExtractor
+from app.services.rate_limiter import rate_limiter, RateLimitedError
+from app.services.metrics import STAGE_LATENCY, BYTES
+from app.services.progress_bus import progress_bus
+from app.services.shared_state import shared_state
+from app.services.ydl_pool import ydl_pool
+from app.services.postprocess import postprocessor
+from app.services.direct_fetcher import direct_fetcher, FetchError
+from app.services.download_tuner import download_tuner, TuningSession
+from app.services.source_health import source_health
+from app.services.youtube_strategies import youtube_strategies, YouTubeStrategy
+
+
+class ExtractionError(Exception):
+    """Falha ao extrair informações, com a mensagem amigável e a classe do erro (métricas)"""
+    
+    def __init__(self, message: str, error_class: str = 'other'):
+        super().__init__(message)
+        self.error_class = error_class
+    
+    @property
+    def permanent(self) -> bool:
+        """Erro que não muda tentando de novo (privado, removido, URL inválida...)"""
+        return self.error_class in PERMANENT_ERROR_CLASSES
+
+
+# Formatos de áudio servidos direto pelo 'music' das APIs do TikTok (MP3)
+TIKTOK_API_AUDIO_FORMATS = ('mp3', 'best', 'original')
+
+# Classes de erro em que não adianta tentar baixar depois (a fila marca o item como falha na hora)
+PERMANENT_ERROR_CLASSES = ('unsupported_url', 'private', 'unavailable', 'geo_restricted', 'not_found', 'empty_media')
+
+# Opções do download que mudam a cada requisição: ficam fora da instância do pool
+# que só seleciona os formatos (senão cada download criaria uma instância nova)
+PER_DOWNLOAD_YDL_OPTS = ('outtmpl', 'progress_hooks', 'postprocessor_hooks')
+
+
+class DownloaderExecutors:
+    """
+    Pools de threads dedicados para o trabalho bloqueante do downloader.
+    
+    yt-dlp, requests e ffmpeg são síncronos: executá-los direto nos handlers
+    async trava o event loop inteiro (inclusive /api/health/ping). Extração de
+    metadados e downloads completos usam pools separados para que downloads
+    longos não ocupem as vagas das chamadas rápidas de /info.
+    """
+    
+    def __init__(self, info_workers: int, download_workers: int):
+        self.info_pool = ThreadPoolExecutor(
+            max_workers=max(1, info_workers),
+            thread_name_prefix='mediavid-info'
+        )
+        self.download_pool = ThreadPoolExecutor(
+            max_workers=max(1, download_workers),
+            thread_name_prefix='mediavid-download'
+        )
+        
+        # Ocupação dos pools (métricas de saturação): tarefas enviadas e em execução
+        self._lock = threading.Lock()
+        self._submitted = {'info': 0, 'download': 0}
+        self._running = {'info': 0, 'download': 0}
+    
+    def _tracked(self, pool: str, func):
+        def run():
+            with self._lock:
+                self._running[pool] += 1
+            try:
+                return func()
+            finally:
+                with self._lock:
+                    self._running[pool] -= 1
+        return run
+    
+    async def _run(self, pool: str, executor: ThreadPoolExecutor, func):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._submitted[pool] += 1
+        try:
+            return await loop.run_in_executor(executor, self._tracked(pool, func))
+        finally:
+            with self._lock:
+                self._submitted[pool] -= 1
+    
+    async def run_info(self, func, *args, **kwargs):
+        """Executa uma extração de metadados no pool de info"""
+        return await self._run('info', self.info_pool, partial(func, *args, **kwargs))
+    
+    async def run_download(self, func, *args, **kwargs):
+        """Executa um download completo no pool de downloads"""
+        return await self._run('download', self.download_pool, partial(func, *args, **kwargs))
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Workers, tarefas em execução e tarefas aguardando vaga em cada pool"""
+        with self._lock:
+            return {
+                pool: {
+                    'workers': executor._max_workers,
+                    'busy': self._running[pool],
+                    'queued': max(0, self._submitted[pool] - self._running[pool]),
+                }
+                for pool, executor in (('info', self.info_pool), ('download', self.download_pool))
+            }
+    
+    def shutdown(self, wait: bool = False):
+        """Encerra os pools (chamado no shutdown da aplicação)"""
+        self.info_pool.shutdown(wait=wait, cancel_futures=True)
+        self.download_pool.shutdown(wait=wait, cancel_futures=True)
 
 
 class VideoDownloader:
@@ -23,24 +133,91 @@ class VideoDownloader:
         self.temp_path = Path(settings.TEMP_DOWNLOAD_PATH)
         self.temp_path.mkdir(exist_ok=True)
         
-        # Detecta FFmpeg
-        self.ffmpeg_location = self._find_ffmpeg()
+        # FFmpeg e cookies do YouTube são resolvidos no primeiro uso (ou no aquecimento
+        # do startup): o import do módulo não procura executáveis nem abre navegadores
+        self._lazy: Dict[str, Any] = {}
+        self._lazy_lock = threading.Lock()
         
         # Referência ao manager de WebSocket (será injetada)
         self.ws_manager = None
         
-        # Cache de informações de vídeo (evita requisições duplicadas)
-        self._info_cache = {}
+        # Pools de threads para extração e download (não bloqueiam o event loop)
+        self.executors = DownloaderExecutors(
+            info_workers=settings.INFO_WORKERS,
+            download_workers=settings.DOWNLOAD_WORKERS
+        )
+        
+        # Cache de informações de vídeo (LRU + TTL, coalesce requisições simultâneas)
+        self._info_cache = TTLCache(
+            max_entries=settings.INFO_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.INFO_CACHE_TTL_SECONDS,
+            name='video_info'
+        )
+        
+        # Dicionário bruto do yt-dlp (sanitizado) da última extração de cada vídeo:
+        # o download seguinte usa process_ie_result em vez de extrair de novo.
+        # TTL curto: as URLs de mídia assinadas dentro dele expiram.
+        self._raw_info_cache = TTLCache(
+            max_entries=settings.RAW_INFO_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.RAW_INFO_CACHE_TTL_SECONDS,
+            name='raw_info'
+        )
         
-        # Fallback para TikTok
-        self.tiktok_fallback = TikTokFallback()
+        # Cache das respostas da API alternativa do TikTok (inclui a URL de download direto)
+        self._tiktok_cache = TTLCache(
+            max_entries=settings.INFO_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.INFO_CACHE_TTL_SECONDS,
+            name='tiktok_api'
+        )
         
-        # Cookies do YouTube
-        self.youtube_cookies_file = self._setup_youtube_cookies()
+        # Fallback para TikTok (APIs alternativas em corrida)
+        self.tiktok_fallback = tiktok_fallback
+        # yt-dlp entra na cadeia do YouTube ao lado do scraping e do pytubefix
+        self.youtube_strategies = youtube_strategies
+        self.youtube_strategies.register(YouTubeStrategy(
+            'ytdlp', self._try_youtube_with_different_configs, settings.YOUTUBE_YTDLP_TIMEOUT_SECONDS
+        ))
+    
+    def _lazy_value(self, name: str, factory):
+        """Calcula o valor uma única vez, mesmo com várias threads pedindo ao mesmo tempo"""
+        if name not in self._lazy:
+            with self._lazy_lock:
+                if name not in self._lazy:
+                    self._lazy[name] = factory()
+        return self._lazy[name]
+    
+    @property
+    def media_store(self) -> MediaStore:
+        """
+        Armazenamento persistente dos arquivos baixados (downloads repetidos saem do disco).
+        Aberto no startup: ler o índice e remover órfãos não acontece no import.
+        """
+        return self._lazy_value('media_store', lambda: MediaStore(
+            root=Path(settings.media_store_path),
+            max_bytes=settings.MEDIA_STORE_MAX_MB * 1024 * 1024,
+            grace_seconds=settings.MEDIA_STORE_GRACE_SECONDS,
+            flush_seconds=settings.MEDIA_STORE_INDEX_FLUSH_SECONDS
+        ))
+    
+    def close_media_store(self):
+        """Grava o índice pendente (só se o armazenamento chegou a ser aberto)"""
+        store = self._lazy.get('media_store')
+        if store is not None:
+            store.close()
+    
+    @property
+    def ffmpeg_location(self) -> Optional[str]:
+        return self._lazy_value('ffmpeg', self._find_ffmpeg)
+    
+    @property
+    def youtube_cookies_file(self) -> Optional[str]:
+        return self._lazy_value('youtube_cookies', self._setup_youtube_cookies)
+    
+    def load_extractors(self):
+        """Importa o yt-dlp e carrega os extractors (o que a primeira extração pagaria)"""
+        import yt_dlp
         
-        # Rate limiting para YouTube (evita erro 429)
-        self._youtube_last_request = 0
-        self._youtube_min_interval = 3  # segundos entre requisições
+        yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}).close()
     
     def _setup_youtube_cookies(self) -> Optional[str]:
         """
@@ -103,45 +280,61 @@ class VideoDownloader:
         """Gera código aleatório alfanumérico"""
         return ''.join(random.choices(string.ascii_lowercase + string.digits, k=length))
     
-    def _apply_youtube_rate_limit(self):
-        """Aplica rate limiting para YouTube (evita erro 429)"""
-        elapsed = time.time() - self._youtube_last_request
-        if elapsed < self._youtube_min_interval:
-            sleep_time = self._youtube_min_interval - elapsed
-            print(f"⏱️ Rate limiting: aguardando {sleep_time:.1f}s...")
-            time.sleep(sleep_time)
-        self._youtube_last_request = time.time()
+    def cache_stats(self) -> Dict[str, Any]:
+        """Estatísticas dos caches de metadados e do armazenamento de arquivos"""
+        return {
+            'video_info': self._info_cache.stats(),
+            'tiktok_api': self._tiktok_cache.stats(),
+            'raw_info': self._raw_info_cache.stats(),
+            'media_store': self.media_store.stats(),
+        }
     
-    def set_websocket_manager(self, manager):
-        """Injeta o manager de WebSocket"""
-        self.ws_manager = manager
+    def _remember_raw_info(self, url: str, info: Dict[str, Any]):
+        """Guarda o resultado de extract_info(download=False) para o download reaproveitar"""
+        import yt_dlp
+        
+        try:
+            # Sem as chaves privadas (requested_formats, filepath...), como no --load-info-json:
+            # um download com outro formato não herda a seleção anterior
+            self._raw_info_cache.set(canonical_key(url), yt_dlp.YoutubeDL.sanitize_info(info, remove_private_keys=True))
+        except Exception as e:
+            print(f"⚠ Não foi possível guardar a extração: {e}")
     
-    async def send_progress(self, client_id: Optional[str], stage: str, progress: int, message: str):
-        """Envia progresso via WebSocket se disponível"""
-        if self.ws_manager and client_id:
+    def _extract_or_reuse(self, ydl, url: str, download: bool) -> Optional[Dict[str, Any]]:
+        """
+        extract_info(url) ou, se houver extração recente deste vídeo, process_ie_result
+        sobre ela: seleção de formato e download sem buscar de novo página/API da plataforma.
+        """
+        raw = self._raw_info_cache.get(canonical_key(url))
+        if raw is not None:
             try:
-                await self.ws_manager.send_progress(client_id, {
-                    'stage': stage,
-                    'progress': progress,
-                    'message': message
-                })
+                print("⚡ Reutilizando extração recente (sem nova requisição de metadados)")
+                # process_ie_result altera o dicionário: trabalha sobre uma cópia
+                return ydl.process_ie_result(copy.deepcopy(raw), download=download)
             except Exception as e:
-                print(f"Erro ao enviar progresso: {e}")
+                # URL assinada expirada, formato sumiu etc.: extrai de novo
+                print(f"⚠ Extração reaproveitada falhou ({str(e)[:120]}), extraindo de novo...")
+                self._raw_info_cache.delete(canonical_key(url))
+        
+        info = ydl.extract_info(url, download=download)
+        if info and not download:
+            self._remember_raw_info(url, info)
+        return info
     
-    def send_progress_sync(self, client_id: Optional[str], stage: str, progress: int, message: str):
-        """Versão síncrona para send_progress - cria novo event loop se necessário"""
-        if self.ws_manager and client_id:
-            try:
-                # Tenta pegar loop existente ou cria um novo
-                try:
-                    loop = asyncio.get_running_loop()
-                    # Se já existe um loop rodando, agenda a coroutine
-                    asyncio.create_task(self.send_progress(client_id, stage, progress, message))
-                except RuntimeError:
-                    # Não há loop rodando, executa diretamente
-                    asyncio.run(self.send_progress(client_id, stage, progress, message))
-            except Exception as e:
-                print(f"Erro ao enviar progresso: {e}")
+    def set_websocket_manager(self, manager):
+        """
+        Injeta o manager de WebSocket. O progresso passa pelo estado compartilhado:
+        com vários workers, quem entrega é o worker onde o WebSocket está conectado.
+        """
+        self.ws_manager = manager
+        progress_bus.set_sender(shared_state.publish_progress)
+    
+    def publish_progress(self, client_id: Optional[str], stage: str, progress: int, message: str):
+        """
+        Publica progresso no barramento (seguro nas threads dos pools).
+        O envio é limitado a PROGRESS_UPDATES_PER_SECOND por cliente, com o valor mais recente.
+        """
+        progress_bus.publish(client_id, stage, progress, message)
     
     def _find_ffmpeg(self) -> Optional[str]:
         """Encontra o FFmpeg no sistema"""
@@ -203,21 +396,65 @@ class VideoDownloader:
         
         return configs.get(platform, {})
     
+    def _get_info_opts(self, platform: str) -> Dict[str, Any]:
+        """Opções do yt-dlp para extração de metadados (sem download)"""
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'extract_flat': False,
+            'skip_download': True,
+            # Otimizações
+            'socket_timeout': 30,
+            'retries': 3,
+            'ignoreerrors': False,
+            # User-Agent moderno
+            'http_headers': {
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+                'Accept-Language': 'en-us,en;q=0.5',
+                'Sec-Fetch-Mode': 'navigate',
+            },
+            # Configurações específicas por plataforma
+            'extractor_args': self._get_extractor_args(platform)
+        }
+        
+        # Configurações específicas para Instagram (mais permissivo)
+        if platform == 'Instagram':
+            ydl_opts['username'] = None  # Sem autenticação
+            ydl_opts['password'] = None
+            ydl_opts['cookiefile'] = None
+            ydl_opts['nocheckcertificate'] = True
+            # User-Agent mobile do Instagram (menos restritivo)
+            ydl_opts['http_headers'] = {
+                'User-Agent': 'Instagram 76.0.0.15.395 Android (24/7.0; 640dpi; 1440x2560; samsung; SM-G930F; herolte; samsungexynos8890; en_US; 138226743)',
+                'Accept': '*/*',
+                'Accept-Language': 'en-US',
+            }
+        
+        # Configurações específicas para TikTok (bypass login)
+        if platform == 'TikTok':
+            ydl_opts['http_headers'] = {
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+                'Referer': 'https://www.tiktok.com/'
+            }
+            # Tenta extrair sem cookies primeiro
+            ydl_opts['nocheckcertificate'] = True
+        
+        return ydl_opts
+    
     def _try_youtube_with_different_configs(self, url: str) -> Optional[Dict[str, Any]]:
         """
         Tenta extrair informações do YouTube com yt-dlp.
-        Usa rate limiting para evitar erro 429 (Too Many Requests).
+        O intervalo entre requisições é controlado pelo rate_limiter (camada async).
         """
-        
-        # Aplica rate limiting antes de qualquer requisição
-        self._apply_youtube_rate_limit()
-        
         # Config base otimizada para produção
         base_config = {
             'quiet': True,
             'no_warnings': True,
             'skip_download': True,
-            'socket_timeout': 60,
+            # Uma extração faz várias requisições: cada uma para antes do tempo da estratégia
+            # acabar, e a thread do pool termina em vez de seguir presa num socket parado
+            'socket_timeout': max(5, settings.YOUTUBE_YTDLP_TIMEOUT_SECONDS / 3),
             'retries': 3,
             'sleep_interval': 5,  # Delay mínimo entre requisições
             'max_sleep_interval': 15,  # Delay máximo
@@ -242,10 +479,11 @@ class VideoDownloader:
         # Tenta extrair
         try:
             print("🔄 YouTube: Extraindo vídeo...")
-            with yt_dlp.YoutubeDL(base_config) as ydl:  # type: ignore
+            with ydl_pool.acquire('info:YouTube', base_config) as ydl:
                 info = ydl.extract_info(url, download=False)
                 if info:
                     print("✅ Vídeo extraído com sucesso!")
+                    self._remember_raw_info(url, info)
                     return info
         except Exception as e:
             error_msg = str(e).lower()
@@ -257,145 +495,200 @@ class VideoDownloader:
                 try:
                     list_config = base_config.copy()
                     list_config['listformats'] = True
-                    with yt_dlp.YoutubeDL(list_config) as ydl:
+                    with ydl_pool.acquire('info:YouTube', list_config) as ydl:
                         ydl.extract_info(url, download=False)
                 except Exception as list_error:
                     print(f"⚠️ Não foi possível listar formatos: {list_error}")
             
-            # Se é erro 429, informa sobre rate limiting
+            # Erro 429: o rate_limiter reduz a taxa do YouTube em vez de segurar a thread
             if '429' in error_msg or 'too many requests' in error_msg:
-                print("⚠️ Erro 429: Muitas requisições. Aguardando antes de tentar novamente...")
-                time.sleep(30)  # Espera 30s em caso de 429
+                print("⚠️ Erro 429: Muitas requisições. Reduzindo a taxa de requisições ao YouTube...")
+                raise RateLimitedError("Muitas requisições. Por favor, aguarde alguns minutos.")
+            
+            # Vídeo privado/removido: as outras estratégias da cadeia diriam o mesmo
+            error_class, message = self._classify_extraction_error(error_msg, 'YouTube')
+            if error_class in PERMANENT_ERROR_CLASSES:
+                raise ExtractionError(message, error_class)
             
             return None
     
-    def get_video_info(self, url: str) -> VideoInfo:
-        """Extrai informações do vídeo sem baixar"""
+    def _get_tiktok_api_info(self, url: str) -> Optional[Dict[str, Any]]:
+        """Consulta a API alternativa do TikTok passando pelo cache (compartilhado entre /info e /download)"""
+        platform, content_id = canonicalize_url(url)
         
-        # Verifica cache
-        if url in self._info_cache:
-            print("✓ Informações do vídeo recuperadas do cache")
-            return self._info_cache[url]
+        if content_id.isdigit():
+            # ID já resolvido (inclusive de links curtos vm.tiktok.com)
+            loader = lambda: self.tiktok_fallback.get_video_info_api(content_id)
+        else:
+            loader = lambda: self.tiktok_fallback.get_video_info(url)
         
+        return self._tiktok_cache.get_or_load(f"{platform}:{content_id}", loader)
+    
+    async def _get_tiktok_api_info_async(self, url: str) -> Optional[Dict[str, Any]]:
+        """Versão async de _get_tiktok_api_info (a corrida roda no event loop, sem ocupar thread)"""
+        platform, content_id = await self.executors.run_info(canonicalize_url, url)
+        api_url = f"https://www.tiktok.com/@user/video/{content_id}" if content_id.isdigit() else url
+        return await self._tiktok_cache.aget_or_load(
+            f"{platform}:{content_id}", lambda: self.tiktok_fallback.get_video_info_async(api_url)
+        )
+    
+    async def _race_tiktok_info(self, url: str, key: str, trace: Dict[str, Any]) -> VideoInfo:
+        """
+        /info do TikTok: TikWM, SnapTik e yt-dlp em corrida com hedging. A resposta
+        das APIs fica no cache do TikTok (o download usa a URL direta dela).
+        """
+        cached = self._tiktok_cache.get(key)
+        if cached:
+            trace['source'] = 'tiktok_api'
+            return self._tiktok_video_info(cached)
+        
+        content_id = key.split(':', 1)[1]
+        api_url = f"https://www.tiktok.com/@user/video/{content_id}" if content_id.isdigit() else url
+        providers = self.tiktok_fallback.providers(api_url)
+        if settings.TIKTOK_RACE_YTDLP:
+            providers.append(Provider(
+                'ytdlp',
+                settings.TIKTOK_YTDLP_HEDGE_SECONDS,
+                lambda: self.run_upstream('TikTok', 'extract', self.executors.run_info, self._extract_video_info, url, None, False),
+                # Extração lenta mas válida não vira erro com o limite curto das APIs
+                timeout=settings.TIKTOK_YTDLP_TIMEOUT_SECONDS
+            ))
+        
+        print("🎵 TikTok detectado - corrida entre APIs alternativas e yt-dlp...")
+        result = await self.tiktok_fallback.race(providers)
+        if result.source == 'ytdlp':
+            trace['source'] = 'ytdlp'
+            return result.value
+        if result.value:
+            self._tiktok_cache.set(key, result.value)
+            trace['source'] = 'tiktok_api'
+            return self._tiktok_video_info(result.value)
+        if 'ytdlp' in result.errors:
+            # Erro do yt-dlp (privado, removido, 429...) é o que o usuário precisa ver
+            error = result.errors['ytdlp']
+            if isinstance(error, asyncio.TimeoutError):
+                raise ExtractionError(
+                    "Tempo limite excedido ao acessar o TikTok. Tente novamente em instantes.", 'timeout'
+                ) from error
+            raise error
+        
+        print("⚠ API alternativa do TikTok falhou, tentando yt-dlp...")
+        trace['source'] = 'ytdlp'
+        # Circuito do yt-dlp aberto (pulado na corrida): falha na hora em vez de esperar o extractor
+        return await source_health.call('ytdlp', 'TikTok', lambda: self.run_upstream(
+            'TikTok', 'extract', self.executors.run_info, self._extract_video_info, url, None, False
+        ))
+    
+    @staticmethod
+    def _tiktok_video_info(tiktok_info: Dict[str, Any]) -> VideoInfo:
+        """VideoInfo a partir da resposta das APIs alternativas"""
+        return VideoInfo(
+            url=tiktok_info['url'],
+            title=tiktok_info.get('title', 'TikTok Video'),
+            description=tiktok_info.get('description'),
+            thumbnail=tiktok_info.get('thumbnail'),
+            duration=tiktok_info.get('duration', 0),
+            uploader=tiktok_info.get('uploader'),
+            view_count=tiktok_info.get('view_count'),
+            formats=[],  # TikTok tem apenas uma qualidade
+            platform='TikTok'
+        )
+    
+    def get_video_info(self, url: str) -> VideoInfo:
+        """Extrai informações do vídeo sem baixar (com cache e coalescência de requisições)"""
+        # Chave canônica: variações da mesma URL (x.com/twitter.com, ?igsh=..., links curtos) compartilham o cache
+        return self._info_cache.get_or_load(canonical_key(url), lambda: self._extract_video_info(url))
+    
+    @staticmethod
+    def _classify_extraction_error(error_lower: str, platform: str) -> Tuple[str, str]:
+        """Classe do erro (para métricas) e mensagem amigável, sem expor detalhes técnicos do yt-dlp"""
+        if 'unsupported url' in error_lower:
+            return 'unsupported_url', "URL não suportada. Verifique se o link está correto."
+        elif 'private video' in error_lower or 'this video is private' in error_lower:
+            return 'private', "Este vídeo é privado e não pode ser acessado."
+        elif 'video unavailable' in error_lower or 'has been removed' in error_lower or 'no video could be found' in error_lower:
+            return 'unavailable', "Vídeo indisponível, removido ou não contém mídia para download."
+        elif 'sign in' in error_lower or 'login' in error_lower or 'cookies' in error_lower or 'bot' in error_lower or 'authentication' in error_lower:
+            # Mensagem genérica sem mencionar detalhes técnicos
+            if platform == 'Instagram':
+                return 'auth_required', "Este conteúdo do Instagram não está acessível no momento. Tente outro vídeo público."
+            elif platform == 'Twitter':
+                return 'auth_required', "Este conteúdo do Twitter/X não está acessível no momento. Tente outro vídeo público."
+            else:
+                return 'auth_required', "Este vídeo requer autenticação ou não está disponível publicamente."
+        elif 'geo restricted' in error_lower or 'not available in your country' in error_lower:
+            return 'geo_restricted', "Este vídeo tem restrição geográfica e não está disponível na sua região."
+        elif 'http error 429' in error_lower or 'too many requests' in error_lower:
+            return 'rate_limited', "Muitas requisições. Por favor, aguarde alguns minutos."
+        elif 'empty media response' in error_lower:
+            return 'empty_media', "O conteúdo não está disponível ou requer login. Tente outro vídeo público."
+        elif 'http error 404' in error_lower:
+            return 'not_found', "Conteúdo não encontrado. Verifique se o link está correto."
+        else:
+            # Mensagem genérica sem expor stack trace do yt-dlp
+            return 'other', "Não foi possível acessar este vídeo. Verifique se o link está correto e o vídeo é público."
+    
+    def _extract_video_info(self, url: str, trace: Optional[Dict[str, Any]] = None,
+                            tiktok_api: bool = True) -> VideoInfo:
+        """
+        Extrai informações do vídeo na plataforma de origem.
+        `tiktok_api=False`: só yt-dlp (as APIs alternativas já correram em _race_tiktok_info).
+        """
         platform = detect_platform(url)
         
         # FALLBACK TIKTOK: Tenta API alternativa primeiro
-        if platform == 'TikTok':
+        if platform == 'TikTok' and tiktok_api:
             try:
                 print("🎵 TikTok detectado - tentando API alternativa...")
-                tiktok_info = self.tiktok_fallback.get_video_info(url)
+                tiktok_info = self._get_tiktok_api_info(url)
                 
                 if tiktok_info:
                     print("✓ Vídeo do TikTok obtido via API alternativa!")
-                    video_info = VideoInfo(
-                        url=tiktok_info['url'],
-                        title=tiktok_info.get('title', 'TikTok Video'),
-                        description=tiktok_info.get('description'),
-                        thumbnail=tiktok_info.get('thumbnail'),
-                        duration=tiktok_info.get('duration', 0),
-                        uploader=tiktok_info.get('uploader'),
-                        view_count=tiktok_info.get('view_count'),
-                        formats=[],  # TikTok tem apenas uma qualidade
-                        platform='TikTok'
-                    )
-                    
-                    # Guarda no cache
-                    self._info_cache[url] = video_info
-                    return video_info
+                    if trace is not None:
+                        trace['source'] = 'tiktok_api'
+                    return self._tiktok_video_info(tiktok_info)
                 else:
                     print("⚠ API alternativa do TikTok falhou, tentando yt-dlp...")
             except Exception as e:
                 print(f"⚠ Erro ao usar API alternativa TikTok: {e}")
                 print("→ Tentando yt-dlp como fallback...")
         
+        if trace is not None:
+            trace['source'] = 'ytdlp'
+        
         # ESTRATÉGIA ESPECIAL PARA YOUTUBE
         if platform == 'YouTube':
-            # Usa yt-dlp em todos ambientes (local e produção)
-            # mweb é o cliente recomendado que não precisa de PO Token
-            info = self._try_youtube_with_different_configs(url)
+            # Cadeia yt-dlp / scraping / pytubefix com tempo limite por estratégia;
+            # todas devolvem a mesma estrutura normalizada
+            info = self.youtube_strategies.extract(url)
+            if info and trace is not None:
+                trace['source'] = info['source']
             
             if not info:
-                raise Exception("Não foi possível acessar este vídeo do YouTube. Verifique se o vídeo é público e tente novamente.")
+                raise ExtractionError(
+                    "Não foi possível acessar este vídeo do YouTube. Verifique se o vídeo é público e tente novamente.",
+                    'youtube_unavailable'
+                )
         else:
             # Continua com yt-dlp para outras plataformas (incluindo Twitter)
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': False,
-                'skip_download': True,
-                # Otimizações
-                'socket_timeout': 30,
-                'retries': 3,
-                'ignoreerrors': False,
-                # User-Agent moderno
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                    'Accept-Language': 'en-us,en;q=0.5',
-                    'Sec-Fetch-Mode': 'navigate',
-                },
-                # Configurações específicas por plataforma
-                'extractor_args': self._get_extractor_args(platform)
-            }
-            
-            # Configurações específicas para Instagram (mais permissivo)
-            if platform == 'Instagram':
-                ydl_opts['username'] = None  # Sem autenticação
-                ydl_opts['password'] = None
-                ydl_opts['cookiefile'] = None
-                ydl_opts['nocheckcertificate'] = True
-                # User-Agent mobile do Instagram (menos restritivo)
-                ydl_opts['http_headers'] = {
-                    'User-Agent': 'Instagram 76.0.0.15.395 Android (24/7.0; 640dpi; 1440x2560; samsung; SM-G930F; herolte; samsungexynos8890; en_US; 138226743)',
-                    'Accept': '*/*',
-                    'Accept-Language': 'en-US',
-                }
-            
-            # Configurações específicas para TikTok (bypass login)
-            if platform == 'TikTok':
-                ydl_opts['http_headers'] = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
-                    'Referer': 'https://www.tiktok.com/'
-                }
-                # Tenta extrair sem cookies primeiro
-                ydl_opts['nocheckcertificate'] = True
+            ydl_opts = self._get_info_opts(platform)
             
             try:
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # type: ignore
+                with ydl_pool.acquire(f'info:{platform}', ydl_opts) as ydl:
                     info = ydl.extract_info(url, download=False)
                     
                     if not info:
                         raise Exception("Não foi possível extrair informações do vídeo")
+                    self._remember_raw_info(url, info)
             except Exception as e:
                 error_msg = str(e)
                 error_lower = error_msg.lower()
                 
                 # Mensagens genéricas e amigáveis (sem expor detalhes técnicos)
-                if 'unsupported url' in error_lower:
-                    raise Exception("URL não suportada. Verifique se o link está correto.")
-                elif 'private video' in error_lower or 'this video is private' in error_lower:
-                    raise Exception("Este vídeo é privado e não pode ser acessado.")
-                elif 'video unavailable' in error_lower or 'has been removed' in error_lower or 'no video could be found' in error_lower:
-                    raise Exception("Vídeo indisponível, removido ou não contém mídia para download.")
-                elif 'sign in' in error_lower or 'login' in error_lower or 'cookies' in error_lower or 'bot' in error_lower or 'authentication' in error_lower:
-                    # Mensagem genérica sem mencionar detalhes técnicos
-                    if platform == 'Instagram':
-                        raise Exception("Este conteúdo do Instagram não está acessível no momento. Tente outro vídeo público.")
-                    elif platform == 'Twitter':
-                        raise Exception("Este conteúdo do Twitter/X não está acessível no momento. Tente outro vídeo público.")
-                    else:
-                        raise Exception("Este vídeo requer autenticação ou não está disponível publicamente.")
-                elif 'geo restricted' in error_lower or 'not available in your country' in error_lower:
-                    raise Exception("Este vídeo tem restrição geográfica e não está disponível na sua região.")
-                elif 'http error 429' in error_lower or 'too many requests' in error_lower:
-                    raise Exception("Muitas requisições. Por favor, aguarde alguns minutos.")
-                elif 'empty media response' in error_lower:
-                    raise Exception("O conteúdo não está disponível ou requer login. Tente outro vídeo público.")
-                elif 'http error 404' in error_lower:
-                    raise Exception("Conteúdo não encontrado. Verifique se o link está correto.")
-                else:
-                    # Mensagem genérica sem expor stack trace do yt-dlp
-                    raise Exception("Não foi possível acessar este vídeo. Verifique se o link está correto e o vídeo é público.")
+                error_class, message = self._classify_extraction_error(error_lower, platform)
+                if error_class == 'rate_limited':
+                    raise RateLimitedError(message)
+                raise ExtractionError(message, error_class)
         
         # Processa os formatos disponíveis
         formats = []
@@ -438,17 +731,251 @@ class VideoDownloader:
             uploader=info.get('uploader') or info.get('channel') or info.get('uploader_id'),
             uploader_url=info.get('uploader_url') or info.get('channel_url'),
             view_count=info.get('view_count'),
+            filesize_approx=info.get('filesize') or info.get('filesize_approx'),
             formats=formats[:50] if len(formats) > 50 else formats,  # Limita a 50 formatos
             platform=platform
         )
         
-        # Guarda no cache (expira automaticamente quando reiniciar o servidor)
-        self._info_cache[url] = video_info
-        
         return video_info
     
+    async def run_upstream(self, platform: str, stage: str, run, func, *args):
+        """
+        Executa `func` (que acessa a plataforma) num dos pools depois de obter
+        vaga no rate_limiter, informando sucesso ou 429 ao final.
+        A espera pela vaga acontece no event loop, sem ocupar thread do pool, e
+        vai no máximo até RATE_LIMIT_MAX_WAIT_SECONDS (depois: RateLimitWaitExceeded).
+        A duração de `func` (sem a espera na fila do pool) vai para a etapa `stage`.
+        """
+        with STAGE_LATENCY.time(stage='rate_limit_wait', platform=platform):
+            await rate_limiter.acquire(platform, max_wait=settings.RATE_LIMIT_MAX_WAIT_SECONDS or None)
+        
+        def timed(*func_args):
+            with STAGE_LATENCY.time(stage=stage, platform=platform):
+                return func(*func_args)
+        
+        try:
+            result = await run(timed, *args)
+        except Exception as e:
+            rate_limiter.report_error(e, platform)
+            raise
+        rate_limiter.report(platform)
+        return result
+    
+    async def get_video_info_async(self, url: str, trace: Optional[Dict[str, Any]] = None) -> VideoInfo:
+        """
+        Extrai informações no pool de info sem bloquear o event loop.
+        `trace['source']` recebe a origem da resposta: 'cache', 'ytdlp', 'tiktok_api'
+        ou, no YouTube, a estratégia que respondeu ('scraper', 'pytubefix').
+        """
+        trace = trace if trace is not None else {}
+        trace['source'] = 'cache'
+        
+        if is_short_link(url):
+            # Resolver o link curto faz uma requisição HTTP: vai para o pool
+            key = await self.executors.run_info(canonical_key, url)
+        else:
+            key = canonical_key(url, resolve_short_links=False)
+        
+        async def load() -> VideoInfo:
+            # Segundo nível: outro worker/instância pode já ter extraído este vídeo
+            shared = await shared_state.cache_get(f"info:{key}")
+            if shared:
+                return VideoInfo(**shared)
+            
+            platform = detect_platform(url)
+            if platform == 'TikTok':
+                info = await self._race_tiktok_info(url, key, trace)
+            elif platform == 'YouTube':
+                # A cadeia registra a saúde de cada estratégia (yt-dlp, scraping, pytubefix)
+                info = await self.run_upstream(
+                    platform, 'extract', self.executors.run_info, self._extract_video_info, url, trace
+                )
+            else:
+                info = await source_health.call('ytdlp', platform, lambda: self.run_upstream(
+                    platform, 'extract', self.executors.run_info, self._extract_video_info, url, trace
+                ))
+            await shared_state.cache_set(f"info:{key}", info.model_dump(mode='json'), settings.INFO_CACHE_TTL_SECONDS)
+            return info
+        
+        # Hits do cache não consomem vaga do rate_limiter
+        return await self._info_cache.aget_or_load(key, load)
+    
+    async def download_video_async(self, request: DownloadRequest) -> Dict[str, Any]:
+        """Baixa o vídeo no pool de downloads sem bloquear o event loop"""
+        platform = detect_platform(request.url)
+        store_key = await self.executors.run_info(self.get_store_key, request)
+        
+        if self.media_store.contains(store_key):
+            # Sai do armazenamento: não acessa a plataforma
+            result = await self.executors.run_download(self.download_video, request)
+        else:
+            if platform == 'TikTok':
+                # Corrida das APIs alternativas no event loop: a thread do download já encontra a URL no cache
+                await self._get_tiktok_api_info_async(request.url)
+            result = await self.run_upstream(
+                platform, 'download', self.executors.run_download, self.download_video, request
+            )
+        
+        if result.get('filesize'):
+            BYTES.inc(result['filesize'], platform=platform, source=result.get('source', 'ytdlp'))
+        return result
+    
     def download_video(self, request: DownloadRequest) -> Dict[str, Any]:
-        """Baixa o vídeo em MP4 ou áudio em MP3"""
+        """
+        Retorna o arquivo do vídeo, servindo do armazenamento quando o mesmo
+        conteúdo (com as mesmas opções) já foi baixado antes.
+        
+        O arquivo retornado está adquirido no armazenamento: o chamador deve
+        chamar media_store.release(result['store_key']) quando terminar de usá-lo.
+        """
+        platform = detect_platform(request.url)
+        store_key = self.get_store_key(request)
+        
+        # Um único download por chave: quem chegar depois aguarda e reaproveita o arquivo
+        with self.media_store.key_lock(store_key):
+            entry = self.media_store.acquire(store_key)
+            if entry:
+                print(f"✓ Arquivo servido do armazenamento (sem acessar {platform})")
+                if request.client_id and self.ws_manager:
+                    self.publish_progress(
+                        request.client_id, 'complete', 100, 'Pronto para download!'
+                    )
+                return self._store_result(entry, source='cache')
+            
+            result = self._download_to_temp(request)
+            entry = self.media_store.put(
+                store_key,
+                Path(result['filepath']),
+                title=result.get('title'),
+                platform=platform
+            )
+        
+        return self._store_result(entry, source=result.get('source', 'ytdlp'), tuning=result.get('tuning'))
+    
+    @staticmethod
+    def estimate_filesize(info: VideoInfo, quality: Optional[str], audio_only: bool) -> Optional[int]:
+        """Tamanho estimado do arquivo final (formatos conhecidos ou duração x bitrate)"""
+        if audio_only:
+            # MP3 a 192 kbps
+            return int(info.duration * 192000 / 8) if info.duration else None
+        
+        heights = {'1080p': 1080, '720p': 720, '480p': 480, '360p': 360}
+        max_height = heights.get(quality or '', 10 ** 5)
+        best = None
+        for fmt in info.formats:
+            if not fmt.filesize or not fmt.resolution or 'x' not in fmt.resolution:
+                continue
+            try:
+                height = int(fmt.resolution.split('x')[1])
+            except ValueError:
+                continue
+            if height <= max_height and (best is None or fmt.filesize > best):
+                best = fmt.filesize
+        return best or info.filesize_approx
+    
+    def get_store_key(self, request: DownloadRequest) -> str:
+        """Chave do arquivo no armazenamento (conteúdo canônico + opções de download)"""
+        return MediaStore.make_key(
+            canonical_key(request.url),
+            request.format_id,
+            request.quality,
+            request.audio_only,
+            request.output_format
+        )
+    
+    def resolve_stream_source(self, request: DownloadRequest) -> Optional[Dict[str, Any]]:
+        """
+        Descobre se o download pode ser repassado ao cliente enquanto chega da origem.
+        
+        Retorna:
+        - {'kind': 'direct', 'url', 'headers', 'ext', 'title', 'filesize'} para arquivo único
+          (TikTok via API alternativa, formato 'best' de Instagram/Twitter/Facebook)
+        - {'kind': 'merge', 'urls', 'headers', 'ext', 'title'} para vídeo+áudio separados
+          (Reddit/Pinterest, muxados pelo ffmpeg em MP4 fragmentado)
+        - None quando é preciso o download completo (áudio MP3, YouTube com qualidade, etc)
+        """
+        if request.audio_only or request.format_id:
+            return None
+        
+        platform = detect_platform(request.url)
+        
+        if platform == 'TikTok':
+            tiktok_info = self._get_tiktok_api_info(request.url)
+            if tiktok_info and tiktok_info.get('download_url'):
+                return {
+                    'kind': 'direct',
+                    'url': tiktok_info['download_url'],
+                    'headers': dict(TIKTOK_DOWNLOAD_HEADERS),
+                    'ext': 'mp4',
+                    'title': tiktok_info.get('title'),
+                    'filesize': None,
+                }
+        
+        if platform in ('Instagram', 'Twitter', 'Facebook'):
+            ydl_format = 'best'
+        elif platform in ('Reddit', 'Pinterest') and self.ffmpeg_location and os.path.exists(self.ffmpeg_location):
+            ydl_format = 'bestvideo+bestaudio/best'
+        else:
+            return None
+        
+        ydl_opts = self._get_info_opts(platform)
+        ydl_opts['format'] = ydl_format
+        
+        with ydl_pool.acquire(f'stream:{platform}', ydl_opts) as ydl:
+            info = self._extract_or_reuse(ydl, request.url, download=False)
+        
+        if not info:
+            return None
+        
+        requested = info.get('requested_formats')
+        if requested and len(requested) == 2:
+            # ffmpeg lê HTTP e HLS direto da origem
+            if not all(fmt.get('protocol') in ('http', 'https', 'm3u8', 'm3u8_native') for fmt in requested):
+                return None
+            return {
+                'kind': 'merge',
+                'urls': [fmt['url'] for fmt in requested],
+                'headers': requested[0].get('http_headers') or {},
+                'ext': 'mp4',
+                'title': info.get('title'),
+                'filesize': None,
+            }
+        
+        if info.get('url') and info.get('protocol') in ('http', 'https'):
+            return {
+                'kind': 'direct',
+                'url': info['url'],
+                'headers': info.get('http_headers') or {},
+                'ext': info.get('ext') or 'mp4',
+                'title': info.get('title'),
+                'filesize': info.get('filesize'),
+            }
+        
+        return None
+    
+    def _store_result(self, entry: StoredMedia, source: str,
+                      tuning: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Monta o resultado do download a partir de uma entrada do armazenamento.
+        `source`: 'cache' (já estava no armazenamento), 'tiktok_api' ou 'ytdlp'.
+        `tuning`: parâmetros escolhidos pelo tuner e a medição do download (None se veio do cache).
+        """
+        return {
+            'success': True,
+            'filename': entry.download_name,
+            'filepath': str(self.media_store.path_for(entry)),
+            'title': entry.title,
+            'filesize': entry.size,
+            'store_key': entry.key,
+            'cached': source == 'cache',
+            'source': source,
+            'tuning': tuning
+        }
+    
+    def _download_to_temp(self, request: DownloadRequest) -> Dict[str, Any]:
+        """Baixa o vídeo em MP4 ou o áudio (MP3, ou M4A/Opus sem recodificar) na pasta temporária"""
+        # Importado aqui: o yt-dlp fica fora do caminho de startup
+        import yt_dlp
         
         print(f"\n{'='*60}")
         print(f"DOWNLOAD INICIADO")
@@ -461,60 +988,81 @@ class VideoDownloader:
         platform = detect_platform(request.url)
         
         # FALLBACK TIKTOK: Download direto via API alternativa
-        if platform == 'TikTok' and not request.audio_only:
+        # (áudio em MP3: o 'music' que a API já entrega, sem yt-dlp nem ffmpeg)
+        if (platform == 'TikTok' and (not request.audio_only or (request.output_format or 'mp3') in TIKTOK_API_AUDIO_FORMATS)
+                and source_health.allow('tiktok_cdn', platform)):
+            cdn_started = time.perf_counter()
             try:
                 print("🎵 TikTok detectado - usando download direto...")
-                tiktok_info = self.tiktok_fallback.get_video_info(request.url)
+                tiktok_info = self._get_tiktok_api_info(request.url) or {}
                 
-                if tiktok_info and tiktok_info.get('download_url'):
+                if request.audio_only:
+                    ext, candidates = 'mp3', [tiktok_info.get('audio_url')]
+                else:
+                    # HD quando a API informa; a URL normal se a HD falhar
+                    ext, candidates = 'mp4', [tiktok_info.get('hd_download_url'), tiktok_info.get('download_url')]
+                candidates = [url for url in dict.fromkeys(candidates) if url]
+                
+                if candidates:
                     if request.client_id and self.ws_manager:
-                        self.send_progress_sync(
+                        self.publish_progress(
                             request.client_id, 'starting', 0, 'Iniciando download via API alternativa...'
                         )
                     
-                    # Gera nome do arquivo: MediaVid{Plataforma}{CodigoAleatorio}.mp4
+                    # Gera nome do arquivo: MediaVid{Plataforma}{CodigoAleatorio}.{ext}
                     random_code = self._generate_random_code(8)
-                    filename = f"MediaVidTikTok{random_code}.mp4"
+                    filename = f"MediaVidTikTok{random_code}.{ext}"
                     filepath = self.temp_path / filename
                     
-                    # Download direto
-                    response = requests.get(tiktok_info['download_url'], stream=True, timeout=30)
-                    if response.status_code == 200:
-                        total_size = int(response.headers.get('content-length', 0))
-                        downloaded = 0
-                        
-                        with open(filepath, 'wb') as f:
-                            for chunk in response.iter_content(chunk_size=8192):
-                                if chunk:
-                                    f.write(chunk)
-                                    downloaded += len(chunk)
-                                    
-                                    # Atualiza progresso
-                                    if total_size > 0 and request.client_id and self.ws_manager:
-                                        progress = int((downloaded / total_size) * 100)
-                                        self.send_progress_sync(
-                                            request.client_id,
-                                            'downloading',
-                                            progress,
-                                            f'Baixando: {progress}%'
-                                        )
-                        
-                        print(f"✓ TikTok baixado com sucesso via API alternativa!")
-                        print(f"✓ Arquivo: {filepath.name}")
-                        
-                        if request.client_id and self.ws_manager:
-                            self.send_progress_sync(
-                                request.client_id, 'complete', 100, 'Pronto para download!'
-                            )
-                        
-                        return {
-                            'success': True,
-                            'filename': filepath.name,
-                            'filepath': str(filepath),
-                            'title': tiktok_info.get('title'),
-                            'filesize': os.path.getsize(filepath) if filepath.exists() else None
-                        }
+                    # Download direto (intervalos em paralelo quando a CDN aceita Range)
+                    for index, media_url in enumerate(candidates):
+                        try:
+                            with download_tuner.begin(platform, media_url) as tuning:
+                                tuning.record_fetch(direct_fetcher.fetch(
+                                    media_url,
+                                    filepath,
+                                    headers=TIKTOK_DOWNLOAD_HEADERS,
+                                    progress=self._fetch_progress(request),
+                                    connections=tuning.concurrency
+                                ))
+                            break
+                        except FetchError as e:
+                            if index == len(candidates) - 1:
+                                raise
+                            print(f"⚠ URL em HD falhou ({e}), tentando a URL normal...")
+                    
+                    if request.audio_only and not self._is_mp3(filepath):
+                        filepath.unlink(missing_ok=True)
+                        raise Exception("o áudio da API não está em MP3")
+                    
+                    source_health.record('tiktok_cdn', platform, True, time.perf_counter() - cdn_started)
+                    print(f"✓ TikTok baixado com sucesso via API alternativa!")
+                    print(f"✓ Arquivo: {filepath.name}")
+                    
+                    if request.client_id and self.ws_manager:
+                        self.publish_progress(
+                            request.client_id, 'complete', 100, 'Pronto para download!'
+                        )
+                    
+                    return {
+                        'success': True,
+                        'filename': filepath.name,
+                        'filepath': str(filepath),
+                        'title': tiktok_info.get('title'),
+                        'filesize': os.path.getsize(filepath) if filepath.exists() else None,
+                        'source': 'tiktok_api',
+                        'tuning': tuning.summary()
+                    }
+                # Sem URL da API: nada foi tentado na CDN
+                source_health.release('tiktok_cdn', platform)
+            except FetchError as e:
+                # Só a CDN recusando ou travando conta como falha da fonte
+                source_health.record('tiktok_cdn', platform, False, time.perf_counter() - cdn_started, e)
+                print(f"⚠ Falha no download direto do TikTok: {e}")
+                print("→ Tentando yt-dlp como fallback...")
             except Exception as e:
+                # API sem resposta ou conteúdo inesperado (ex.: áudio fora de MP3): a CDN não tem culpa
+                source_health.release('tiktok_cdn', platform)
                 print(f"⚠ Falha no download direto do TikTok: {e}")
                 print("→ Tentando yt-dlp como fallback...")
         
@@ -527,17 +1075,22 @@ class VideoDownloader:
             
             if d['status'] == 'downloading' and request.client_id:
                 try:
-                    percent_str = d.get('_percent_str', '0%').strip().replace('%', '')
-                    try:
-                        progress = int(float(percent_str))
-                    except:
-                        progress = 0
+                    # Chamado a cada bloco de cada fragmento: o barramento coalesce e limita os envios
+                    total = d.get('total_bytes') or d.get('total_bytes_estimate')
+                    if total:
+                        progress = min(100, int(d.get('downloaded_bytes', 0) * 100 / total))
+                    else:
+                        percent_str = d.get('_percent_str', '0%').strip().replace('%', '')
+                        try:
+                            progress = int(float(percent_str))
+                        except:
+                            progress = 0
                     
                     speed = d.get('_speed_str', 'N/A')
                     eta = d.get('_eta_str', 'N/A')
                     
                     if self.ws_manager:
-                        self.send_progress_sync(
+                        self.publish_progress(
                             request.client_id,
                             'downloading',
                             progress,
@@ -550,6 +1103,18 @@ class VideoDownloader:
                 # Captura o caminho real do arquivo baixado
                 downloaded_file_path = d.get('filename')
         
+        # Tempo gasto no ffmpeg (merge, extração de áudio) separado do download
+        postprocess_started: Dict[str, float] = {}
+        
+        def postprocessor_hook(d):
+            name = d.get('postprocessor') or ''
+            if d['status'] == 'started':
+                postprocess_started[name] = time.perf_counter()
+            elif d['status'] == 'finished' and name in postprocess_started:
+                STAGE_LATENCY.observe(
+                    time.perf_counter() - postprocess_started.pop(name), stage='postprocess', platform=platform
+                )
+        
         # Gera nome do arquivo: MediaVid{Plataforma}{CodigoAleatorio}.{ext}
         random_code = self._generate_random_code(8)
         filename_template = f'MediaVid{platform}{random_code}.%(ext)s'
@@ -562,12 +1127,11 @@ class VideoDownloader:
             'noprogress': False,
             'outtmpl': str(self.temp_path / filename_template),
             'progress_hooks': [progress_hook],
-            # Otimizações de velocidade máxima
-            'concurrent_fragment_downloads': 10,  # Aumentado para 10 downloads paralelos
+            'postprocessor_hooks': [postprocessor_hook],
+            # Fragmentos em paralelo e tamanho de chunk vêm do download_tuner (por CDN)
             'retries': 10,
             'fragment_retries': 10,
             'skip_unavailable_fragments': True,
-            'http_chunk_size': 10485760,  # 10MB chunks
             'buffersize': 16384,  # Buffer de leitura 16KB
             'socket_timeout': 30,
             # Configurações específicas por plataforma
@@ -596,26 +1160,21 @@ class VideoDownloader:
             }
             ydl_opts['nocheckcertificate'] = True
         
-        # Configurações específicas para Reddit e Pinterest - desabilita downloads fragmentados problemáticos
+        # Configurações específicas para Reddit e Pinterest (começam com 1 fragmento e sem chunk no tuner)
         if platform == 'Reddit' or platform == 'Pinterest':
-            ydl_opts['concurrent_fragment_downloads'] = 1  # Apenas 1 fragmento por vez
             ydl_opts['fragment_retries'] = 3  # Menos tentativas
-            ydl_opts['http_chunk_size'] = None  # Desabilita chunking que causa problemas
             ydl_opts['retries'] = 3
             ydl_opts['http_headers'] = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36'
             }
         
+        ffmpeg = self.ffmpeg_location if self.ffmpeg_location and os.path.exists(self.ffmpeg_location) else None
+        
         if request.audio_only:
-            # Áudio apenas - MP3
+            # Áudio apenas: baixa o melhor áudio e o pós-processamento decide entre cópia e transcodificação
             ydl_opts['format'] = 'bestaudio/best'
-            if self.ffmpeg_location and os.path.exists(self.ffmpeg_location):
-                ydl_opts['postprocessors'] = [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }]
-                ydl_opts['ffmpeg_location'] = os.path.dirname(self.ffmpeg_location)
+            if ffmpeg:
+                ydl_opts['ffmpeg_location'] = os.path.dirname(ffmpeg)
         else:
             # Vídeo - Detecta se é formato curto ou plataforma sem seleção de qualidade
             is_short_format = (
@@ -631,10 +1190,9 @@ class VideoDownloader:
             if platform == 'Reddit' or platform == 'Pinterest':
                 # Reddit e Pinterest têm estrutura de vídeo/áudio separados, precisam merge
                 # Precisa de FFmpeg instalado para fazer o merge
-                if self.ffmpeg_location and os.path.exists(self.ffmpeg_location):
+                if ffmpeg:
                     ydl_opts['format'] = 'bestvideo+bestaudio/best'
-                    ydl_opts['merge_output_format'] = 'mp4'
-                    ydl_opts['ffmpeg_location'] = os.path.dirname(self.ffmpeg_location)
+                    ydl_opts['ffmpeg_location'] = os.path.dirname(ffmpeg)
                     print(f"Detectado {platform} - usando formato com merge de vídeo+áudio (FFmpeg disponível)")
                 else:
                     # Sem FFmpeg, tenta pegar stream único
@@ -657,42 +1215,70 @@ class VideoDownloader:
         
         print(f"Formato yt-dlp: {ydl_opts['format']}\n")
         
+        # Extractor com o circuito aberto: falha na hora (a fila tenta de novo depois)
+        if not source_health.allow('ytdlp', platform):
+            raise source_health.unavailable(platform, ['ytdlp'])
+        
         try:
             if request.client_id and self.ws_manager:
-                self.send_progress_sync(
+                self.publish_progress(
                     request.client_id, 'starting', 0, 'Iniciando download...'
                 )
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                print("→ Baixando...")
-                info = ydl.extract_info(request.url, download=True)
+            print("→ Baixando...")
+            # Seleciona os formatos antes de baixar (instância do pool, com as conexões abertas):
+            # URL de mídia simples vai pelo direct_fetcher e vídeo+áudio separados são
+            # juntados pelo pós-processamento
+            selection_opts = {key: value for key, value in ydl_opts.items() if key not in PER_DOWNLOAD_YDL_OPTS}
+            with ydl_pool.acquire(f'info:{platform}', selection_opts) as ydl:
+                info = self._extract_ytdlp_tracked(ydl, request.url, platform)
+            
+            # Fragmentos/conexões e chunk escolhidos para a CDN de onde a mídia vem
+            with download_tuner.begin(platform, self._media_url(info)) as tuning:
+                ydl_opts.update(tuning.ydl_params(), progress_hooks=[progress_hook, tuning.progress_hook])
                 
-                if not info:
-                    raise Exception("Não foi possível baixar o vídeo")
+                fetched_path = None
+                if ffmpeg and len(info.get('requested_formats') or []) == 2:
+                    fetched_path = self._download_and_merge(ffmpeg, ydl_opts, info, request, platform, random_code, tuning)
+                elif self._direct_url(info):
+                    fetched_path = self._fetch_format(info, f"MediaVid{platform}{random_code}", request, tuning)
+                if not fetched_path:
+                    # Só aqui o yt-dlp baixa: instância própria com os hooks e o nome do arquivo
+                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                        info = self._process_download(ydl, info)
+            
+            print("✓ Download concluído!")
+            
+            # Usa o caminho capturado pelo hook ou busca o arquivo
+            if fetched_path:
+                filepath = fetched_path
+            elif downloaded_file_path and os.path.exists(downloaded_file_path):
+                filepath = Path(downloaded_file_path)
+                print(f"✓ Arquivo baixado: {filepath.name}")
+            else:
+                # Fallback: busca o arquivo mais recente na pasta temp
+                print("⚠ Caminho não capturado, buscando arquivo mais recente...")
+                files = list(self.temp_path.glob(f"MediaVid{platform}{random_code}.*"))
+                if not files:
+                    # Busca qualquer arquivo recente como último recurso
+                    files = list(self.temp_path.glob("*.*"))
                 
-                print("✓ Download concluído!")
+                if not files:
+                    raise Exception("Nenhum arquivo encontrado após download")
                 
-                # Usa o caminho capturado pelo hook ou busca o arquivo
-                if downloaded_file_path and os.path.exists(downloaded_file_path):
-                    filepath = Path(downloaded_file_path)
-                    print(f"✓ Arquivo baixado: {filepath.name}")
-                else:
-                    # Fallback: busca o arquivo mais recente na pasta temp
-                    print("⚠ Caminho não capturado, buscando arquivo mais recente...")
-                    files = list(self.temp_path.glob(f"MediaVid{platform}{random_code}.*"))
-                    if not files:
-                        # Busca qualquer arquivo recente como último recurso
-                        files = list(self.temp_path.glob("*.*"))
-                    
-                    if not files:
-                        raise Exception("Nenhum arquivo encontrado após download")
-                    
-                    # Pega o arquivo mais recente
-                    filepath = max(files, key=lambda f: f.stat().st_mtime)
-                    print(f"✓ Arquivo encontrado: {filepath.name}")
+                # Pega o arquivo mais recente
+                filepath = max(files, key=lambda f: f.stat().st_mtime)
+                print(f"✓ Arquivo encontrado: {filepath.name}")
+            
+            if request.audio_only and ffmpeg:
+                if request.client_id and self.ws_manager:
+                    self.publish_progress(
+                        request.client_id, 'processing', 100, 'Processando áudio...'
+                    )
+                filepath = postprocessor.extract_audio(ffmpeg, filepath, request.output_format, platform)
             
             if request.client_id and self.ws_manager:
-                self.send_progress_sync(
+                self.publish_progress(
                     request.client_id, 'complete', 100, 'Pronto para download!'
                 )
             
@@ -703,17 +1289,128 @@ class VideoDownloader:
                 'filename': filepath.name,
                 'filepath': str(filepath),
                 'title': info.get('title'),
-                'filesize': os.path.getsize(filepath) if filepath.exists() else None
+                'filesize': os.path.getsize(filepath) if filepath.exists() else None,
+                'source': 'ytdlp',
+                'tuning': tuning.summary()
             }
                 
         except Exception as e:
             print(f"\n✗ ERRO: {str(e)}\n")
             if request.client_id and self.ws_manager:
-                self.send_progress_sync(
+                self.publish_progress(
                     request.client_id, 'error', 0, f'Erro: {str(e)}'
                 )
             raise Exception(f"Erro ao baixar vídeo: {str(e)}")
     
+    def _extract_ytdlp_tracked(self, ydl, url: str, platform: str) -> Dict[str, Any]:
+        """Extração do download (liberada por source_health.allow) com o resultado registrado na saúde do yt-dlp"""
+        started = time.perf_counter()
+        try:
+            info = self._extract_or_reuse(ydl, url, download=False)
+            if not info:
+                raise Exception("Não foi possível baixar o vídeo")
+        except Exception as e:
+            # Vídeo privado/removido: o extractor funcionou
+            error_class, _ = self._classify_extraction_error(str(e).lower(), platform)
+            source_health.record('ytdlp', platform, error_class in PERMANENT_ERROR_CLASSES,
+                                 time.perf_counter() - started, e)
+            raise
+        except BaseException:
+            source_health.release('ytdlp', platform)
+            raise
+        source_health.record('ytdlp', platform, True, time.perf_counter() - started)
+        return info
+    
+    @staticmethod
+    def _direct_url(fmt: Dict[str, Any]) -> Optional[str]:
+        """URL de mídia simples (HTTP progressivo, sem cookies) que o direct_fetcher consegue baixar"""
+        if fmt.get('protocol') in ('http', 'https') and not fmt.get('cookies'):
+            return fmt.get('url')
+        return None
+    
+    @staticmethod
+    def _is_mp3(path: Path) -> bool:
+        """Cabeçalho ID3 ou sincronismo de quadro MPEG no início do arquivo"""
+        with open(path, 'rb') as f:
+            head = f.read(3)
+        return head == b'ID3' or (len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0)
+    
+    @staticmethod
+    def _media_url(info: Dict[str, Any]) -> Optional[str]:
+        """URL da mídia escolhida (a do vídeo, quando vídeo e áudio são separados): define o host no tuner"""
+        formats = info.get('requested_formats') or [info]
+        return formats[0].get('url') or info.get('url')
+    
+    def _fetch_format(self, fmt: Dict[str, Any], name: str, request: DownloadRequest,
+                      tuning: TuningSession) -> Optional[Path]:
+        """Baixa um formato escolhido pelo yt-dlp com o direct_fetcher (None: fica com o yt-dlp)"""
+        url = self._direct_url(fmt)
+        if not url:
+            return None
+        filepath = self.temp_path / f"{name}.{fmt.get('ext') or 'mp4'}"
+        try:
+            tuning.record_fetch(direct_fetcher.fetch(
+                url, filepath, headers=fmt.get('http_headers'), progress=self._fetch_progress(request),
+                connections=tuning.concurrency
+            ))
+            return filepath
+        except FetchError as e:
+            print(f"⚠ Download direto falhou ({e}), usando o yt-dlp")
+            return None
+    
+    @staticmethod
+    def _process_download(ydl, info: Dict[str, Any]) -> Dict[str, Any]:
+        """Download a partir de uma extração já feita (sem buscar a página de novo)"""
+        import yt_dlp
+        
+        return ydl.process_ie_result(yt_dlp.YoutubeDL.sanitize_info(info, remove_private_keys=True), download=True)
+    
+    def _fetch_progress(self, request: DownloadRequest):
+        """Callback de progresso do direct_fetcher (None sem cliente para avisar)"""
+        if not request.client_id or not self.ws_manager:
+            return None
+        started = time.perf_counter()
+        
+        def report(done: int, total: Optional[int]):
+            progress = min(100, int(done * 100 / total)) if total else 0
+            speed = done / max(time.perf_counter() - started, 0.001) / 1024 / 1024
+            self.publish_progress(
+                request.client_id, 'downloading', progress, f'Baixando: {progress}% | Velocidade: {speed:.1f}MiB/s'
+            )
+        return report
+    
+    def _download_and_merge(self, ffmpeg: str, ydl_opts: Dict[str, Any], info: Dict[str, Any],
+                            request: DownloadRequest, platform: str, random_code: str, tuning: TuningSession) -> Path:
+        """Baixa os formatos selecionados (vídeo, áudio) um a um e junta com o ffmpeg"""
+        import yt_dlp
+        
+        raw = yt_dlp.YoutubeDL.sanitize_info(info, remove_private_keys=True)
+        parts = []
+        try:
+            for fmt in info['requested_formats']:
+                part = self._fetch_format(fmt, f"MediaVid{platform}{random_code}.f{fmt['format_id']}", request, tuning)
+                if part is None:
+                    part_opts = dict(
+                        ydl_opts,
+                        format=fmt['format_id'],
+                        outtmpl=str(self.temp_path / f"MediaVid{platform}{random_code}.f%(format_id)s.%(ext)s")
+                    )
+                    with yt_dlp.YoutubeDL(part_opts) as part_ydl:
+                        part_info = part_ydl.process_ie_result(copy.deepcopy(raw), download=True)
+                    part = Path(part_info['requested_downloads'][0]['filepath'])
+                parts.append(part)
+            
+            if request.client_id and self.ws_manager:
+                self.publish_progress(
+                    request.client_id, 'processing', 100, 'Juntando vídeo e áudio...'
+                )
+            output = self.temp_path / f"MediaVid{platform}{random_code}.mp4"
+            postprocessor.merge(ffmpeg, parts[0], parts[1], output, platform)
+            return output
+        finally:
+            for part in parts:
+                self.cleanup_file(str(part))
+    
     def cleanup_file(self, filepath: str):
         """Remove arquivo temporário"""
         try:
@@ -721,6 +1418,29 @@ class VideoDownloader:
                 os.remove(filepath)
         except Exception as e:
             print(f"Erro ao limpar arquivo {filepath}: {e}")
+    
+    def cleanup_orphan_files(self, keep: Set[str], grace_seconds: float) -> int:
+        """
+        Remove arquivos temporários órfãos (downloads interrompidos por queda ou deploy).
+        Só olha a raiz da pasta temporária: armazenamento e thumbnails cuidam das próprias pastas.
+        Arquivos escritos há pouco ficam (podem ser de outro worker usando a mesma pasta).
+        """
+        keep = {str(Path(path).resolve()) for path in keep}
+        now = time.time()
+        removed = 0
+        for path in self.temp_path.iterdir():
+            try:
+                if (
+                    not path.is_file()
+                    or str(path.resolve()) in keep
+                    or now - path.stat().st_mtime < grace_seconds
+                ):
+                    continue
+                path.unlink()
+                removed += 1
+            except OSError as e:
+                print(f"Erro ao remover arquivo órfão {path.name}: {e}")
+        return removed
 
 
 # Instância global do downloader
@@ -0,0 +1,41 @@
+"""
+Cliente HTTP assíncrono compartilhado (httpx) com pool de conexões e keep-alive.
+
+Reaproveitar o mesmo cliente evita um novo handshake TLS a cada requisição
+para os mesmos CDNs (thumbnails, mídia repassada ao cliente, etc).
+"""
+from typing import Optional
+import httpx
+
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+    'Accept-Language': 'en-US,en;q=0.9',
+}
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Retorna o cliente compartilhado (criado na primeira chamada)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            follow_redirects=True,
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=20,
+                keepalive_expiry=60.0
+            ),
+        )
+    return _client
+
+
+async def close_http_client():
+    """Fecha o cliente compartilhado (chamado no shutdown da aplicação)"""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
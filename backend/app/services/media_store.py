@@ -0,0 +1,342 @@
+"""
+Armazenamento persistente dos arquivos baixados, endereçado pelo conteúdo.
+
+Cada arquivo é identificado pela chave canônica do vídeo + opções de
+download (formato, qualidade, áudio). Downloads repetidos do mesmo clipe
+são servidos direto do disco, sem acessar a plataforma de origem.
+
+- Orçamento de bytes com remoção LRU (menos acessado recentemente)
+- Contagem de referências: arquivo em uso (sendo enviado) nunca é removido
+- Período de carência: arquivo recém-acessado fica disponível para retomadas
+- Índice em JSON que sobrevive a reinicializações: gravado na hora ao incluir
+  ou remover arquivos; acessos (last_access) só marcam o índice como sujo e
+  são gravados por um timer, fora do event loop
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, Optional, Any
+
+
+# Chaves geradas por make_key (a chave também chega pela URL de /api/video/file/{store_key})
+KEY_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# Extensões procuradas ao registrar um arquivo gravado por outro worker
+MEDIA_EXTENSIONS = ('mp4', 'webm', 'mkv', 'mov', 'mp3', 'm4a', 'opus', 'ogg', 'flac', 'wav', 'aac')
+
+
+@dataclass
+class StoredMedia:
+    key: str
+    ext: str
+    size: int
+    title: Optional[str] = None
+    platform: Optional[str] = None
+    created_at: float = 0.0
+    last_access: float = 0.0
+
+    @property
+    def filename(self) -> str:
+        """Nome do arquivo no disco"""
+        return f"{self.key}.{self.ext}"
+
+    @property
+    def download_name(self) -> str:
+        """Nome para o usuário: MediaVid{Plataforma}{Codigo}.{ext} (estável por arquivo)"""
+        return f"MediaVid{self.platform or ''}{self.key[:8]}.{self.ext}"
+
+
+class MediaStore:
+    INDEX_FILENAME = "index.json"
+
+    def __init__(self, root: Path, max_bytes: int, grace_seconds: float = 0, flush_seconds: float = 30):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / self.INDEX_FILENAME
+        self.max_bytes = max_bytes
+        # Arquivos acessados há menos tempo que isso não são removidos (retomada de downloads)
+        self.grace_seconds = grace_seconds
+        self.flush_seconds = flush_seconds
+
+        self._entries: Dict[str, StoredMedia] = {}
+        self._refs: Dict[str, int] = {}
+        self._key_locks: Dict[str, list] = {}  # chave -> [lock, nº de interessados]
+        self._lock = threading.RLock()
+        self._dirty = False  # Acessos ainda não gravados no índice
+        self._flush_timer: Optional[threading.Timer] = None
+
+        # Contadores
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._load_index()
+
+    @staticmethod
+    def make_key(content_key: str, format_id: Optional[str], quality: Optional[str],
+                 audio_only: bool, output_format: Optional[str]) -> str:
+        """Chave do arquivo: conteúdo canônico + opções que mudam o resultado"""
+        raw = "|".join([
+            content_key,
+            format_id or "",
+            quality or "",
+            "audio" if audio_only else "video",
+            output_format or "",
+        ])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    @staticmethod
+    def is_valid_key(key: Optional[str]) -> bool:
+        """Chave no formato de make_key (32 caracteres hexadecimais)"""
+        return bool(key) and KEY_PATTERN.match(key) is not None
+
+    def path_for(self, entry: StoredMedia) -> Path:
+        """Caminho do arquivo de uma entrada"""
+        return self.root / entry.filename
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.size for entry in self._entries.values())
+
+    def _load_index(self):
+        """Carrega o índice do disco, descartando entradas sem arquivo e arquivos sem entrada"""
+        with self._lock:
+            if self.index_path.exists():
+                try:
+                    data = json.loads(self.index_path.read_text(encoding="utf-8"))
+                    for raw in data.get("entries", []):
+                        entry = StoredMedia(**raw)
+                        path = self.path_for(entry)
+                        if path.exists():
+                            entry.size = path.stat().st_size
+                            self._entries[entry.key] = entry
+                except Exception as e:
+                    print(f"⚠ Índice do armazenamento corrompido, recriando: {e}")
+                    self._entries = {}
+
+            # Remove arquivos órfãos (downloads interrompidos, índice perdido).
+            # Arquivos recentes ficam: podem ser de outro worker usando o mesmo diretório.
+            known = {entry.filename for entry in self._entries.values()}
+            now = time.time()
+            for path in self.root.iterdir():
+                if (
+                    path.is_file()
+                    and path.name != self.INDEX_FILENAME
+                    and path.name not in known
+                    and now - path.stat().st_mtime >= self.grace_seconds
+                ):
+                    try:
+                        path.unlink()
+                    except OSError:
+                        pass
+
+            self._evict_locked()
+            self._save_index_locked()
+
+            if self._entries:
+                print(f"✓ Armazenamento de mídia: {len(self._entries)} arquivos, "
+                      f"{self.total_bytes / (1024 * 1024):.1f} MB")
+
+    def _save_index_locked(self):
+        """Grava o índice de forma atômica (arquivo temporário + rename)"""
+        tmp_path = self.index_path.with_suffix(".json.tmp")
+        data = {"entries": [asdict(entry) for entry in self._entries.values()]}
+        try:
+            tmp_path.write_text(json.dumps(data), encoding="utf-8")
+            os.replace(tmp_path, self.index_path)
+            self._dirty = False
+        except OSError as e:
+            print(f"⚠ Erro ao gravar índice do armazenamento: {e}")
+
+    def _mark_dirty_locked(self):
+        """Agenda a gravação do índice (acessos não precisam ir ao disco na hora)"""
+        self._dirty = True
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_seconds, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self):
+        """Grava o índice se houver acessos pendentes (timer e desligamento)"""
+        with self._lock:
+            self._flush_timer = None
+            if self._dirty:
+                self._save_index_locked()
+
+    def close(self):
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+        self.flush()
+
+    def _remove_locked(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry:
+            try:
+                self.path_for(entry).unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Erro ao remover arquivo {entry.filename}: {e}")
+
+    def _evict_locked(self, reserve: int = 0) -> int:
+        """Remove os arquivos menos acessados (e sem referências) até caber no orçamento; retorna quantos"""
+        total = sum(entry.size for entry in self._entries.values())
+        if total + reserve <= self.max_bytes:
+            return 0
+
+        now = time.time()
+        candidates = sorted(
+            (
+                entry for entry in self._entries.values()
+                if self._refs.get(entry.key, 0) == 0 and now - entry.last_access >= self.grace_seconds
+            ),
+            key=lambda entry: entry.last_access
+        )
+        removed = 0
+        for entry in candidates:
+            if total + reserve <= self.max_bytes:
+                break
+            total -= entry.size
+            self._remove_locked(entry.key)
+            removed += 1
+        self.evictions += removed
+        return removed
+
+    @contextmanager
+    def key_lock(self, key: str):
+        """Serializa a produção de uma mesma chave (evita baixar o mesmo arquivo duas vezes ao mesmo tempo)"""
+        with self._lock:
+            slot = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    self._key_locks.pop(key, None)
+
+    def contains(self, key: str) -> bool:
+        """Verifica se a chave existe (sem adquirir nem contar como hit)"""
+        if not self.is_valid_key(key):
+            return False
+        with self._lock:
+            entry = self._entries.get(key) or self._adopt_locked(key)
+            return bool(entry and self.path_for(entry).exists())
+
+    def _adopt_locked(self, key: str) -> Optional[StoredMedia]:
+        """Registra um arquivo gravado por outro worker no mesmo diretório (chave já validada)"""
+        for ext in MEDIA_EXTENSIONS:
+            path = self.root / f"{key}.{ext}"
+            if not path.is_file():
+                continue
+            stat = path.stat()
+            entry = StoredMedia(
+                key=key,
+                ext=ext,
+                size=stat.st_size,
+                created_at=stat.st_mtime,
+                last_access=time.time(),
+            )
+            self._entries[key] = entry
+            return entry
+        return None
+
+    def acquire(self, key: str) -> Optional[StoredMedia]:
+        """
+        Retorna a entrada e incrementa sua contagem de referências.
+        Quem adquire deve chamar release() quando terminar de usar o arquivo.
+        """
+        if not self.is_valid_key(key):
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and not self.path_for(entry).exists():
+                self._entries.pop(key, None)
+                entry = None
+            if not entry:
+                entry = self._adopt_locked(key)
+
+            if not entry:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            entry.last_access = time.time()
+            self._refs[key] = self._refs.get(key, 0) + 1
+            self._mark_dirty_locked()
+            return entry
+
+    def release(self, key: Optional[str]):
+        """Libera uma referência adquirida com acquire() ou put()"""
+        if not key:
+            return
+        with self._lock:
+            refs = self._refs.get(key, 0) - 1
+            if refs > 0:
+                self._refs[key] = refs
+            else:
+                self._refs.pop(key, None)
+                if self._evict_locked():
+                    self._save_index_locked()
+
+    def put(self, key: str, src_path: Path, title: Optional[str] = None,
+            platform: Optional[str] = None) -> StoredMedia:
+        """
+        Move um arquivo baixado para o armazenamento e retorna a entrada
+        já adquirida (chamar release() depois de usar).
+        """
+        src_path = Path(src_path)
+        ext = src_path.suffix.lstrip(".") or "bin"
+        size = src_path.stat().st_size
+        now = time.time()
+        entry = StoredMedia(
+            key=key,
+            ext=ext,
+            size=size,
+            title=title,
+            platform=platform,
+            created_at=now,
+            last_access=now,
+        )
+
+        with self._lock:
+            if key in self._entries and self._refs.get(key, 0) == 0:
+                self._remove_locked(key)
+
+            self._evict_locked(reserve=size)
+
+            dest = self.path_for(entry)
+            try:
+                os.replace(src_path, dest)
+            except OSError:
+                # Sistemas de arquivos diferentes
+                shutil.move(str(src_path), str(dest))
+
+            self._entries[key] = entry
+            self._refs[key] = self._refs.get(key, 0) + 1
+            self._save_index_locked()
+            return entry
+
+    def stats(self) -> Dict[str, Any]:
+        """Estatísticas do armazenamento"""
+        with self._lock:
+            return {
+                'files': len(self._entries),
+                'total_bytes': sum(entry.size for entry in self._entries.values()),
+                'max_bytes': self.max_bytes,
+                'in_use': sum(1 for refs in self._refs.values() if refs > 0),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,261 @@
+"""
+Repasse de mídia ao cliente enquanto ainda está sendo baixada da origem.
+
+Para formatos de arquivo único (URL direta) os bytes vão para o cliente
+assim que chegam do CDN; para vídeo+áudio separados (Reddit/Pinterest) o
+ffmpeg faz o mux em MP4 fragmentado direto para um pipe. Em ambos os casos
+uma cópia é gravada em disco e, se o repasse terminar com sucesso, entra
+no armazenamento de mídia para os próximos downloads.
+"""
+import asyncio
+import mimetypes
+import os
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+import aiofiles
+import httpx
+
+from app.config import settings
+from app.models.video import DownloadRequest
+from app.services.downloader import VideoDownloader, downloader
+from app.services.http_client import get_http_client
+from app.services.metrics import ACTIVE_DOWNLOADS, BYTES, STAGE_LATENCY
+from app.services.rate_limiter import rate_limiter, parse_retry_after
+from app.utils.validators import detect_platform
+
+
+class MediaStream:
+    """Um repasse aberto: a origem já respondeu e os bytes podem ser enviados"""
+
+    def __init__(
+        self,
+        downloader: VideoDownloader,
+        request: DownloadRequest,
+        store_key: str,
+        source: Dict[str, Any],
+        chunks: AsyncIterator[bytes],
+        close: Callable[[], Awaitable[None]],
+        content_length: Optional[int] = None,
+    ):
+        self.downloader = downloader
+        self.request = request
+        self.store_key = store_key
+        self.source = source
+        self.platform = detect_platform(request.url)
+        self.content_length = content_length
+        self._chunks = chunks
+        self._close = close
+
+        ext = source.get('ext') or 'mp4'
+        self.filename = f"MediaVid{self.platform}{store_key[:8]}.{ext}"
+        self.media_type = mimetypes.guess_type(self.filename)[0] or 'application/octet-stream'
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            'Content-Disposition': f'attachment; filename="{self.filename}"',
+            # Depois do repasse o arquivo fica no armazenamento (retomável com Range)
+            'Content-Location': f'/api/video/file/{self.store_key}'
+        }
+        if self.content_length:
+            headers['Content-Length'] = str(self.content_length)
+        return headers
+
+    def _progress(self, stage: str, progress: int, message: str):
+        self.downloader.publish_progress(self.request.client_id, stage, progress, message)
+
+    async def iter_bytes(self) -> AsyncIterator[bytes]:
+        """Envia os bytes ao cliente e grava a cópia que vai para o armazenamento"""
+        tmp_path = self.downloader.temp_path / f"stream-{uuid.uuid4().hex[:12]}.{self.source.get('ext') or 'mp4'}"
+        downloaded = 0
+        last_progress = -1
+        completed = False
+        started = time.perf_counter()
+        ACTIVE_DOWNLOADS.inc(kind='stream')
+
+        try:
+            self._progress('downloading', 0, 'Transmitindo...')
+
+            async with aiofiles.open(tmp_path, 'wb') as f:
+                async for chunk in self._chunks:
+                    await f.write(chunk)
+                    downloaded += len(chunk)
+
+                    if self.content_length:
+                        progress = int(downloaded * 100 / self.content_length)
+                        if progress != last_progress:
+                            last_progress = progress
+                            self._progress('downloading', progress, f'Baixando: {progress}%')
+
+                    yield chunk
+
+            completed = True
+            print(f"✓ Repasse concluído: {self.filename} ({downloaded / (1024 * 1024):.1f} MB)")
+            self._progress('complete', 100, 'Pronto para download!')
+        finally:
+            await self._close()
+            ACTIVE_DOWNLOADS.dec(kind='stream')
+            BYTES.inc(downloaded, platform=self.platform, source='stream')
+            if completed:
+                STAGE_LATENCY.observe(time.perf_counter() - started, stage='download', platform=self.platform)
+
+            if completed and downloaded > 0:
+                # Entra no armazenamento para os próximos downloads do mesmo conteúdo
+                try:
+                    entry = await self.downloader.executors.run_download(
+                        self.downloader.media_store.put,
+                        self.store_key,
+                        tmp_path,
+                        title=self.source.get('title'),
+                        platform=self.platform
+                    )
+                    self.downloader.media_store.release(entry.key)
+                except Exception as e:
+                    print(f"⚠ Erro ao guardar arquivo repassado: {e}")
+                    self.downloader.cleanup_file(str(tmp_path))
+            else:
+                # Cliente desconectou ou a origem falhou no meio: descarta a cópia parcial
+                self.downloader.cleanup_file(str(tmp_path))
+
+
+class MediaStreamer:
+    """Abre repasses a partir das fontes resolvidas pelo downloader"""
+
+    def __init__(self, downloader: VideoDownloader):
+        self.downloader = downloader
+
+    async def open_stream(self, request: DownloadRequest) -> Optional[MediaStream]:
+        """
+        Tenta abrir um repasse para o pedido.
+        Retorna None quando é preciso o download completo (ou o arquivo já está no armazenamento).
+        """
+        if not settings.STREAMING_ENABLED:
+            return None
+
+        store_key = await self.downloader.executors.run_info(self.downloader.get_store_key, request)
+        if self.downloader.media_store.contains(store_key):
+            # Já está em disco: o download normal serve direto do armazenamento
+            return None
+
+        try:
+            source = await self.downloader.run_upstream(
+                detect_platform(request.url),
+                'extract',
+                self.downloader.executors.run_info,
+                self.downloader.resolve_stream_source,
+                request
+            )
+        except Exception as e:
+            print(f"⚠ Não foi possível resolver a fonte para repasse: {e}")
+            return None
+
+        if not source:
+            return None
+
+        try:
+            if source['kind'] == 'merge':
+                chunks, close, content_length = await self._open_merge(source)
+            else:
+                chunks, close, content_length = await self._open_direct(source)
+        except Exception as e:
+            print(f"⚠ Repasse indisponível, usando download completo: {e}")
+            return None
+
+        print(f"→ Repassando {source['kind']} para o cliente enquanto baixa...")
+        return MediaStream(
+            downloader=self.downloader,
+            request=request,
+            store_key=store_key,
+            source=source,
+            chunks=chunks,
+            close=close,
+            content_length=content_length,
+        )
+
+    async def _open_direct(self, source: Dict[str, Any]):
+        """Abre a URL direta no CDN (valida a resposta antes de começar o repasse)"""
+        client = get_http_client()
+        headers = dict(source.get('headers') or {})
+        # Sem compressão: o Content-Length precisa bater com os bytes repassados
+        headers['Accept-Encoding'] = 'identity'
+
+        request = client.build_request('GET', source['url'], headers=headers)
+        host = request.url.host
+        await rate_limiter.acquire(host=host)
+        response = await client.send(request, stream=True)
+        rate_limiter.report(
+            host=host,
+            throttled=response.status_code == 429,
+            retry_after=parse_retry_after(response.headers.get('retry-after'))
+        )
+        if response.status_code != 200:
+            await response.aclose()
+            raise httpx.HTTPStatusError(
+                f"Origem respondeu {response.status_code}", request=response.request, response=response
+            )
+
+        content_length = response.headers.get('content-length')
+        return (
+            response.aiter_raw(settings.STREAM_CHUNK_SIZE),
+            response.aclose,
+            int(content_length) if content_length and content_length.isdigit() else None,
+        )
+
+    async def _open_merge(self, source: Dict[str, Any]):
+        """Inicia o ffmpeg muxando vídeo+áudio em MP4 fragmentado para um pipe"""
+        ffmpeg = self.downloader.ffmpeg_location
+        if not ffmpeg or not os.path.exists(ffmpeg):
+            raise Exception("FFmpeg não disponível")
+
+        header_lines = ''.join(f"{name}: {value}\r\n" for name, value in (source.get('headers') or {}).items())
+
+        args = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-nostdin']
+        for url in source['urls']:
+            if header_lines:
+                args += ['-headers', header_lines]
+            args += ['-i', url]
+        args += [
+            '-map', '0:v:0', '-map', '1:a:0',
+            '-c', 'copy',
+            # MP4 fragmentado: pode ser escrito em pipe (não precisa voltar ao início do arquivo)
+            '-movflags', 'frag_keyframe+empty_moov+default_base_moof',
+            '-f', 'mp4', 'pipe:1',
+        ]
+
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+
+        async def close():
+            if process.returncode is None:
+                process.kill()
+            await process.wait()
+
+        # Lê o primeiro bloco antes de responder: erros de origem viram fallback, não arquivo truncado
+        first_chunk = await process.stdout.read(settings.STREAM_CHUNK_SIZE)
+        if not first_chunk:
+            stderr = await process.stderr.read()
+            await close()
+            raise Exception(f"ffmpeg não produziu saída: {stderr.decode(errors='ignore')[:200]}")
+
+        async def chunks():
+            yield first_chunk
+            while True:
+                chunk = await process.stdout.read(settings.STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+            returncode = await process.wait()
+            if returncode != 0:
+                raise Exception(f"ffmpeg terminou com código {returncode}")
+
+        return chunks(), close, None
+
+
+# Instância global do repassador
+media_streamer = MediaStreamer(downloader)
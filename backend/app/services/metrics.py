@@ -0,0 +1,291 @@
+"""
+Métricas no formato de texto do Prometheus (exposto em /metrics).
+
+Contadores, gauges e histogramas com labels, mais "coletores": funções
+chamadas na hora da leitura que transformam estados já existentes (caches,
+fila, pools, rate limiter) em métricas, sem duplicar contagem.
+
+Permite separar lentidão da plataforma (extract/download), do ffmpeg
+(postprocess) e da nossa própria fila (queue_wait, rate_limit_wait).
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+
+# Início do processo (uptime real, diferente do intervalo entre pings)
+PROCESS_START = time.time()
+
+# Limites dos histogramas de latência (segundos)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        """Incrementa enquanto o bloco executa"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets: Iterable[float] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextmanager
+    def time(self, **labels):
+        """Mede a duração do bloco (labels podem ser alterados dentro do bloco)"""
+        started = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        result = []
+        with self._lock:
+            for key, counts in self._counts.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    result.append((f'{self.name}_bucket', {**labels, 'le': _format_value(bound)}, cumulative))
+                result.append((f'{self.name}_count', labels, cumulative))
+                result.append((f'{self.name}_sum', labels, self._sums[key]))
+        return result
+
+
+# Coletor: () -> [(nome, tipo, descrição, [(labels, valor)])]
+Collector = Callable[[], List[Tuple[str, str, str, List[Sample]]]]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Collector] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets=buckets))
+
+    def register_collector(self, collector: Collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Gera o texto no formato de exposição do Prometheus (versão 0.0.4)"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"⚠ Erro ao coletar métricas: {e}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def error_class(error: BaseException) -> str:
+    """Classe do erro para métricas (mesmas categorias das mensagens amigáveis)"""
+    value = getattr(error, 'error_class', None)
+    if value:
+        return value
+    message = str(error).lower()
+    if 'timeout' in message or 'timed out' in message:
+        return 'timeout'
+    if '429' in message or 'too many requests' in message:
+        return 'rate_limited'
+    return 'other'
+
+
+# Registro global e métricas da aplicação
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.histogram(
+    'mediavid_request_duration_seconds',
+    'Latência de /info e /download por plataforma e fonte (ytdlp, tiktok_api, cache, stream)',
+    ['endpoint', 'platform', 'source']
+)
+STAGE_LATENCY = registry.histogram(
+    'mediavid_stage_duration_seconds',
+    'Duração de cada etapa (extract, download, postprocess, queue_wait, rate_limit_wait)',
+    ['stage', 'platform']
+)
+BYTES = registry.counter(
+    'mediavid_bytes_total',
+    'Bytes entregues por plataforma e fonte (cache = armazenamento local)',
+    ['platform', 'source']
+)
+ERRORS = registry.counter(
+    'mediavid_errors_total',
+    'Erros por endpoint, plataforma e classe',
+    ['endpoint', 'platform', 'error_class']
+)
+FFMPEG_JOBS = registry.counter(
+    'mediavid_ffmpeg_jobs_total',
+    'Processos do ffmpeg por tarefa (audio, merge), modo (copy, transcode) e resultado',
+    ['job', 'mode', 'result']
+)
+FFMPEG_CPU = registry.histogram(
+    'mediavid_ffmpeg_cpu_seconds',
+    'Tempo de CPU (usuário + sistema) de cada processo do ffmpeg',
+    ['job', 'mode']
+)
+DIRECT_FETCH = registry.counter(
+    'mediavid_direct_fetch_total',
+    'Downloads diretos de URL de mídia por modo (ranged = várias conexões, single) e resultado',
+    ['mode', 'result']
+)
+DIRECT_FETCH_RETRIES = registry.counter(
+    'mediavid_direct_fetch_segment_retries_total',
+    'Intervalos de download direto retomados após falha'
+)
+TIKTOK_PROVIDERS = registry.counter(
+    'mediavid_tiktok_provider_total',
+    'Tentativas dos provedores do TikTok (tikwm, snaptik, ytdlp) por resultado (ok, empty, error, timeout, cancelled)',
+    ['provider', 'result']
+)
+TIKTOK_PROVIDER_LATENCY = registry.histogram(
+    'mediavid_tiktok_provider_seconds',
+    'Duração das tentativas concluídas de cada provedor do TikTok',
+    ['provider']
+)
+SOURCE_CALLS = registry.counter(
+    'mediavid_source_calls_total',
+    'Chamadas às fontes por plataforma e resultado (ok, error, skipped = circuito aberto)',
+    ['source', 'platform', 'result']
+)
+SOURCE_BREAKER_TRANSITIONS = registry.counter(
+    'mediavid_source_breaker_transitions_total',
+    'Mudanças de estado do circuit breaker das fontes (open, half_open, closed)',
+    ['source', 'platform', 'state']
+)
+TUNER_ADJUSTMENTS = registry.counter(
+    'mediavid_tuner_adjustments_total',
+    'Decisões do tuner de download por plataforma (explore, best, hold, backoff)',
+    ['platform', 'reason']
+)
+ACTIVE_DOWNLOADS = registry.gauge(
+    'mediavid_active_downloads',
+    'Downloads em andamento por tipo (direct = /download, stream = repasse, batch = fila)',
+    ['kind']
+)
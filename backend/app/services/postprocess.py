@@ -0,0 +1,258 @@
+"""
+Pós-processamento com ffmpeg: extração de áudio e merge de vídeo+áudio.
+
+Antes, todo download só de áudio passava pelo FFmpegExtractAudio do yt-dlp
+(transcodificação para MP3 a 192k, mesmo com a origem já em AAC/Opus) e os
+merges rodavam dentro do yt-dlp sem limite de processos. Numa instância
+pequena, duas transcodificações simultâneas já disputam a CPU com a API.
+
+- Probe primeiro: ffprobe (ou ffmpeg -i, se não houver ffprobe) lê os codecs
+- Cópia antes de transcodificar: AAC vira .m4a, Opus vira .opus, MP3 segue
+  MP3 e o merge usa -c copy; só o stream incompatível com a saída é recodificado
+- Arquivo que já está no formato pedido nem passa pelo ffmpeg
+- Cópia que falha (codec que o container não aceita) é refeita transcodificando
+- Processos simultâneos limitados ao número de CPUs, threads divididas entre as vagas
+- Tempo de CPU de cada processo (os.wait4) vai para as métricas
+"""
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.services.metrics import FFMPEG_CPU, FFMPEG_JOBS, STAGE_LATENCY
+
+
+# Codec de áudio -> extensão em que ele é copiado sem recodificar
+AUDIO_COPY_EXT = {'aac': 'm4a', 'alac': 'm4a', 'mp3': 'mp3', 'opus': 'opus', 'vorbis': 'ogg', 'flac': 'flac'}
+
+# Formato de áudio pedido -> (extensão, encoder) quando é preciso transcodificar
+AUDIO_TARGETS = {
+    'mp3': ('mp3', ['-c:a', 'libmp3lame', '-b:a', '192k']),
+    'm4a': ('m4a', ['-c:a', 'aac', '-b:a', '192k']),
+    'opus': ('opus', ['-c:a', 'libopus', '-b:a', '128k']),
+}
+AUDIO_TARGET_ALIASES = {'aac': 'm4a'}
+
+# Codecs que o MP4 aceita por cópia (o resto é recodificado para H.264/AAC)
+MP4_VIDEO_CODECS = {'h264', 'hevc', 'av1', 'vp9', 'mpeg4'}
+MP4_AUDIO_CODECS = {'aac', 'mp3', 'opus', 'alac', 'flac', 'ac3', 'eac3'}
+MP4_VIDEO_ENCODE = ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23']
+MP4_AUDIO_ENCODE = ['-c:a', 'aac', '-b:a', '192k']
+
+# Capas embutidas aparecem como stream de vídeo: não contam como vídeo
+IMAGE_CODECS = {'mjpeg', 'png', 'bmp', 'gif', 'webp'}
+
+
+class PostProcessError(Exception):
+    """ffmpeg falhou (código de saída diferente de zero ou arquivo sem o stream esperado)"""
+
+
+@dataclass
+class MediaProbe:
+    video_codec: Optional[str] = None
+    audio_codec: Optional[str] = None
+
+
+def available_cpus() -> int:
+    """CPUs que este processo pode usar (respeita limites de affinity do container)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class MediaPostProcessor:
+    def __init__(self, max_jobs: int = 0, threads: int = 0):
+        cpus = available_cpus()
+        self.max_jobs = max_jobs if max_jobs > 0 else cpus
+        self.threads = threads if threads > 0 else max(1, cpus // self.max_jobs)
+
+        self._slots = threading.BoundedSemaphore(self.max_jobs)
+        self._lock = threading.Lock()
+        self._ffprobe: Dict[str, Optional[str]] = {}
+
+        # Ocupação e contadores
+        self.running = 0
+        self.waiting = 0
+        self.skipped = 0  # Já estava no formato pedido (nenhum processo)
+
+    def _find_ffprobe(self, ffmpeg: str) -> Optional[str]:
+        """ffprobe ao lado do ffmpeg ou no PATH (resultado guardado por caminho do ffmpeg)"""
+        if ffmpeg not in self._ffprobe:
+            name = 'ffprobe.exe' if ffmpeg.lower().endswith('.exe') else 'ffprobe'
+            sibling = os.path.join(os.path.dirname(ffmpeg), name)
+            self._ffprobe[ffmpeg] = sibling if os.path.exists(sibling) else shutil.which('ffprobe')
+        return self._ffprobe[ffmpeg]
+
+    def probe(self, ffmpeg: str, path: Path) -> MediaProbe:
+        """Codecs do primeiro stream de vídeo e do primeiro de áudio"""
+        streams = []
+        ffprobe = self._find_ffprobe(ffmpeg)
+        if ffprobe:
+            result = subprocess.run(
+                [ffprobe, '-v', 'error', '-show_entries', 'stream=codec_type,codec_name', '-of', 'json', str(path)],
+                capture_output=True, text=True, timeout=30
+            )
+            if result.returncode == 0:
+                streams = [
+                    (stream.get('codec_type'), stream.get('codec_name'))
+                    for stream in json.loads(result.stdout or '{}').get('streams', [])
+                ]
+        if not streams:
+            # Sem ffprobe: a listagem de streams do ffmpeg -i (sai com erro por não ter saída)
+            result = subprocess.run(
+                [ffmpeg, '-hide_banner', '-nostdin', '-i', str(path)],
+                capture_output=True, text=True, timeout=30
+            )
+            streams = [
+                (kind.lower(), codec)
+                for kind, codec in re.findall(r'Stream #\d+:\d+\S*: (Video|Audio): (\w+)', result.stderr)
+            ]
+
+        probe = MediaProbe()
+        for kind, codec in streams:
+            if kind == 'video' and not probe.video_codec and codec not in IMAGE_CODECS:
+                probe.video_codec = codec
+            elif kind == 'audio' and not probe.audio_codec:
+                probe.audio_codec = codec
+        return probe
+
+    def extract_audio(self, ffmpeg: str, source: Path, target: Optional[str], platform: str) -> Path:
+        """
+        Áudio do arquivo baixado no formato pedido (mp3, m4a, opus). Sem formato
+        específico (None, 'best', 'original'), mantém o codec da origem.
+        Retorna o arquivo final (a origem é removida quando um novo é gerado).
+        """
+        target = AUDIO_TARGET_ALIASES.get(target or '', target)
+        probe = self.probe(ffmpeg, source)
+        if not probe.audio_codec:
+            raise PostProcessError("O arquivo baixado não tem faixa de áudio")
+
+        copy_ext = AUDIO_COPY_EXT.get(probe.audio_codec)
+        if target in AUDIO_TARGETS:
+            ext, encode = AUDIO_TARGETS[target]
+            copy = copy_ext == ext
+        elif copy_ext:
+            ext, encode = copy_ext, AUDIO_TARGETS['mp3'][1]
+            copy = True
+        else:
+            # Codec sem container de áudio conhecido: MP3 como antes
+            target = 'mp3'
+            ext, encode = AUDIO_TARGETS['mp3']
+            copy = False
+
+        if copy and not probe.video_codec and source.suffix.lower() == f'.{ext}':
+            with self._lock:
+                self.skipped += 1
+            print(f"🎵 Áudio já está em {ext} ({probe.audio_codec}), sem ffmpeg")
+            return source
+
+        output = source.with_name(f"{source.stem}.pp.{ext}")
+        base = ['-i', str(source), '-map', '0:a:0', '-vn', '-sn', '-dn']
+        if ext == 'm4a':
+            base += ['-movflags', '+faststart']
+
+        if copy:
+            try:
+                self._run(ffmpeg, base + ['-c:a', 'copy'], output, job='audio', mode='copy', platform=platform)
+            except PostProcessError as e:
+                print(f"⚠ Cópia do áudio falhou, transcodificando: {e}")
+                if target not in AUDIO_TARGETS:
+                    ext, encode = AUDIO_TARGETS['mp3']
+                    output = source.with_name(f"{source.stem}.pp.{ext}")
+                self._run(ffmpeg, base + encode, output, job='audio', mode='transcode', platform=platform)
+        else:
+            self._run(ffmpeg, base + encode, output, job='audio', mode='transcode', platform=platform)
+
+        final = source.with_suffix(f'.{ext}')
+        source.unlink(missing_ok=True)
+        output.replace(final)
+        return final
+
+    def merge(self, ffmpeg: str, video: Path, audio: Path, output: Path, platform: str):
+        """Junta vídeo e áudio em MP4, copiando os streams que o MP4 aceita"""
+        video_codec = self.probe(ffmpeg, video).video_codec
+        audio_codec = self.probe(ffmpeg, audio).audio_codec
+        # Codec desconhecido (probe falhou): tenta copiar, a falha cai na transcodificação
+        copy_video = video_codec is None or video_codec in MP4_VIDEO_CODECS
+        copy_audio = audio_codec is None or audio_codec in MP4_AUDIO_CODECS
+
+        base = ['-i', str(video), '-i', str(audio), '-map', '0:v:0', '-map', '1:a:0', '-movflags', '+faststart']
+        codecs = (['-c:v', 'copy'] if copy_video else MP4_VIDEO_ENCODE) + (['-c:a', 'copy'] if copy_audio else MP4_AUDIO_ENCODE)
+        mode = 'copy' if copy_video and copy_audio else 'transcode'
+        try:
+            self._run(ffmpeg, base + codecs, output, job='merge', mode=mode, platform=platform)
+        except PostProcessError as e:
+            if mode != 'copy':
+                raise
+            print(f"⚠ Merge por cópia falhou, transcodificando: {e}")
+            self._run(ffmpeg, base + MP4_VIDEO_ENCODE + MP4_AUDIO_ENCODE, output, job='merge', mode='transcode', platform=platform)
+
+    def _run(self, ffmpeg: str, args: List[str], output: Path, job: str, mode: str, platform: str):
+        """Executa o ffmpeg numa vaga livre e registra duração e tempo de CPU"""
+        command = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-nostdin', '-y', *args,
+                   '-threads', str(self.threads), str(output)]
+
+        with self._lock:
+            self.waiting += 1
+        self._slots.acquire()
+        with self._lock:
+            self.waiting -= 1
+            self.running += 1
+
+        started = time.perf_counter()
+        cpu_seconds = None
+        try:
+            process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            stderr = process.stderr.read()
+            process.stderr.close()
+            if hasattr(os, 'wait4'):
+                # wait4 devolve o uso de recursos só deste processo (CPU de usuário + sistema)
+                _, status, usage = os.wait4(process.pid, 0)
+                process.returncode = os.waitstatus_to_exitcode(status)
+                cpu_seconds = usage.ru_utime + usage.ru_stime
+            else:
+                process.wait()
+        finally:
+            with self._lock:
+                self.running -= 1
+            self._slots.release()
+
+        elapsed = time.perf_counter() - started
+        ok = process.returncode == 0
+        FFMPEG_JOBS.inc(job=job, mode=mode, result='ok' if ok else 'error')
+        STAGE_LATENCY.observe(elapsed, stage='postprocess', platform=platform)
+        if cpu_seconds is not None:
+            FFMPEG_CPU.observe(cpu_seconds, job=job, mode=mode)
+
+        cpu_text = f", CPU {cpu_seconds:.2f}s" if cpu_seconds is not None else ''
+        print(f"🎬 ffmpeg {job} ({mode}): {elapsed:.2f}s{cpu_text}")
+
+        if not ok:
+            output.unlink(missing_ok=True)
+            message = stderr.decode(errors='ignore').strip()[-300:]
+            raise PostProcessError(f"ffmpeg terminou com código {process.returncode}: {message}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'max_jobs': self.max_jobs,
+                'threads_per_job': self.threads,
+                'running': self.running,
+                'waiting': self.waiting,
+                'skipped': self.skipped,
+            }
+
+
+# Instância global do pós-processamento
+postprocessor = MediaPostProcessor(
+    max_jobs=settings.FFMPEG_MAX_JOBS,
+    threads=settings.FFMPEG_THREADS
+)
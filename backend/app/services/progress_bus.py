@@ -0,0 +1,173 @@
+"""
+Barramento de progresso para o WebSocket.
+
+As threads de download (hooks do yt-dlp, download direto) publicam o
+progresso a cada callback; o barramento guarda só o último valor de cada
+etapa do cliente e envia numa frequência fixa, pulando valores repetidos. O volume de
+mensagens fica constante, independente do tamanho do arquivo ou de quantos
+fragmentos são baixados em paralelo.
+
+- publish() pode ser chamado de qualquer thread: grava no slot do cliente e só
+  acorda o loop (call_soon_threadsafe) quando não há envio periódico agendado
+- Um envio por etapa do cliente a cada intervalo, sempre com o valor mais recente
+- Mudança de etapa (starting → downloading → complete/error) nunca é descartada:
+  dentro do intervalo, só valores da mesma etapa se sobrescrevem; o último de
+  cada etapa sai na ordem em que foi publicado
+"""
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+
+TERMINAL_STAGES = ('complete', 'error')
+
+Sender = Callable[[str, dict], Awaitable[None]]
+Observer = Callable[[str, dict], None]
+
+
+class ProgressBus:
+    def __init__(self, flush_interval: float = 0.25):
+        self.flush_interval = flush_interval
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sender: Optional[Sender] = None
+        self._observers: List[Observer] = []
+
+        # Valores ainda não enviados por cliente: o último de cada etapa, na ordem
+        self._pending: Dict[str, List[dict]] = {}
+        # Último (etapa, progresso) enviado por cliente
+        self._last_sent: Dict[str, Tuple[str, int]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._flushing = False  # Envio periódico agendado/em andamento
+        self._lock = threading.Lock()
+
+        # Contadores
+        self.published = 0
+        self.sent = 0
+
+    def set_sender(self, sender: Sender):
+        """Função que entrega a mensagem ao cliente (ex: ConnectionManager.send_progress)"""
+        self._sender = sender
+
+    def add_observer(self, observer: Observer):
+        """Função chamada no event loop com cada progresso enviado (ex: progresso dos itens da fila)"""
+        if observer not in self._observers:
+            self._observers.append(observer)
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """Event loop onde os envios acontecem (capturado no startup)"""
+        self._loop = loop
+
+    def publish(self, client_id: Optional[str], stage: str, progress: int, message: str):
+        """Publica o progresso de um cliente (seguro em qualquer thread)"""
+        if not client_id or not self._sender:
+            return
+
+        data = {'stage': stage, 'progress': progress, 'message': message}
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not None and self._loop is None:
+            self._loop = running
+
+        if self._loop is None or self._loop.is_closed():
+            # Sem loop (ex: scripts de teste): não há cliente WebSocket para receber
+            return
+
+        with self._lock:
+            self.published += 1
+            queued = self._pending.setdefault(client_id, [])
+            if queued and queued[-1]['stage'] == stage:
+                queued[-1] = data
+            else:
+                queued.append(data)
+            if self._flushing:
+                # O envio periódico já está agendado e vai pegar o valor mais recente
+                return
+            self._flushing = True
+
+        if running is self._loop:
+            self._start_flusher()
+        else:
+            try:
+                self._loop.call_soon_threadsafe(self._start_flusher)
+            except RuntimeError:
+                # Loop encerrado durante o shutdown
+                pass
+
+    def _start_flusher(self):
+        """Inicia o envio periódico (executa no event loop)"""
+        self._flusher = self._loop.create_task(self._flush_loop())
+
+    def _take_pending(self) -> Dict[str, List[dict]]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    async def _flush_loop(self):
+        """Envia os valores pendentes a cada intervalo enquanto houver publicações"""
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                with self._lock:
+                    pending, self._pending = self._pending, {}
+                    if not pending:
+                        self._flushing = False
+                        return
+                for client_id, queued in pending.items():
+                    for data in queued:
+                        await self._send(client_id, data)
+        except BaseException:
+            with self._lock:
+                self._flushing = False
+            raise
+
+    async def _send(self, client_id: str, data: dict):
+        state = (data['stage'], data['progress'])
+        if self._last_sent.get(client_id) == state:
+            # Mesmo percentual: só mudou velocidade/ETA, não vale uma mensagem
+            return
+
+        if data['stage'] in TERMINAL_STAGES:
+            self._last_sent.pop(client_id, None)
+        else:
+            self._last_sent[client_id] = state
+
+        for observer in self._observers:
+            try:
+                observer(client_id, data)
+            except Exception as e:
+                print(f"Erro ao repassar progresso: {e}")
+
+        try:
+            await self._sender(client_id, data)
+            self.sent += 1
+        except Exception as e:
+            print(f"Erro ao enviar progresso: {e}")
+
+    async def flush(self):
+        """Envia imediatamente tudo que está pendente (ex: antes do shutdown)"""
+        for client_id, queued in self._take_pending().items():
+            for data in queued:
+                await self._send(client_id, data)
+
+    def forget(self, client_id: str):
+        """Descarta o estado de um cliente (WebSocket desconectado)"""
+        with self._lock:
+            self._pending.pop(client_id, None)
+        self._last_sent.pop(client_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'published': self.published,
+            'sent': self.sent,
+            'pending_clients': len(self._pending),
+            'tracked_clients': len(self._last_sent),
+        }
+
+
+# Instância global do barramento de progresso
+progress_bus = ProgressBus(flush_interval=1 / max(0.1, settings.PROGRESS_UPDATES_PER_SECOND))
@@ -1,9 +1,16 @@
 import asyncio
-from typing import Dict, List, Optional
+import itertools
+import time
+from collections import OrderedDict, defaultdict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set
 from enum import Enum
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from datetime import datetime
 import uuid
+from app.config import settings
+from app.services.shared_state import SharedStateBackend, QUEUE_CHANNEL, shared_state
+from app.services.queue_store import QueueStore, create_queue_store
+from app.utils.validators import detect_platform
 
 
 class DownloadStatus(str, Enum):
@@ -26,31 +33,545 @@ class QueueItem:
     progress: int = 0
     message: str = ""
     filepath: Optional[str] = None
+    store_key: Optional[str] = None  # Chave do arquivo no armazenamento de mídia
+    tuning: Optional[Dict[str, Any]] = None  # Conexões/chunk escolhidos pelo tuner e a medição do download
     error: Optional[str] = None
     downloaded: bool = False  # Flag para indicar se usuário já baixou
+    content_key: Optional[str] = None  # Chave canônica do conteúdo ('Plataforma:id')
+    platform: Optional[str] = None
+    priority: int = 0  # Maior = processado antes
+    batch_id: Optional[str] = None  # Lote/sessão que adicionou o item primeiro
+    batch_ids: List[str] = field(default_factory=list)  # Todos os lotes que pediram o item (assinatura via WebSocket)
+    # Metadados resolvidos ao adicionar o lote
+    title: Optional[str] = None
+    duration: Optional[float] = None
+    filesize_estimate: Optional[int] = None
+    thumbnail: Optional[str] = None
     created_at: datetime = field(default_factory=datetime.now)
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
+    
+    DATETIME_FIELDS = ('created_at', 'started_at', 'completed_at')
+    
+    def __post_init__(self):
+        # Itens gravados antes de batch_ids existir
+        if self.batch_id and self.batch_id not in self.batch_ids:
+            self.batch_ids.insert(0, self.batch_id)
+    
+    def in_batch(self, batch_id: str) -> bool:
+        """Indica se o item foi pedido pelo lote (o mesmo item pode estar em vários)"""
+        return batch_id in self.batch_ids
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializa para JSON (backend compartilhado)"""
+        data = {f.name: getattr(self, f.name) for f in fields(self)}
+        data['status'] = self.status.value
+        for name in self.DATETIME_FIELDS:
+            data[name] = data[name].isoformat() if data[name] else None
+        return data
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'QueueItem':
+        known = {f.name for f in fields(cls)}
+        values = {key: value for key, value in data.items() if key in known}
+        values['status'] = DownloadStatus(values.get('status', DownloadStatus.PENDING))
+        for name in cls.DATETIME_FIELDS:
+            if values.get(name):
+                values[name] = datetime.fromisoformat(values[name])
+        return cls(**values)
 
 
 class DownloadQueueManager:
-    def __init__(self, max_concurrent: int = 3):
+    """
+    Fila de downloads em lote com agendador próprio.
+    
+    Um pool fixo de workers (max_concurrent) consome uma fila de prioridade.
+    Cada plataforma tem um limite de downloads simultâneos (max_per_platform);
+    itens de uma plataforma lotada esperam numa fila própria e voltam para a
+    fila principal quando uma vaga daquela plataforma é liberada. Pausa e
+    cancelamento são verificados no momento em que o item sai da fila.
+    
+    Com um backend compartilhado (vários workers/instâncias), cada processo
+    mantém um espelho da fila: alterações locais são gravadas em lote no
+    backend e anunciadas aos outros workers, e cada item é reservado (claim)
+    pelo worker que vai baixá-lo. Itens presos a um worker que parou de
+    responder voltam para a fila (restore e verificação periódica).
+    
+    Com um QueueStore, as mesmas alterações em lote são gravadas em disco
+    (SQLite) e a fila é restaurada no startup (restore). Com store_factory, o
+    banco só é aberto no restore (importar o módulo não cria arquivos).
+    
+    Contadores por status são mantidos a cada transição (get_queue_status é
+    O(1)) e cada alteração recebe uma versão crescente: changes_since() devolve
+    só o que mudou desde a última consulta do cliente.
+    """
+    
+    # Reserva de um item por um worker (cobre downloads longos)
+    CLAIM_TTL_SECONDS = 6 * 3600
+    # Espera antes de gravar: agrupa várias alterações numa única escrita
+    SYNC_DELAY_SECONDS = 0.1
+    # Nova tentativa depois de uma gravação que falhou
+    SYNC_RETRY_SECONDS = 5
+    # Intervalo da busca por itens reservados por workers que pararam (backend distribuído)
+    RECOVERY_INTERVAL_SECONDS = 60
+    # Itens removidos lembrados para a listagem incremental (além dos itens da fila)
+    CHANGELOG_TOMBSTONES = 1000
+    
+    def __init__(self, max_concurrent: int = 3, max_per_platform: int = 2,
+                 backend: Optional[SharedStateBackend] = None, store: Optional[QueueStore] = None,
+                 store_factory: Optional[Callable[[], Optional[QueueStore]]] = None):
         self.max_concurrent = max_concurrent
+        self.max_per_platform = max_per_platform
         self.queue: Dict[str, QueueItem] = {}
         self.active_downloads: Dict[str, asyncio.Task] = {}
-        self.semaphore = asyncio.Semaphore(max_concurrent)
+        
+        # Contadores por status e histórico de alterações (id -> versão, em ordem de versão).
+        # A versão parte do relógio: versões de um processo anterior ficam abaixo do piso
+        # e o cliente recebe reset em vez de uma lista incompleta.
+        self._status_counts: Dict[DownloadStatus, int] = {status: 0 for status in DownloadStatus}
+        self.version = int(time.time() * 1000)
+        self._changelog: 'OrderedDict[str, int]' = OrderedDict()
+        self._changelog_floor = self.version
+        self._tombstones: Dict[str, List[str]] = {}  # Itens removidos ainda no histórico -> batch_ids
+        # Assinantes de alterações (WebSocket /ws/queue), sinalizados a cada versão nova
+        self._watchers: Set[asyncio.Event] = set()
+        
+        # Sincronização com o backend compartilhado
+        self.backend = backend or shared_state
+        self.backend.on(QUEUE_CHANNEL, self._on_remote_change)
+        self._dirty: Set[str] = set()
+        self._removed: Set[str] = set()
+        self._sync_task: Optional[asyncio.Task] = None
+        
+        # Persistência em disco (None = só memória)
+        self.store = store
+        self._store_factory = store_factory
+        
+        # Agendador (criado no primeiro start, dentro do event loop)
+        self._runner: Optional[Callable[[QueueItem], Awaitable[None]]] = None
+        self._pending: Optional[asyncio.PriorityQueue] = None
+        self._enqueued: Set[str] = set()
+        self._sequence = itertools.count()  # Desempate FIFO entre itens de mesma prioridade
+        self._workers: List[asyncio.Task] = []
+        self._recovery: Optional[asyncio.Task] = None
+        self._platform_active: Dict[str, int] = defaultdict(int)
+        self._deferred: Dict[str, Deque[str]] = defaultdict(deque)
+    
+    @property
+    def running(self) -> bool:
+        """Indica se o agendador está ativo"""
+        return any(not worker.done() for worker in self._workers)
+    
+    def _enqueue(self, item: QueueItem):
+        """Coloca o item na fila de prioridade (se o agendador estiver ativo)"""
+        if self._pending is None or item.id in self._enqueued:
+            return
+        self._enqueued.add(item.id)
+        self._pending.put_nowait((-item.priority, next(self._sequence), item.id))
+    
+    def start(self, runner: Callable[[QueueItem], Awaitable[None]]) -> int:
+        """
+        Inicia o agendador (idempotente: chamar de novo não cria workers duplicados).
+        Enfileira os itens pendentes e retorna quantos estão aguardando.
+        Itens adicionados depois entram direto na fila.
+        """
+        self._runner = runner
+        if self._pending is None:
+            self._pending = asyncio.PriorityQueue()
+        
+        for item in self.queue.values():
+            if item.status == DownloadStatus.PENDING and item.id not in self.active_downloads:
+                self._enqueue(item)
+        
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        while len(self._workers) < self.max_concurrent:
+            self._workers.append(asyncio.create_task(self._worker(len(self._workers))))
+        if self.backend.distributed and (self._recovery is None or self._recovery.done()):
+            self._recovery = asyncio.create_task(self._recovery_loop())
+        
+        return len(self._enqueued)
+    
+    async def stop(self):
+        """Encerra os workers e cancela downloads em andamento (shutdown da aplicação)"""
+        for task in list(self.active_downloads.values()):
+            task.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        if self._recovery:
+            self._recovery.cancel()
+        await asyncio.gather(*self._workers, *filter(None, [self._recovery]), return_exceptions=True)
+        self._workers = []
+        self._recovery = None
+    
+    async def _worker(self, worker_id: int):
+        """Worker de longa duração: consome a fila respeitando os limites por plataforma"""
+        while True:
+            _, _, item_id = await self._pending.get()
+            self._enqueued.discard(item_id)
+            
+            item = self.queue.get(item_id)
+            # Pausado, cancelado ou removido enquanto esperava
+            if not item or item.status != DownloadStatus.PENDING:
+                continue
+            
+            platform = item.platform or 'Unknown'
+            if self._platform_active[platform] >= self.max_per_platform:
+                # Plataforma lotada: espera uma vaga dela sem ocupar o worker
+                self._deferred[platform].append(item_id)
+                continue
+            
+            # Com vários workers, só quem conseguir a reserva baixa o item
+            if not await self.backend.claim(f"item:{item_id}", self.CLAIM_TTL_SECONDS):
+                continue
+            
+            self._platform_active[platform] += 1
+            task = asyncio.create_task(self._runner(item))
+            self.active_downloads[item_id] = task
+            try:
+                # wait() não propaga o cancelamento do item (só o do worker)
+                await asyncio.wait({task})
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+            finally:
+                self.active_downloads.pop(item_id, None)
+                self._platform_active[platform] -= 1
+                self._release_deferred(platform)
+    
+    def _release_deferred(self, platform: str):
+        """Devolve à fila o próximo item que esperava vaga na plataforma"""
+        deferred = self._deferred[platform]
+        while deferred:
+            item = self.queue.get(deferred.popleft())
+            if item and item.status == DownloadStatus.PENDING:
+                self._enqueue(item)
+                return
+    
+    def scheduler_status(self) -> Dict:
+        """Estado do agendador (workers, downloads por plataforma, itens aguardando)"""
+        return {
+            'running': self.running,
+            'workers': len([worker for worker in self._workers if not worker.done()]),
+            'max_concurrent': self.max_concurrent,
+            'max_per_platform': self.max_per_platform,
+            'queued': len(self._enqueued),
+            'active_by_platform': {k: v for k, v in self._platform_active.items() if v},
+            'deferred_by_platform': {k: len(v) for k, v in self._deferred.items() if v},
+        }
+    
+    # Backend compartilhado
+    
+    async def restore(self, has_file: Optional[Callable[[str], bool]] = None) -> Dict[str, int]:
+        """
+        Carrega a fila gravada em disco e no backend compartilhado (chamado no startup).
+        
+        - Itens que estavam baixando quando o processo caiu voltam para pendente
+          (com backend distribuído, só os reservados por um worker que parou)
+        - Itens concluídos cujo arquivo não existe mais no armazenamento viram falha
+        """
+        if self.store is None and self._store_factory:
+            self.store = await asyncio.to_thread(self._store_factory)
+            if self.store and self.queue:
+                # Itens adicionados antes do restore (ele roda em segundo plano) vão para o banco também
+                self._dirty.update(self.queue)
+                self._schedule_sync()
+        saved = await asyncio.to_thread(self.store.load) if self.store else {}
+        # O backend compartilhado é mais recente que a cópia local
+        saved.update(await self.backend.load_items())
+        
+        loaded = resumed = expired = 0
+        for item_id, data in saved.items():
+            if item_id in self.queue:
+                continue
+            try:
+                item = QueueItem.from_dict(data)
+            except Exception as e:
+                print(f"⚠ Item inválido na fila gravada ({item_id}): {e}")
+                continue
+            self._put_item(item)
+            self._mark_changed(item_id)
+            loaded += 1
+            
+            if item.status == DownloadStatus.DOWNLOADING and (
+                not self.backend.distributed or await self.backend.claim_stale(f"item:{item_id}")
+            ):
+                self._requeue(item, "Retomado após reinício do servidor")
+                resumed += 1
+            elif (
+                item.status == DownloadStatus.COMPLETED
+                and has_file is not None
+                and not (item.store_key and has_file(item.store_key))
+            ):
+                self._set_status(item, DownloadStatus.FAILED)
+                item.error = "Arquivo não está mais disponível no servidor"
+                item.filepath = None
+                self._touch(item_id)
+                expired += 1
+        
+        return {'loaded': loaded, 'resumed': resumed, 'expired': expired}
     
-    def add_to_queue(self, url: str, quality: Optional[str], output_format: str, audio_only: bool) -> str:
-        """Adiciona item à fila e retorna o ID"""
+    def _requeue(self, item: QueueItem, message: str):
+        """Devolve para pendente um item cujo download foi interrompido"""
+        self._set_status(item, DownloadStatus.PENDING)
+        item.progress = 0
+        item.message = message
+        item.started_at = None
+        self._touch(item.id)
+        self._enqueue(item)
+    
+    async def recover_stale(self) -> int:
+        """
+        Itens reservados por um worker que parou de responder (sem heartbeat)
+        voltam para a fila; a reserva é assumida por quem pegar o item.
+        """
+        recovered = 0
+        for item in list(self.queue.values()):
+            if (
+                item.status not in (DownloadStatus.DOWNLOADING, DownloadStatus.PENDING)
+                or item.id in self.active_downloads
+                or item.id in self._enqueued
+            ):
+                continue
+            if not await self.backend.claim_stale(f"item:{item.id}"):
+                continue
+            # O item pode ter mudado durante a consulta ao backend
+            if item.id in self.active_downloads or self.queue.get(item.id) is not item:
+                continue
+            if item.status == DownloadStatus.DOWNLOADING:
+                self._requeue(item, "Retomado: o worker que baixava parou de responder")
+                recovered += 1
+            elif item.status == DownloadStatus.PENDING:
+                # Reservado por um worker que caiu antes de começar
+                self._enqueue(item)
+        return recovered
+    
+    async def _recovery_loop(self):
+        while True:
+            await asyncio.sleep(self.RECOVERY_INTERVAL_SECONDS)
+            try:
+                recovered = await self.recover_stale()
+                if recovered:
+                    print(f"♻ Fila: {recovered} itens retomados de workers que pararam")
+            except Exception as e:
+                print(f"⚠ Erro ao recuperar itens da fila: {e}")
+    
+    def referenced_files(self) -> Set[str]:
+        """Arquivos apontados pela fila ou usados pelo store (não são órfãos)"""
+        paths = {item.filepath for item in self.queue.values() if item.filepath}
+        if self.store:
+            paths.update(str(path) for path in self.store.files)
+        return paths
+    
+    def _touch(self, item_id: str):
+        """Marca o item como alterado (gravado no backend no próximo lote)"""
+        self._mark_changed(item_id)
+        self._dirty.add(item_id)
+        self._schedule_sync()
+    
+    def _forget(self, item_ids: Iterable[str]):
+        """Marca itens como removidos da fila"""
+        for item_id in item_ids:
+            self._dirty.discard(item_id)
+            self._removed.add(item_id)
+        self._schedule_sync()
+    
+    def _schedule_sync(self):
+        if self._sync_task and not self._sync_task.done():
+            return
+        try:
+            self._sync_task = asyncio.get_running_loop().create_task(self._sync())
+        except RuntimeError:
+            # Sem event loop (ex: scripts): nada a sincronizar
+            pass
+    
+    async def _sync(self):
+        """Grava as alterações pendentes em lote e avisa os outros workers"""
+        await asyncio.sleep(self.SYNC_DELAY_SECONDS)
+        while self._dirty or self._removed:
+            dirty, self._dirty = self._dirty, set()
+            removed, self._removed = self._removed, set()
+            try:
+                items = {item_id: self.queue[item_id].to_dict() for item_id in dirty if item_id in self.queue}
+                
+                if self.store:
+                    await asyncio.to_thread(self.store.write_batch, items, removed)
+                await self.backend.save_items(items)
+                await self.backend.delete_items(removed)
+                if self.backend.distributed:
+                    await self.backend.publish(QUEUE_CHANNEL, {
+                        'origin': self.backend.worker_id,
+                        'items': list(items.values()),
+                        'removed': list(removed),
+                    })
+            except Exception as e:
+                # Devolve o lote (sem reviver o que foi removido nesse meio tempo) e tenta de novo depois
+                self._removed |= removed
+                self._dirty |= dirty - self._removed
+                print(f"⚠ Erro ao gravar a fila ({len(dirty)} alterados, {len(removed)} removidos): {e}")
+                asyncio.get_running_loop().call_later(self.SYNC_RETRY_SECONDS, self._schedule_sync)
+                return
+    
+    async def flush(self):
+        """Grava imediatamente as alterações pendentes (shutdown)"""
+        if self._sync_task and not self._sync_task.done():
+            await self._sync_task
+        if self._dirty or self._removed:
+            self._sync_task = asyncio.create_task(self._sync())
+            await self._sync_task
+    
+    async def close(self):
+        """Grava as alterações pendentes e fecha o banco (shutdown)"""
+        await self.flush()
+        if self.store:
+            await asyncio.to_thread(self.store.close)
+            self.store = None
+    
+    async def _on_remote_change(self, message: dict):
+        """Aplica alterações feitas por outro worker no espelho local"""
+        if message.get('origin') == self.backend.worker_id:
+            return
+        
+        for data in message.get('items', []):
+            item = QueueItem.from_dict(data)
+            self._put_item(item)
+            self._mark_changed(item.id)
+            
+            if item.status == DownloadStatus.CANCELLED and item.id in self.active_downloads:
+                self.active_downloads.pop(item.id).cancel()
+            elif item.status == DownloadStatus.PENDING and item.id not in self.active_downloads:
+                # Item novo ou retomado em outro worker: qualquer agendador ativo pode pegá-lo (claim decide)
+                self._enqueue(item)
+        
+        for item_id in message.get('removed', []):
+            self._drop_item(item_id)
+            task = self.active_downloads.pop(item_id, None)
+            if task:
+                task.cancel()
+    
+    # Contadores por status e listagem incremental
+    
+    def _put_item(self, item: QueueItem):
+        """Insere ou substitui um item mantendo os contadores por status"""
+        old = self.queue.get(item.id)
+        if old:
+            self._status_counts[old.status] -= 1
+        self.queue[item.id] = item
+        self._status_counts[item.status] += 1
+        self._tombstones.pop(item.id, None)
+    
+    def _drop_item(self, item_id: str) -> Optional[QueueItem]:
+        """Remove um item (fica no histórico como removido)"""
+        item = self.queue.pop(item_id, None)
+        if item:
+            self._status_counts[item.status] -= 1
+            self._tombstones[item_id] = item.batch_ids
+            self._mark_changed(item_id)
+        return item
+    
+    def _set_status(self, item: QueueItem, status: DownloadStatus):
+        """Única forma de mudar o status de um item da fila (mantém os contadores)"""
+        if item.status != status:
+            self._status_counts[item.status] -= 1
+            self._status_counts[status] += 1
+            item.status = status
+    
+    def _mark_changed(self, item_id: str):
+        """Dá uma nova versão ao item e limita o histórico de alterações"""
+        self.version += 1
+        self._changelog[item_id] = self.version
+        self._changelog.move_to_end(item_id)
+        while len(self._changelog) > len(self.queue) + self.CHANGELOG_TOMBSTONES:
+            # Quem estiver antes desta versão precisa recarregar a listagem completa
+            item_id, self._changelog_floor = self._changelog.popitem(last=False)
+            self._tombstones.pop(item_id, None)
+        for event in self._watchers:
+            event.set()
+    
+    def watch(self) -> asyncio.Event:
+        """Evento sinalizado a cada alteração da fila (chamar unwatch ao terminar)"""
+        event = asyncio.Event()
+        self._watchers.add(event)
+        return event
+    
+    def unwatch(self, event: asyncio.Event):
+        self._watchers.discard(event)
+    
+    def changes_since(self, since: int, limit: int) -> Optional[Dict[str, Any]]:
+        """
+        Itens alterados e removidos depois da versão `since`, em ordem de versão
+        (custo proporcional ao número de alterações, não ao tamanho da fila).
+        Retorna None quando o histórico não cobre mais essa versão.
+        """
+        if since < self._changelog_floor or since > self.version:
+            return None
+        
+        changed = []
+        for item_id in reversed(self._changelog):
+            version = self._changelog[item_id]
+            if version <= since:
+                break
+            changed.append((version, item_id))
+        changed.reverse()
+        
+        page = changed[:limit]
+        has_more = len(changed) > limit
+        return {
+            'items': [self.queue[item_id] for _, item_id in page if item_id in self.queue],
+            'removed': [item_id for _, item_id in page if item_id not in self.queue],
+            'removed_batches': {item_id: self._tombstones.get(item_id, []) for _, item_id in page if item_id not in self.queue},
+            # Próximo `since`: continua da página atual ou da versão mais recente
+            'version': page[-1][0] if has_more else self.version,
+            'has_more': has_more,
+        }
+    
+    def find_duplicate(self, content_key: str, quality: Optional[str], output_format: str,
+                       audio_only: bool) -> Optional[QueueItem]:
+        """Procura item ativo com o mesmo conteúdo e as mesmas opções de download"""
+        for item in self.queue.values():
+            if (
+                item.content_key == content_key
+                and item.quality == quality
+                and item.output_format == output_format
+                and item.audio_only == audio_only
+                and item.status not in [DownloadStatus.FAILED, DownloadStatus.CANCELLED]
+            ):
+                return item
+        return None
+    
+    def add_to_queue(self, url: str, quality: Optional[str], output_format: str, audio_only: bool,
+                     content_key: Optional[str] = None, priority: int = 0, batch_id: Optional[str] = None) -> str:
+        """
+        Adiciona item à fila e retorna o ID.
+        Se o mesmo conteúdo (mesma chave canônica e opções) já estiver na fila,
+        retorna o ID do item existente em vez de baixar de novo; o item passa a
+        fazer parte também do lote novo (e aparece na assinatura dele).
+        """
+        if content_key:
+            existing = self.find_duplicate(content_key, quality, output_format, audio_only)
+            if existing:
+                if batch_id and not existing.in_batch(batch_id):
+                    existing.batch_ids.append(batch_id)
+                    existing.batch_id = existing.batch_id or batch_id
+                    self._touch(existing.id)
+                return existing.id
+        
         item_id = str(uuid.uuid4())
         item = QueueItem(
             id=item_id,
             url=url,
             quality=quality,
             output_format=output_format,
-            audio_only=audio_only
+            audio_only=audio_only,
+            content_key=content_key,
+            platform=content_key.split(':', 1)[0] if content_key else detect_platform(url),
+            priority=priority,
+            batch_id=batch_id
         )
-        self.queue[item_id] = item
+        self._put_item(item)
+        self._touch(item_id)
+        
+        # Com o agendador ativo, o item entra direto na fila
+        self._enqueue(item)
         return item_id
     
     def add_multiple(self, items: List[Dict]) -> List[str]:
@@ -75,22 +596,16 @@ class DownloadQueueManager:
         return list(self.queue.values())
     
     def get_queue_status(self) -> Dict:
-        """Retorna status geral da fila"""
-        items = self.get_all_items()
+        """Retorna status geral da fila (contadores mantidos a cada transição)"""
         return {
-            'total': len(items),
-            'pending': len([i for i in items if i.status == DownloadStatus.PENDING]),
-            'downloading': len([i for i in items if i.status == DownloadStatus.DOWNLOADING]),
-            'completed': len([i for i in items if i.status == DownloadStatus.COMPLETED]),
-            'failed': len([i for i in items if i.status == DownloadStatus.FAILED]),
-            'cancelled': len([i for i in items if i.status == DownloadStatus.CANCELLED]),
-            'paused': len([i for i in items if i.status == DownloadStatus.PAUSED]),
+            'total': len(self.queue),
+            **{status.value: count for status, count in self._status_counts.items()},
         }
     
     def update_status(self, item_id: str, status: DownloadStatus, progress: int = 0, message: str = ""):
         """Atualiza status de um item"""
         if item_id in self.queue:
-            self.queue[item_id].status = status
+            self._set_status(self.queue[item_id], status)
             self.queue[item_id].progress = progress
             self.queue[item_id].message = message
             
@@ -98,24 +613,50 @@ class DownloadQueueManager:
                 self.queue[item_id].started_at = datetime.now()
             elif status in [DownloadStatus.COMPLETED, DownloadStatus.FAILED, DownloadStatus.CANCELLED]:
                 self.queue[item_id].completed_at = datetime.now()
+            self._touch(item_id)
+    
+    def set_metadata(self, item_id: str, title: Optional[str], duration: Optional[float],
+                     filesize_estimate: Optional[int], thumbnail: Optional[str]):
+        """Guarda os metadados resolvidos antes do download"""
+        if item_id in self.queue:
+            item = self.queue[item_id]
+            item.title = title
+            item.duration = duration
+            item.filesize_estimate = filesize_estimate
+            item.thumbnail = thumbnail
+            self._touch(item_id)
+    
+    def record_progress(self, item_id: str, data: dict):
+        """Progresso de um download em andamento (repassado pelo progress_bus, já limitado por segundo)"""
+        item = self.queue.get(item_id)
+        if item and item.status == DownloadStatus.DOWNLOADING and data.get('stage') not in ('complete', 'error'):
+            item.progress = data.get('progress', item.progress)
+            item.message = data.get('message', item.message)
+            self._touch(item_id)
     
     def set_error(self, item_id: str, error: str):
         """Define erro para um item"""
         if item_id in self.queue:
-            self.queue[item_id].status = DownloadStatus.FAILED
+            self._set_status(self.queue[item_id], DownloadStatus.FAILED)
             self.queue[item_id].error = error
             self.queue[item_id].completed_at = datetime.now()
+            self._touch(item_id)
     
-    def set_filepath(self, item_id: str, filepath: str):
+    def set_filepath(self, item_id: str, filepath: str, store_key: Optional[str] = None,
+                     tuning: Optional[Dict[str, Any]] = None):
         """Define caminho do arquivo baixado"""
         if item_id in self.queue:
             self.queue[item_id].filepath = filepath
+            self.queue[item_id].store_key = store_key
+            self.queue[item_id].tuning = tuning
+            self._touch(item_id)
     
     def cancel_item(self, item_id: str):
         """Cancela um item da fila"""
         if item_id in self.queue:
-            self.queue[item_id].status = DownloadStatus.CANCELLED
+            self._set_status(self.queue[item_id], DownloadStatus.CANCELLED)
             self.queue[item_id].completed_at = datetime.now()
+            self._touch(item_id)
             
             # Cancela task ativa se existir
             if item_id in self.active_downloads:
@@ -125,12 +666,15 @@ class DownloadQueueManager:
     def pause_item(self, item_id: str):
         """Pausa um item (marca como pausado, mas não cancela o download em andamento)"""
         if item_id in self.queue and self.queue[item_id].status == DownloadStatus.PENDING:
-            self.queue[item_id].status = DownloadStatus.PAUSED
+            self._set_status(self.queue[item_id], DownloadStatus.PAUSED)
+            self._touch(item_id)
     
     def resume_item(self, item_id: str):
         """Resume um item pausado"""
         if item_id in self.queue and self.queue[item_id].status == DownloadStatus.PAUSED:
-            self.queue[item_id].status = DownloadStatus.PENDING
+            self._set_status(self.queue[item_id], DownloadStatus.PENDING)
+            self._touch(item_id)
+            self._enqueue(self.queue[item_id])
     
     def clear_completed(self):
         """Remove itens completados da fila"""
@@ -139,7 +683,8 @@ class DownloadQueueManager:
             if item.status in [DownloadStatus.COMPLETED, DownloadStatus.FAILED, DownloadStatus.CANCELLED]
         ]
         for item_id in to_remove:
-            del self.queue[item_id]
+            self._drop_item(item_id)
+        self._forget(to_remove)
     
     def clear_all(self):
         """Limpa toda a fila"""
@@ -147,13 +692,22 @@ class DownloadQueueManager:
         for task in self.active_downloads.values():
             task.cancel()
         self.active_downloads.clear()
-        self.queue.clear()
+        self._deferred.clear()
+        to_remove = list(self.queue)
+        for item_id in to_remove:
+            self._drop_item(item_id)
+        self._forget(to_remove)
     
     def mark_as_downloaded(self, item_id: str):
         """Marca item como já baixado pelo usuário"""
         if item_id in self.queue:
             self.queue[item_id].downloaded = True
+            self._touch(item_id)
 
 
 # Instância global do gerenciador de fila
-queue_manager = DownloadQueueManager(max_concurrent=3)
+queue_manager = DownloadQueueManager(
+    max_concurrent=settings.MAX_CONCURRENT_DOWNLOADS,
+    max_per_platform=settings.MAX_CONCURRENT_PER_PLATFORM,
+    store_factory=create_queue_store
+)
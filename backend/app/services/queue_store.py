@@ -0,0 +1,142 @@
+"""
+Persistência da fila em lote em SQLite (modo WAL).
+
+Sem isso, todo deploy ou cold start apaga os itens pendentes e concluídos.
+Os itens são gravados como JSON (QueueItem.to_dict) numa única tabela:
+
+- WAL + synchronous=NORMAL: escrita rápida, leitores não bloqueiam o escritor
+  e o banco sobrevive a uma queda do processo (no máximo perde o último lote)
+- Escritas em lote: o queue_manager junta as alterações (várias atualizações
+  do mesmo item viram uma só linha) e grava tudo numa transação
+- Executado em thread (asyncio.to_thread): o event loop não espera o disco
+"""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.config import settings
+
+
+class QueueStore:
+    """Fila gravada em SQLite. Os métodos são bloqueantes (chamar fora do event loop)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS queue_items ("
+            " id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL"
+            ")"
+        )
+
+        # Contadores
+        self.batches = 0
+        self.writes = 0
+        self.errors = 0
+
+    @property
+    def files(self) -> List[Path]:
+        """Arquivos do banco (principal + WAL), para não serem tratados como órfãos"""
+        return [self.path, Path(f"{self.path}-wal"), Path(f"{self.path}-shm")]
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Todos os itens gravados (id -> dicionário do QueueItem)"""
+        items = {}
+        with self._lock:
+            rows = self._conn.execute("SELECT id, data FROM queue_items").fetchall()
+        for item_id, data in rows:
+            try:
+                items[item_id] = json.loads(data)
+            except ValueError as e:
+                print(f"⚠ Item corrompido na fila gravada ({item_id}): {e}")
+        return items
+
+    def write_batch(self, items: Dict[str, Dict[str, Any]], removed: Iterable[str] = ()):
+        """Grava alterações e remoções numa única transação (sqlite3.Error sobe depois do rollback)"""
+        removed = list(removed)
+        if not items and not removed:
+            return
+
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN")
+                if items:
+                    self._conn.executemany(
+                        "INSERT INTO queue_items (id, data, updated_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                        [(item_id, json.dumps(data), now) for item_id, data in items.items()]
+                    )
+                if removed:
+                    self._conn.executemany("DELETE FROM queue_items WHERE id = ?", [(item_id,) for item_id in removed])
+                self._conn.execute("COMMIT")
+                self.batches += 1
+                self.writes += len(items) + len(removed)
+            except sqlite3.Error as e:
+                self.errors += 1
+                print(f"⚠ Erro ao gravar a fila em disco: {e}")
+                try:
+                    self._conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+                # O queue_manager guarda o lote e tenta de novo
+                raise
+
+    def close(self):
+        with self._lock:
+            try:
+                # Incorpora o WAL ao banco principal antes de sair
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error:
+                pass
+            self._conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'path': str(self.path),
+            'batches': self.batches,
+            'writes': self.writes,
+            'errors': self.errors,
+        }
+
+
+def _move_legacy_db(path: Path):
+    """
+    O banco ficava na raiz da pasta temporária, onde o WAL podia ser tomado pelo
+    arquivo baixado mais recente: move-o (com WAL e SHM) para o caminho novo.
+    """
+    legacy = Path(settings.TEMP_DOWNLOAD_PATH) / path.name
+    if path.exists() or not legacy.is_file():
+        return
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        for suffix in ('', '-wal', '-shm'):
+            source = Path(f"{legacy}{suffix}")
+            if source.exists():
+                source.replace(Path(f"{path}{suffix}"))
+        print(f"✓ Fila em disco movida para {path}")
+    except OSError as e:
+        print(f"⚠ Não foi possível mover a fila antiga ({legacy}): {e}")
+
+
+def create_queue_store() -> Optional[QueueStore]:
+    """Store configurado (None quando a persistência está desligada ou o banco não abre)"""
+    if not settings.QUEUE_PERSISTENCE:
+        return None
+    path = Path(settings.queue_db_path)
+    if not settings.QUEUE_DB_PATH:
+        _move_legacy_db(path)
+    try:
+        return QueueStore(path)
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠ Fila em disco indisponível, usando só memória: {e}")
+        return None
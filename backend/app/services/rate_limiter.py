@@ -0,0 +1,249 @@
+"""
+Rate limiting adaptativo por plataforma e por host de origem.
+
+Cada chave ('platform:TikTok', 'host:v16m.tiktokcdn.com') tem um token bucket
+assíncrono: quem espera fica numa fila (asyncio), sem ocupar uma thread.
+
+- 429 / Retry-After: a taxa cai pela metade e o bucket fica bloqueado
+  pelo tempo indicado (ou por um backoff exponencial)
+- Depois de uma sequência de sucessos a taxa volta a subir aos poucos
+- Com `max_wait`, quem precisaria esperar mais que isso recebe na hora um
+  RateLimitWaitExceeded com o Retry-After previsto (em vez de ficar preso na fila)
+"""
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Any, Tuple
+
+from app.config import settings
+
+
+class RateLimitedError(Exception):
+    """Origem respondeu 429 / Too Many Requests"""
+
+    error_class = 'rate_limited'
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimitWaitExceeded(RateLimitedError):
+    """A vaga no rate limiter demoraria mais que o limite (a origem nem foi acessada)"""
+
+    upstream = False
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Interpreta o cabeçalho Retry-After (segundos ou data HTTP)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Verifica se uma exceção (yt-dlp, requests, etc) indica 429"""
+    if isinstance(error, RateLimitedError):
+        return True
+    message = str(error).lower()
+    return '429' in message or 'too many requests' in message or 'muitas requisições' in message
+
+
+class AdaptiveTokenBucket:
+    def __init__(self, key: str, rate: float, burst: float, min_rate: float, max_rate: float,
+                 ramp_after: int = 10, base_backoff: float = 5.0, max_backoff: float = 300.0):
+        self.key = key
+        self.rate = rate  # tokens por segundo
+        self.initial_rate = rate
+        self.capacity = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.ramp_after = ramp_after
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.success_streak = 0
+        self.throttle_streak = 0
+        self.waiting = 0
+
+        # Contadores
+        self.acquired = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def _reject(self, retry_after: float) -> RateLimitWaitExceeded:
+        self.rejected += 1
+        return RateLimitWaitExceeded(
+            f"Muitas requisições à plataforma. Tente novamente em {max(1, round(retry_after))}s.",
+            retry_after=retry_after
+        )
+
+    async def acquire(self, max_wait: Optional[float] = None):
+        """
+        Aguarda um token (em ordem de chegada). Com `max_wait`, levanta
+        RateLimitWaitExceeded se a espera (fila + bloqueio) passar disso.
+        """
+        self.waiting += 1
+        started = time.monotonic()
+        deadline = None if max_wait is None else started + max_wait
+        try:
+            try:
+                await asyncio.wait_for(self._lock.acquire(), max_wait)
+            except asyncio.TimeoutError:
+                # Fila parada atrás de um bloqueio: previsão = bloqueio + quem está na frente
+                now = time.monotonic()
+                raise self._reject(max(0.0, self.blocked_until - now) + self.waiting / self.rate) from None
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+
+                    wait = self.blocked_until - now
+                    if wait <= 0:
+                        if self.tokens >= 1:
+                            self.tokens -= 1
+                            self.acquired += 1
+                            return
+                        wait = (1 - self.tokens) / self.rate
+
+                    if deadline is not None and now + wait > deadline:
+                        raise self._reject(wait)
+                    await asyncio.sleep(wait)
+            finally:
+                self._lock.release()
+        finally:
+            self.waiting -= 1
+            self.total_wait += time.monotonic() - started
+
+    def on_success(self):
+        """Sucesso: depois de `ramp_after` seguidos, aumenta a taxa em 25%"""
+        self.throttle_streak = 0
+        self.success_streak += 1
+        if self.success_streak >= self.ramp_after and self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate * 1.25)
+            self.success_streak = 0
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """429: corta a taxa pela metade e bloqueia pelo Retry-After (ou backoff exponencial)"""
+        self.throttled += 1
+        self.success_streak = 0
+        self.throttle_streak += 1
+        self.rate = max(self.min_rate, self.rate * 0.5)
+        self.tokens = 0
+
+        if retry_after is None:
+            retry_after = min(self.max_backoff, self.base_backoff * (2 ** (self.throttle_streak - 1)))
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def state(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        self._refill(now)
+        return {
+            'rate_per_second': round(self.rate, 4),
+            'initial_rate': self.initial_rate,
+            'tokens': round(self.tokens, 2),
+            'capacity': self.capacity,
+            'blocked_for_seconds': round(max(0.0, self.blocked_until - now), 1),
+            'waiting': self.waiting,
+            'success_streak': self.success_streak,
+            'acquired': self.acquired,
+            'throttled': self.throttled,
+            'rejected': self.rejected,
+            'total_wait_seconds': round(self.total_wait, 2),
+        }
+
+
+class RateLimiter:
+    """Registro de buckets por plataforma e por host"""
+
+    # (requisições por segundo, rajada) por plataforma
+    PLATFORM_LIMITS: Dict[str, Tuple[float, float]] = {
+        'YouTube': (1 / 3, 1),  # Antigo intervalo fixo de 3s
+        'Instagram': (0.5, 3),
+        'TikTok': (1.0, 5),
+        'Twitter': (1.0, 5),
+        'Facebook': (1.0, 5),
+        'Reddit': (1.0, 5),
+        'Pinterest': (1.0, 5),
+    }
+    DEFAULT_PLATFORM_LIMIT = (2.0, 5)
+
+    def __init__(self, host_rate: float, host_burst: float, ramp_after: int, max_backoff: float):
+        self.host_limit = (host_rate, host_burst)
+        self.ramp_after = ramp_after
+        self.max_backoff = max_backoff
+        self._buckets: Dict[str, AdaptiveTokenBucket] = {}
+
+    def bucket(self, key: str) -> AdaptiveTokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            kind, _, name = key.partition(':')
+            if kind == 'platform':
+                rate, burst = self.PLATFORM_LIMITS.get(name, self.DEFAULT_PLATFORM_LIMIT)
+            else:
+                rate, burst = self.host_limit
+            bucket = AdaptiveTokenBucket(
+                key, rate=rate, burst=burst, min_rate=rate / 16, max_rate=rate * 4,
+                ramp_after=self.ramp_after, max_backoff=self.max_backoff
+            )
+            self._buckets[key] = bucket
+        return bucket
+
+    def _keys(self, platform: Optional[str], host: Optional[str]):
+        keys = []
+        if platform and platform != 'Unknown':
+            keys.append(f'platform:{platform}')
+        if host:
+            keys.append(f'host:{host.lower()}')
+        return keys
+
+    async def acquire(self, platform: Optional[str] = None, host: Optional[str] = None,
+                      max_wait: Optional[float] = None):
+        """Aguarda vaga na plataforma e no host (no máximo `max_wait` segundos no total)"""
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        for key in self._keys(platform, host):
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            await self.bucket(key).acquire(remaining)
+
+    def report(self, platform: Optional[str] = None, host: Optional[str] = None,
+               throttled: bool = False, retry_after: Optional[float] = None):
+        """Informa o resultado de uma requisição à origem"""
+        for key in self._keys(platform, host):
+            if throttled:
+                self.bucket(key).on_throttle(retry_after)
+            else:
+                self.bucket(key).on_success()
+
+    def report_error(self, error: BaseException, platform: Optional[str] = None, host: Optional[str] = None):
+        """Informa uma falha: só conta como throttle se for 429 (outros erros não mexem na taxa)"""
+        if is_rate_limit_error(error):
+            self.report(platform, host, throttled=True, retry_after=getattr(error, 'retry_after', None))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {key: bucket.state() for key, bucket in sorted(self._buckets.items())}
+
+
+# Instância global do rate limiter
+rate_limiter = RateLimiter(
+    host_rate=settings.RATE_LIMIT_HOST_PER_SECOND,
+    host_burst=settings.RATE_LIMIT_HOST_BURST,
+    ramp_after=settings.RATE_LIMIT_RAMP_AFTER,
+    max_backoff=settings.RATE_LIMIT_MAX_BACKOFF_SECONDS
+)
@@ -0,0 +1,315 @@
+"""
+Estado compartilhado entre processos/instâncias da API.
+
+Com vários workers (uvicorn --workers N) ou várias instâncias, cada processo
+tem sua própria memória: um item da fila em lote criado num worker não
+aparece nos outros, e o progresso de um client_id se perde se o WebSocket
+estiver conectado em outro processo. O backend compartilhado resolve:
+
+- Estado da fila: itens gravados num hash + eventos de alteração (cada worker mantém um espelho)
+- Reserva de itens: só um worker baixa cada item (claim atômico); cada worker
+  renova um heartbeat, e a reserva de um worker sem heartbeat é assumida
+- Pub/sub: progresso é publicado num canal e entregue pelo worker que tem o WebSocket
+- Cache de metadados: segundo nível compartilhado para o cache de /info
+
+Backends:
+- 'memory' (padrão): tudo no próprio processo, sem dependências
+- 'redis': Redis (ou qualquer servidor compatível com RESP, ex: resp_server.py para testes locais)
+"""
+import asyncio
+import json
+import os
+import socket
+import uuid
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from app.config import settings
+
+
+PROGRESS_CHANNEL = 'progress'
+QUEUE_CHANNEL = 'queue'
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class SharedStateBackend:
+    """Interface comum (a implementação em memória é o comportamento de processo único)"""
+
+    name = 'base'
+    distributed = False
+
+    def __init__(self):
+        # Identifica este processo nos eventos e nas reservas
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+
+    def on(self, channel: str, handler: Handler):
+        """Registra um handler para as mensagens de um canal (antes de start())"""
+        if handler not in self._handlers[channel]:
+            self._handlers[channel].append(handler)
+
+    async def _dispatch(self, channel: str, message: dict):
+        for handler in self._handlers.get(channel, []):
+            try:
+                await handler(message)
+            except Exception as e:
+                print(f"⚠ Erro ao processar mensagem do canal {channel}: {e}")
+
+    async def start(self):
+        """Conecta e começa a escutar os canais registrados"""
+
+    async def close(self):
+        """Encerra conexões"""
+
+    # Pub/sub
+
+    async def publish(self, channel: str, message: dict):
+        raise NotImplementedError
+
+    async def publish_progress(self, client_id: str, data: dict):
+        """Publica progresso de um client_id (entregue pelo worker que tem o WebSocket)"""
+        await self.publish(PROGRESS_CHANNEL, {'client_id': client_id, 'data': data})
+
+    # Estado da fila
+
+    async def save_items(self, items: Dict[str, dict]):
+        raise NotImplementedError
+
+    async def delete_items(self, item_ids: Iterable[str]):
+        raise NotImplementedError
+
+    async def load_items(self) -> Dict[str, dict]:
+        raise NotImplementedError
+
+    async def claim(self, key: str, ttl_seconds: int) -> bool:
+        """Reserva `key` para este worker (True se conseguiu ou se já era dele)"""
+        raise NotImplementedError
+
+    async def claim_stale(self, key: str) -> bool:
+        """Indica se `key` está livre ou reservada por um worker que parou de responder"""
+        raise NotImplementedError
+
+    # Cache de metadados
+
+    async def cache_get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def cache_set(self, key: str, value: Any, ttl_seconds: int):
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': self.name, 'worker_id': self.worker_id, 'distributed': self.distributed}
+
+
+class MemoryBackend(SharedStateBackend):
+    """Processo único: publicações são entregues direto aos handlers locais"""
+
+    name = 'memory'
+
+    async def publish(self, channel: str, message: dict):
+        await self._dispatch(channel, message)
+
+    async def save_items(self, items: Dict[str, dict]):
+        # O próprio queue_manager já é a fonte da verdade
+        pass
+
+    async def delete_items(self, item_ids: Iterable[str]):
+        pass
+
+    async def load_items(self) -> Dict[str, dict]:
+        return {}
+
+    async def claim(self, key: str, ttl_seconds: int) -> bool:
+        return True
+
+    async def claim_stale(self, key: str) -> bool:
+        # Nenhuma reserva sobrevive ao processo
+        return True
+
+    async def cache_get(self, key: str) -> Optional[Any]:
+        # O TTLCache local já cobre o processo único
+        return None
+
+    async def cache_set(self, key: str, value: Any, ttl_seconds: int):
+        pass
+
+
+class RedisBackend(SharedStateBackend):
+    """
+    Redis (redis-py assíncrono). Falhas de rede são registradas e não derrubam a
+    requisição; as escritas da fila (save_items, delete_items, publish) levantam
+    o erro para o queue_manager guardar o lote e tentar de novo.
+    """
+
+    name = 'redis'
+    distributed = True
+
+    # Heartbeat do worker: sem renovação por esse tempo, as reservas dele podem ser assumidas
+    WORKER_TTL_SECONDS = 30
+
+    def __init__(self, url: str, prefix: str = 'mediavid'):
+        super().__init__()
+        self.url = url
+        self.prefix = prefix
+        self._client = None
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self.errors = 0
+
+    def _key(self, *parts: str) -> str:
+        return ':'.join((self.prefix,) + parts)
+
+    @property
+    def client(self):
+        if self._client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                raise RuntimeError("SHARED_STATE_BACKEND=redis requer o pacote 'redis' (pip install redis)")
+            self._client = redis.Redis.from_url(self.url, decode_responses=True, protocol=2)
+        return self._client
+
+    async def start(self):
+        await self.client.ping()
+        if self._handlers:
+            self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            await self._pubsub.subscribe(*(self._key('channel', name) for name in self._handlers))
+            self._listener = asyncio.create_task(self._listen())
+        await self._beat()
+        self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+        print(f"✓ Estado compartilhado: Redis em {self.url} (worker {self.worker_id})")
+
+    async def _listen(self):
+        prefix = self._key('channel', '')
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+                if message is None:
+                    continue
+                channel = message['channel'][len(prefix):]
+                await self._dispatch(channel, json.loads(message['data']))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"⚠ Erro no listener do Redis: {e}")
+                await asyncio.sleep(1)
+
+    async def _beat(self):
+        await self._safe(
+            'heartbeat',
+            self.client.set(self._key('worker', self.worker_id), '1', ex=self.WORKER_TTL_SECONDS)
+        )
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.WORKER_TTL_SECONDS / 3)
+            await self._beat()
+
+    async def close(self):
+        if self._heartbeat:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+            # Saída limpa: as reservas deste worker podem ser assumidas na hora
+            await self._safe('heartbeat', self.client.delete(self._key('worker', self.worker_id)))
+        if self._listener:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+        if self._pubsub:
+            await self._pubsub.aclose()
+        if self._client:
+            await self._client.aclose()
+
+    async def _safe(self, operation: str, coro, default=None, reraise: bool = False):
+        try:
+            return await coro
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠ Redis ({operation}): {e}")
+            if reraise:
+                raise
+            return default
+
+    async def publish(self, channel: str, message: dict):
+        await self._safe('publish', self.client.publish(self._key('channel', channel), json.dumps(message)), reraise=True)
+
+    async def save_items(self, items: Dict[str, dict]):
+        if items:
+            mapping = {item_id: json.dumps(data) for item_id, data in items.items()}
+            await self._safe('save_items', self.client.hset(self._key('queue'), mapping=mapping), reraise=True)
+
+    async def delete_items(self, item_ids: Iterable[str]):
+        item_ids = list(item_ids)
+        if item_ids:
+            await self._safe('delete_items', self.client.hdel(self._key('queue'), *item_ids), reraise=True)
+
+    async def load_items(self) -> Dict[str, dict]:
+        raw = await self._safe('load_items', self.client.hgetall(self._key('queue')), default={})
+        return {item_id: json.loads(data) for item_id, data in raw.items()}
+
+    async def _alive(self, worker_id: str) -> bool:
+        # Redis fora do ar: na dúvida, o dono continua vivo
+        return bool(await self._safe('heartbeat', self.client.exists(self._key('worker', worker_id)), default=1))
+
+    async def claim(self, key: str, ttl_seconds: int) -> bool:
+        claim_key = self._key('claim', key)
+        if await self._safe('claim', self.client.set(claim_key, self.worker_id, nx=True, ex=ttl_seconds), default=False):
+            return True
+
+        owner = await self._safe('claim', self.client.get(claim_key), default=False)
+        if owner is False:
+            return False
+        if owner == self.worker_id:
+            return True
+        if owner is None:
+            # Expirou entre as duas chamadas
+            return bool(await self._safe(
+                'claim', self.client.set(claim_key, self.worker_id, nx=True, ex=ttl_seconds), default=False
+            ))
+        if await self._alive(owner):
+            return False
+
+        # Dono sem heartbeat: só um worker assume (trava própria, o SET do claim não compara o dono)
+        takeover = await self._safe(
+            'claim',
+            self.client.set(self._key('takeover', key), self.worker_id, nx=True, ex=self.WORKER_TTL_SECONDS),
+            default=False
+        )
+        if not takeover or await self._safe('claim', self.client.get(claim_key), default=False) != owner:
+            return False
+        await self._safe('claim', self.client.set(claim_key, self.worker_id, ex=ttl_seconds))
+        print(f"♻ Reserva {key} assumida (worker {owner} parou de responder)")
+        return True
+
+    async def claim_stale(self, key: str) -> bool:
+        owner = await self._safe('claim_stale', self.client.get(self._key('claim', key)), default=False)
+        if owner is False:
+            return False
+        return owner is None or not await self._alive(owner)
+
+    async def cache_get(self, key: str) -> Optional[Any]:
+        raw = await self._safe('cache_get', self.client.get(self._key('cache', key)))
+        return json.loads(raw) if raw else None
+
+    async def cache_set(self, key: str, value: Any, ttl_seconds: int):
+        await self._safe(
+            'cache_set',
+            self.client.set(self._key('cache', key), json.dumps(value), ex=max(1, int(ttl_seconds)))
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), 'url': self.url, 'errors': self.errors}
+
+
+def create_backend(name: str) -> SharedStateBackend:
+    if name == 'redis':
+        return RedisBackend(settings.REDIS_URL, prefix=settings.SHARED_STATE_PREFIX)
+    if name != 'memory':
+        print(f"⚠ SHARED_STATE_BACKEND desconhecido '{name}', usando memória")
+    return MemoryBackend()
+
+
+# Instância global do estado compartilhado
+shared_state = create_backend(settings.SHARED_STATE_BACKEND)
@@ -0,0 +1,277 @@
+"""
+Saúde das fontes de extração/download (yt-dlp, TikWM, SnapTik, CDN do
+TikTok...) por plataforma, com circuit breaker.
+
+Quando uma fonte quebra (extractor desatualizado, API alternativa fora do ar),
+cada requisição pagava o timeout inteiro dela antes de passar para a próxima.
+
+- Cada chave (fonte, plataforma) guarda uma janela de resultados recentes:
+  taxa de sucesso e latência
+- N falhas seguidas abrem o circuito: a fonte é pulada na hora
+- Depois do resfriamento o circuito fica meio-aberto e uma única requisição
+  testa a fonte: sucesso fecha, falha reabre com o dobro do resfriamento
+- A cadeia de fontes é reordenada pela pontuação recente (sucesso x latência)
+- Erros do conteúdo (privado, removido, URL inválida) não contam como falha da fonte
+- Chamadas que nem chegaram à fonte (vaga negada pelo rate limiter) não contam nada
+"""
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.metrics import SOURCE_BREAKER_TRANSITIONS, SOURCE_CALLS
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+LATENCY_SCALE = 5.0  # Latência média com esse valor (s) reduz a pontuação pela metade
+
+
+class CircuitOpenError(Exception):
+    """Todas as fontes da cadeia estão com o circuito aberto"""
+
+    error_class = 'circuit_open'
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class _Sample:
+    at: float
+    ok: bool
+    seconds: float
+
+
+@dataclass
+class SourceState:
+    source: str
+    platform: str
+    samples: Deque[_Sample] = field(default_factory=deque)
+    state: str = CLOSED
+    consecutive_failures: int = 0
+    opened_at: float = 0.0
+    cooldown: float = 0.0
+    probing: bool = False  # Meio-aberto: teste em andamento
+    last_error: Optional[str] = None
+
+    def retry_in(self, now: float) -> float:
+        return max(0.0, self.opened_at + self.cooldown - now) if self.state == OPEN else 0.0
+
+    def success_rate(self) -> Optional[float]:
+        if not self.samples:
+            return None
+        return sum(1 for sample in self.samples if sample.ok) / len(self.samples)
+
+    def mean_latency(self) -> Optional[float]:
+        times = [sample.seconds for sample in self.samples if sample.ok]
+        return sum(times) / len(times) if times else None
+
+    def score(self) -> float:
+        """Taxa de sucesso suavizada (sem dados = 0,5) penalizada pela latência média"""
+        successes = sum(1 for sample in self.samples if sample.ok)
+        rate = (successes + 1) / (len(self.samples) + 2)
+        latency = self.mean_latency() or 0.0
+        return rate / (1 + latency / LATENCY_SCALE)
+
+
+class SourceHealthRegistry:
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0, max_cooldown: float = 600.0,
+                 window: int = 50, window_seconds: float = 600.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_cooldown = cooldown
+        self.max_cooldown = max(cooldown, max_cooldown)
+        self.window = window
+        self.window_seconds = window_seconds
+
+        self._states: Dict[Tuple[str, str], SourceState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, source: str, platform: str) -> SourceState:
+        key = (source, platform)
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = SourceState(source, platform)
+        return state
+
+    def _trim(self, state: SourceState, now: float):
+        while state.samples and (len(state.samples) > self.window or now - state.samples[0].at > self.window_seconds):
+            state.samples.popleft()
+
+    def _transition(self, state: SourceState, new_state: str):
+        if state.state != new_state:
+            state.state = new_state
+            SOURCE_BREAKER_TRANSITIONS.inc(source=state.source, platform=state.platform, state=new_state)
+            print(f"🔌 Circuito {state.source}@{state.platform}: {new_state}")
+
+    def allow(self, source: str, platform: str) -> bool:
+        """
+        A fonte pode ser usada agora? Circuito aberto com o resfriamento vencido
+        passa a meio-aberto e libera só esta chamada como teste.
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(source, platform)
+            if state.state == CLOSED:
+                return True
+            if state.state == OPEN and now >= state.opened_at + state.cooldown:
+                self._transition(state, HALF_OPEN)
+            if state.state == HALF_OPEN and not state.probing:
+                state.probing = True
+                return True
+            SOURCE_CALLS.inc(source=source, platform=platform, result='skipped')
+            return False
+
+    def record(self, source: str, platform: str, ok: bool, seconds: float, error: Optional[BaseException] = None):
+        """Resultado de uma chamada liberada por allow()"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(source, platform)
+            state.samples.append(_Sample(now, ok, seconds))
+            self._trim(state, now)
+            probing, state.probing = state.probing, False
+            if ok:
+                state.consecutive_failures = 0
+                state.cooldown = 0.0
+                self._transition(state, CLOSED)
+            else:
+                state.consecutive_failures += 1
+                state.last_error = str(error)[:200] if error else None
+                if probing:
+                    # Teste do meio-aberto falhou: reabre com o dobro do resfriamento
+                    state.cooldown = min(self.max_cooldown, state.cooldown * 2 or self.base_cooldown)
+                    state.opened_at = now
+                    self._transition(state, OPEN)
+                elif state.state == CLOSED and state.consecutive_failures >= self.failure_threshold:
+                    state.cooldown = self.base_cooldown
+                    state.opened_at = now
+                    self._transition(state, OPEN)
+        SOURCE_CALLS.inc(source=source, platform=platform, result='ok' if ok else 'error')
+
+    def release(self, source: str, platform: str):
+        """Chamada liberada que terminou sem resultado (cancelada): libera o teste do meio-aberto"""
+        with self._lock:
+            self._state(source, platform).probing = False
+
+    @staticmethod
+    def is_failure(error: BaseException) -> bool:
+        """Erros do conteúdo (privado, removido... ExtractionError.permanent) não dizem nada sobre a saúde da fonte"""
+        return not getattr(error, 'permanent', False)
+
+    @staticmethod
+    def reached_source(error: BaseException) -> bool:
+        """Falso para erros levantados antes de acessar a fonte (ex.: RateLimitWaitExceeded)"""
+        return getattr(error, 'upstream', True)
+
+    def order(self, platform: str, sources: List[str]) -> List[str]:
+        """
+        Fontes pela pontuação recente (empate mantém a ordem padrão). Fonte sem
+        resultados na janela (falhas antigas expiradas, ou sempre cancelada por
+        perder a corrida) volta à sua posição padrão para ser medida de novo.
+        """
+        with self._lock:
+            now = time.monotonic()
+            scores = {}
+            for source in sources:
+                state = self._state(source, platform)
+                self._trim(state, now)
+                scores[source] = state.score() if state.samples else None
+        best = max((score for score in scores.values() if score is not None), default=1.0)
+        scores = {source: best if score is None else score for source, score in scores.items()}
+        return sorted(sources, key=lambda source: (-round(scores[source], 3), sources.index(source)))
+
+    def unavailable(self, platform: str, sources: List[str]) -> CircuitOpenError:
+        """Erro para quando todas as fontes foram puladas"""
+        now = time.monotonic()
+        with self._lock:
+            retry_after = min((self._state(source, platform).retry_in(now) for source in sources), default=0.0)
+        return CircuitOpenError(
+            f"{platform} está temporariamente indisponível. Tente novamente em instantes.", retry_after
+        )
+
+    def _outcome(self, source: str, platform: str, started: float, error: Optional[BaseException]):
+        if error is not None and not self.reached_source(error):
+            self.release(source, platform)
+        elif error is not None and not self.is_failure(error):
+            # A fonte respondeu: o problema é o conteúdo
+            self.record(source, platform, True, time.perf_counter() - started)
+        else:
+            self.record(source, platform, error is None, time.perf_counter() - started, error)
+
+    async def call(self, source: str, platform: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Executa uma fonte única protegida pelo circuito (falha na hora se estiver aberto)"""
+        if not self.allow(source, platform):
+            raise self.unavailable(platform, [source])
+        started = time.perf_counter()
+        try:
+            result = await factory()
+        except Exception as e:
+            self._outcome(source, platform, started, e)
+            raise
+        except BaseException:
+            self.release(source, platform)
+            raise
+        self._outcome(source, platform, started, None)
+        return result
+
+    def run_chain(self, platform: str, chain: List[Tuple[str, Callable[[], Any]]]) -> Any:
+        """
+        Executa as fontes (nome, função) na ordem da pontuação recente, pulando
+        as de circuito aberto. Retorna o primeiro resultado diferente de None;
+        se todas falharem, levanta o último erro.
+        """
+        funcs = dict(chain)
+        last_error: Optional[BaseException] = None
+        for source in self.order(platform, [name for name, _ in chain]):
+            if not self.allow(source, platform):
+                continue
+            started = time.perf_counter()
+            try:
+                result = funcs[source]()
+            except Exception as e:
+                self._outcome(source, platform, started, e)
+                if not self.is_failure(e):
+                    raise
+                last_error = e
+                continue
+            if result is None:
+                self.record(source, platform, False, time.perf_counter() - started)
+                continue
+            self._outcome(source, platform, started, None)
+            return result
+        raise last_error or self.unavailable(platform, [name for name, _ in chain])
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            result = {}
+            for (source, platform), state in sorted(self._states.items(), key=lambda item: (item[0][1], item[0][0])):
+                self._trim(state, now)
+                rate = state.success_rate()
+                latency = state.mean_latency()
+                result.setdefault(platform, {})[source] = {
+                    'state': state.state,
+                    'success_rate': round(rate, 3) if rate is not None else None,
+                    'mean_latency': round(latency, 3) if latency is not None else None,
+                    'samples': len(state.samples),
+                    'consecutive_failures': state.consecutive_failures,
+                    'retry_in': round(state.retry_in(now), 1),
+                    'score': round(state.score(), 3),
+                    'last_error': state.last_error,
+                }
+            return result
+
+
+# Instância global do registro de saúde das fontes
+source_health = SourceHealthRegistry(
+    failure_threshold=settings.SOURCE_BREAKER_FAILURES,
+    cooldown=settings.SOURCE_BREAKER_COOLDOWN_SECONDS,
+    max_cooldown=settings.SOURCE_BREAKER_MAX_COOLDOWN_SECONDS,
+    window=settings.SOURCE_HEALTH_WINDOW,
+    window_seconds=settings.SOURCE_HEALTH_WINDOW_SECONDS
+)
@@ -0,0 +1,322 @@
+"""
+Cache de thumbnails para o proxy /api/video/proxy-thumbnail.
+
+- Cliente HTTP assíncrono compartilhado (keep-alive, sem bloquear o event loop)
+- Cache em memória (LRU por bytes) + cache em disco (LRU por bytes)
+- Revalidação com a origem via ETag / Last-Modified quando a entrada expira
+- Na primeira busca os bytes são repassados ao cliente conforme chegam
+"""
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, Any, Tuple
+
+import aiofiles
+import httpx
+
+from app.config import settings
+from app.services.http_client import get_http_client
+from app.services.rate_limiter import rate_limiter, parse_retry_after
+
+
+THUMBNAIL_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+    'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Sec-Fetch-Dest': 'image',
+    'Sec-Fetch-Mode': 'no-cors',
+    'Sec-Fetch-Site': 'cross-site',
+}
+
+
+@dataclass
+class ThumbnailMeta:
+    key: str
+    content_type: str
+    size: int
+    etag: str  # ETag servido ao navegador (hash do conteúdo)
+    upstream_etag: Optional[str] = None
+    upstream_last_modified: Optional[str] = None
+    fetched_at: float = 0.0
+    last_access: float = 0.0
+
+
+@dataclass
+class ThumbnailResult:
+    """Resultado para o proxy: corpo completo (cache) ou iterador (repasse da origem)"""
+    content_type: str
+    etag: Optional[str]
+    body: Optional[bytes] = None
+    stream: Optional[AsyncIterator[bytes]] = None
+    cache_status: str = 'MISS'
+
+
+class ThumbnailCache:
+    def __init__(self, root: Path, memory_max_bytes: int, disk_max_bytes: int,
+                 ttl_seconds: float, max_image_bytes: int):
+        self.root = Path(root)
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_image_bytes = max_image_bytes
+
+        self._memory: "OrderedDict[str, Tuple[ThumbnailMeta, bytes]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: Dict[str, ThumbnailMeta] = {}
+
+        # Contadores
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+        # Diretório e índice do disco são lidos em open() (startup), não no import
+        self._opened = False
+
+    def open(self):
+        """Cria o diretório e carrega o índice do disco (idempotente)"""
+        if self._opened:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._load_disk_index()
+        self._opened = True
+
+    @staticmethod
+    def make_key(url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+
+    def _data_path(self, key: str) -> Path:
+        return self.root / f"{key}.bin"
+
+    def _meta_path(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def _load_disk_index(self):
+        """Reconstrói o índice do disco a partir dos arquivos .json"""
+        for meta_path in self.root.glob("*.json"):
+            try:
+                meta = ThumbnailMeta(**json.loads(meta_path.read_text(encoding='utf-8')))
+                if self._data_path(meta.key).exists():
+                    self._disk[meta.key] = meta
+                    continue
+            except Exception:
+                pass
+            meta_path.unlink(missing_ok=True)
+
+    # Memória
+
+    def _memory_put(self, meta: ThumbnailMeta, body: bytes):
+        old = self._memory.pop(meta.key, None)
+        if old:
+            self._memory_bytes -= len(old[1])
+        self._memory[meta.key] = (meta, body)
+        self._memory_bytes += len(body)
+
+        while self._memory_bytes > self.memory_max_bytes and self._memory:
+            _, (_, evicted) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    # Disco
+
+    async def _disk_put(self, meta: ThumbnailMeta, body: bytes):
+        try:
+            async with aiofiles.open(self._data_path(meta.key), 'wb') as f:
+                await f.write(body)
+            async with aiofiles.open(self._meta_path(meta.key), 'w', encoding='utf-8') as f:
+                await f.write(json.dumps(asdict(meta)))
+        except OSError as e:
+            print(f"⚠ Erro ao gravar thumbnail em disco: {e}")
+            return
+
+        self._disk[meta.key] = meta
+        total = sum(m.size for m in self._disk.values())
+        if total <= self.disk_max_bytes:
+            return
+
+        for old in sorted(self._disk.values(), key=lambda m: m.last_access):
+            if total <= self.disk_max_bytes:
+                break
+            total -= old.size
+            self._disk.pop(old.key, None)
+            self._data_path(old.key).unlink(missing_ok=True)
+            self._meta_path(old.key).unlink(missing_ok=True)
+
+    async def _disk_get(self, key: str) -> Optional[Tuple[ThumbnailMeta, bytes]]:
+        meta = self._disk.get(key)
+        if not meta:
+            return None
+        try:
+            async with aiofiles.open(self._data_path(key), 'rb') as f:
+                body = await f.read()
+        except OSError:
+            self._disk.pop(key, None)
+            return None
+        return meta, body
+
+    async def _store(self, meta: ThumbnailMeta, body: bytes):
+        self._memory_put(meta, body)
+        await self._disk_put(meta, body)
+
+    # Origem
+
+    def _build_meta(self, key: str, response: httpx.Response, body: bytes) -> ThumbnailMeta:
+        now = time.time()
+        return ThumbnailMeta(
+            key=key,
+            content_type=response.headers.get('content-type', 'image/jpeg'),
+            size=len(body),
+            etag=f'"{hashlib.md5(body).hexdigest()}"',
+            upstream_etag=response.headers.get('etag'),
+            upstream_last_modified=response.headers.get('last-modified'),
+            fetched_at=now,
+            last_access=now,
+        )
+
+    @staticmethod
+    def _report(host: str, response: httpx.Response):
+        """Informa ao rate_limiter se a origem pediu para diminuir o ritmo"""
+        rate_limiter.report(
+            host=host,
+            throttled=response.status_code == 429,
+            retry_after=parse_retry_after(response.headers.get('retry-after'))
+        )
+
+    async def _revalidate(self, url: str, meta: ThumbnailMeta, body: bytes) -> Optional[ThumbnailResult]:
+        """Pergunta à origem se a entrada expirada ainda vale (304 evita baixar de novo)"""
+        headers = dict(THUMBNAIL_HEADERS)
+        if meta.upstream_etag:
+            headers['If-None-Match'] = meta.upstream_etag
+        if meta.upstream_last_modified:
+            headers['If-Modified-Since'] = meta.upstream_last_modified
+        if len(headers) == len(THUMBNAIL_HEADERS):
+            return None
+
+        host = httpx.URL(url).host
+        await rate_limiter.acquire(host=host)
+        try:
+            response = await get_http_client().get(url, headers=headers, timeout=10)
+        except httpx.HTTPError:
+            # Origem indisponível: serve a cópia expirada
+            return ThumbnailResult(meta.content_type, meta.etag, body=body, cache_status='STALE')
+        self._report(host, response)
+
+        if response.status_code == 429:
+            # Origem pediu para esperar: serve a cópia expirada
+            return ThumbnailResult(meta.content_type, meta.etag, body=body, cache_status='STALE')
+
+        if response.status_code == 304:
+            self.revalidated += 1
+            meta.fetched_at = time.time()
+            await self._store(meta, body)
+            return ThumbnailResult(meta.content_type, meta.etag, body=body, cache_status='REVALIDATED')
+
+        if response.status_code == 200:
+            new_body = response.content
+            new_meta = self._build_meta(meta.key, response, new_body)
+            if new_meta.size <= self.max_image_bytes:
+                await self._store(new_meta, new_body)
+            return ThumbnailResult(new_meta.content_type, new_meta.etag, body=new_body, cache_status='MISS')
+
+        return None
+
+    async def _stream_from_origin(self, url: str, key: str) -> ThumbnailResult:
+        """Busca na origem repassando os bytes conforme chegam e guarda no cache ao final"""
+        client = get_http_client()
+        request = client.build_request('GET', url, headers=THUMBNAIL_HEADERS, timeout=10)
+        await rate_limiter.acquire(host=request.url.host)
+        response = await client.send(request, stream=True)
+        self._report(request.url.host, response)
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError:
+            await response.aclose()
+            raise
+
+        content_length = response.headers.get('content-length')
+        cacheable = not (content_length and content_length.isdigit() and int(content_length) > self.max_image_bytes)
+
+        async def chunks():
+            parts = []
+            size = 0
+            completed = False
+            try:
+                async for chunk in response.aiter_bytes():
+                    if cacheable and size <= self.max_image_bytes:
+                        parts.append(chunk)
+                    size += len(chunk)
+                    yield chunk
+                completed = True
+            finally:
+                await response.aclose()
+
+            if completed and cacheable and size <= self.max_image_bytes:
+                body = b''.join(parts)
+                await self._store(self._build_meta(key, response, body), body)
+
+        return ThumbnailResult(
+            content_type=response.headers.get('content-type', 'image/jpeg'),
+            etag=None,
+            stream=chunks(),
+        )
+
+    async def get(self, url: str) -> ThumbnailResult:
+        """Retorna a thumbnail (cache em memória → disco → revalidação → origem)"""
+        key = self.make_key(url)
+        now = time.time()
+        if not self._opened:
+            await asyncio.to_thread(self.open)
+
+        cached = self._memory.get(key)
+        if cached:
+            self._memory.move_to_end(key)
+            source = 'HIT-MEMORY'
+        else:
+            cached = await self._disk_get(key)
+            if cached:
+                self._memory_put(*cached)
+            source = 'HIT-DISK'
+
+        if cached:
+            meta, body = cached
+            meta.last_access = now
+            if now - meta.fetched_at < self.ttl_seconds:
+                if source == 'HIT-MEMORY':
+                    self.memory_hits += 1
+                else:
+                    self.disk_hits += 1
+                return ThumbnailResult(meta.content_type, meta.etag, body=body, cache_status=source)
+
+            result = await self._revalidate(url, meta, body)
+            if result:
+                return result
+
+        self.misses += 1
+        return await self._stream_from_origin(url, key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'memory_entries': len(self._memory),
+            'memory_bytes': self._memory_bytes,
+            'memory_max_bytes': self.memory_max_bytes,
+            'disk_entries': len(self._disk),
+            'disk_bytes': sum(m.size for m in self._disk.values()),
+            'disk_max_bytes': self.disk_max_bytes,
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'revalidated': self.revalidated,
+            'misses': self.misses,
+        }
+
+
+# Instância global do cache de thumbnails
+thumbnail_cache = ThumbnailCache(
+    root=Path(settings.thumbnail_cache_path),
+    memory_max_bytes=settings.THUMBNAIL_MEMORY_CACHE_MB * 1024 * 1024,
+    disk_max_bytes=settings.THUMBNAIL_DISK_CACHE_MB * 1024 * 1024,
+    ttl_seconds=settings.THUMBNAIL_CACHE_TTL_SECONDS,
+    max_image_bytes=settings.THUMBNAIL_MAX_BYTES
+)
@@ -1,24 +1,67 @@
 """
 Fallback para download de TikTok usando APIs alternativas
 quando yt-dlp falha por restrição de login
+
+Os provedores (TikWM, SnapTik e, opcionalmente, o yt-dlp) correm em paralelo
+com atrasos escalonados (hedging): o TikWM começa na hora, o próximo só
+entra se o anterior não respondeu em TIKTOK_HEDGE_DELAY_SECONDS (ou já
+falhou). A primeira resposta válida vence e os demais são cancelados.
+
+A ordem dos provedores segue a saúde recente de cada um (source_health) e
+provedores com o circuito aberto são pulados sem custo.
 """
-import requests
+import asyncio
 import re
-import json
-from typing import Optional, Dict, Any
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, Dict, Any, Awaitable, Callable, List, NamedTuple
+
+from app.config import settings
+from app.services.metrics import TIKTOK_PROVIDERS, TIKTOK_PROVIDER_LATENCY
+from app.services.source_health import source_health
+
+
+# Cabeçalhos aceitos pela CDN do TikTok no download direto do arquivo
+DOWNLOAD_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+    'Referer': 'https://www.tiktok.com/'
+}
+
+# Cabeçalhos das APIs alternativas
+API_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+    'Accept': 'application/json, text/plain, */*',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Referer': 'https://www.tiktok.com/'
+}
+
+class Provider(NamedTuple):
+    name: str
+    delay: float  # Segundos até começar
+    factory: Callable[[], Awaitable[Any]]  # Coroutine que retorna a resposta ou None
+    timeout: Optional[float] = None  # None: TIKTOK_PROVIDER_TIMEOUT_SECONDS; 0: sem limite
+
+
+@dataclass
+class RaceResult:
+    source: Optional[str] = None  # Provedor vencedor (None: nenhum respondeu)
+    value: Any = None
+    errors: Dict[str, BaseException] = field(default_factory=dict)
+    skipped: List[str] = field(default_factory=list)  # Circuito aberto
 
 
 class TikTokFallback:
     """Serviço alternativo para baixar vídeos do TikTok"""
     
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Referer': 'https://www.tiktok.com/'
-        })
+    def __init__(self, hedge_delay: float = 1.5, provider_timeout: float = 10.0):
+        self.hedge_delay = hedge_delay
+        self.provider_timeout = provider_timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """Event loop da aplicação: threads do downloader rodam a corrida nele (capturado no startup)"""
+        self._loop = loop
     
     def extract_video_id(self, url: str) -> Optional[str]:
         """Extrai o ID do vídeo da URL"""
@@ -34,79 +77,101 @@ class TikTokFallback:
                 return match.group(1)
         return None
     
-    def get_video_info_api(self, video_id: str) -> Optional[Dict[str, Any]]:
-        """Tenta obter informações usando API alternativa (estilo ssstik.io)"""
+    def providers(self, url: str, client=None) -> List[Provider]:
+        """Provedores das APIs alternativas, o mais saudável primeiro, com o atraso de cada um"""
+        factories = {
+            'tikwm': lambda: self._tikwm(url, client),
+            'snaptik': lambda: self._snaptik(url, client),
+        }
+        ordered = source_health.order('TikTok', list(factories))
+        return [Provider(name, index * self.hedge_delay, factories[name]) for index, name in enumerate(ordered)]
+    
+    async def race(self, providers: List[Provider]) -> RaceResult:
+        """
+        Corre os provedores com hedging: cada um começa no seu atraso, ou antes
+        se todos os que já começaram falharam. Retorna a primeira resposta válida
+        e cancela os que ainda estão rodando. Provedores com o circuito aberto
+        ficam de fora (result.skipped).
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = RaceResult()
+        pending = []
+        for provider in sorted(providers, key=lambda provider: provider.delay):
+            if source_health.allow(provider.name, 'TikTok'):
+                pending.append(provider)
+            else:
+                result.skipped.append(provider.name)
+        if result.skipped and pending:
+            # Os pulados não contam: o primeiro liberado começa na hora
+            offset = pending[0].delay
+            pending = [provider._replace(delay=provider.delay - offset) for provider in pending]
+        running: Dict[asyncio.Task, str] = {}
         try:
-            # API 1: TikWM (funciona sem login)
-            api_url = f"https://www.tikwm.com/api/?url=https://www.tiktok.com/@user/video/{video_id}"
-            
-            response = self.session.get(api_url, timeout=15)
-            if response.status_code == 200:
-                data = response.json()
+            while pending or running:
+                elapsed = loop.time() - started
+                while pending and (pending[0].delay <= elapsed or not running):
+                    provider = pending.pop(0)
+                    running[asyncio.create_task(self._attempt(provider, result))] = provider.name
                 
-                if data.get('code') == 0 and data.get('data'):
-                    video_data = data['data']
-                    return {
-                        'url': f"https://www.tiktok.com/@{video_data.get('author', {}).get('unique_id', 'user')}/video/{video_id}",
-                        'title': video_data.get('title', 'TikTok Video'),
-                        'description': video_data.get('title'),
-                        'thumbnail': video_data.get('cover', ''),
-                        'duration': video_data.get('duration', 0),
-                        'uploader': video_data.get('author', {}).get('unique_id', 'Unknown'),
-                        'view_count': video_data.get('play_count', 0),
-                        'download_url': video_data.get('play', ''),  # URL de download direto
-                        'platform': 'TikTok'
-                    }
-        except Exception as e:
-            print(f"Erro API TikWM: {e}")
-        
-        # Fallback para API 2
+                timeout = max(0.0, pending[0].delay - elapsed) if pending else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = running.pop(task)
+                    value = task.result()
+                    if value:
+                        result.source, result.value = name, value
+                        print(f"✓ TikTok: {name} respondeu em {loop.time() - started:.2f}s")
+                        return result
+            return result
+        finally:
+            # Perdedores: requisições HTTP canceladas (o yt-dlp numa thread só tem o resultado descartado)
+            for task in running:
+                task.cancel()
+            # Liberados por allow() que nem chegaram a começar: devolvem o teste do meio-aberto
+            for provider in pending:
+                source_health.release(provider.name, 'TikTok')
+    
+    async def _attempt(self, provider: Provider, result: RaceResult) -> Any:
+        name = provider.name
+        limit = self.provider_timeout if provider.timeout is None else provider.timeout
+        started = time.perf_counter()
         try:
-            # API 2: SnapTik (backup)
-            api_url = "https://snaptik.app/abc2.php"
-            payload = {
-                'url': f"https://www.tiktok.com/@user/video/{video_id}",
-                'lang': 'en'
-            }
-            
-            response = self.session.post(api_url, data=payload, timeout=15)
-            if response.status_code == 200:
-                # Parse HTML para extrair links de download
-                from bs4 import BeautifulSoup
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # Procura por links de download
-                download_link = soup.find('a', {'class': 'download-file'})
-                if download_link and download_link.get('href'):
-                    return {
-                        'url': f"https://www.tiktok.com/@user/video/{video_id}",
-                        'title': 'TikTok Video',
-                        'description': None,
-                        'thumbnail': None,
-                        'duration': 0,
-                        'uploader': 'Unknown',
-                        'view_count': None,
-                        'download_url': download_link['href'],
-                        'platform': 'TikTok'
-                    }
+            value = await asyncio.wait_for(provider.factory(), limit or None)
+        except asyncio.CancelledError:
+            TIKTOK_PROVIDERS.inc(provider=name, result='cancelled')
+            source_health.release(name, 'TikTok')
+            raise
+        except asyncio.TimeoutError as e:
+            TIKTOK_PROVIDERS.inc(provider=name, result='timeout')
+            print(f"Erro API {name}: sem resposta em {limit:g}s")
+            source_health.record(name, 'TikTok', False, time.perf_counter() - started, e)
+            result.errors[name] = e
+            return None
         except Exception as e:
-            print(f"Erro API SnapTik: {e}")
+            TIKTOK_PROVIDERS.inc(provider=name, result='error')
+            print(f"Erro API {name}: {e}")
+            if not source_health.reached_source(e):
+                source_health.release(name, 'TikTok')
+            else:
+                # Erro do conteúdo (vídeo privado...) conta como resposta da fonte
+                source_health.record(name, 'TikTok', not source_health.is_failure(e), time.perf_counter() - started, e)
+            result.errors[name] = e
+            return None
         
-        return None
+        seconds = time.perf_counter() - started
+        TIKTOK_PROVIDERS.inc(provider=name, result='ok' if value else 'empty')
+        TIKTOK_PROVIDER_LATENCY.observe(seconds, provider=name)
+        source_health.record(name, 'TikTok', bool(value), seconds)
+        return value
     
-    def download_video(self, url: str, output_path: str) -> bool:
-        """Baixa o vídeo diretamente da URL de download"""
-        try:
-            response = self.session.get(url, stream=True, timeout=30)
-            if response.status_code == 200:
-                with open(output_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                return True
-        except Exception as e:
-            print(f"Erro ao baixar vídeo do TikTok: {e}")
-        return False
+    async def get_video_info_async(self, url: str, client=None) -> Optional[Dict[str, Any]]:
+        """Corrida entre as APIs alternativas (sem yt-dlp)"""
+        return (await self.race(self.providers(url, client))).value
+    
+    def get_video_info_api(self, video_id: str) -> Optional[Dict[str, Any]]:
+        """Versão síncrona da corrida para as threads do downloader"""
+        return self._run(self._video_url(video_id))
     
     def get_video_info(self, url: str) -> Optional[Dict[str, Any]]:
         """Método principal para obter informações do vídeo"""
@@ -114,4 +179,112 @@ class TikTokFallback:
         if not video_id:
             return None
         
-        return self.get_video_info_api(video_id)
+        return self._run(url if not video_id.isdigit() else self._video_url(video_id))
+    
+    def _run(self, url: str) -> Optional[Dict[str, Any]]:
+        """Executa a corrida no event loop da aplicação (ou num loop próprio, fora do servidor)"""
+        if self._loop is not None and self._loop.is_running():
+            future = asyncio.run_coroutine_threadsafe(self.get_video_info_async(url), self._loop)
+            return future.result()
+        return asyncio.run(self._run_standalone(url))
+    
+    async def _run_standalone(self, url: str) -> Optional[Dict[str, Any]]:
+        """Sem o loop da aplicação (scripts): cliente HTTP próprio, fechado no final"""
+        import httpx
+        
+        async with httpx.AsyncClient(follow_redirects=True) as client:
+            return await self.get_video_info_async(url, client)
+    
+    @staticmethod
+    def _video_url(video_id: str) -> str:
+        return f"https://www.tiktok.com/@user/video/{video_id}"
+    
+    @staticmethod
+    def _client(client):
+        if client is not None:
+            return client
+        from app.services.http_client import get_http_client
+        return get_http_client()
+    
+    async def _tikwm(self, url: str, client=None) -> Optional[Dict[str, Any]]:
+        """API 1: TikWM (funciona sem login; hd=1 inclui a URL em HD)"""
+        response = await self._client(client).get(
+            "https://www.tikwm.com/api/", params={'url': url, 'hd': 1}, headers=API_HEADERS
+        )
+        if response.status_code != 200:
+            return None
+        
+        data = response.json()
+        if data.get('code') != 0 or not data.get('data'):
+            return None
+        
+        video_data = data['data']
+        video_id = str(video_data.get('id') or self.extract_video_id(url) or '')
+        return {
+            'url': f"https://www.tiktok.com/@{video_data.get('author', {}).get('unique_id', 'user')}/video/{video_id}",
+            'title': video_data.get('title', 'TikTok Video'),
+            'description': video_data.get('title'),
+            'thumbnail': video_data.get('cover', ''),
+            'duration': video_data.get('duration', 0),
+            'uploader': video_data.get('author', {}).get('unique_id', 'Unknown'),
+            'view_count': video_data.get('play_count', 0),
+            'download_url': video_data.get('play', ''),  # URL de download direto
+            'hd_download_url': video_data.get('hdplay') or None,
+            'audio_url': video_data.get('music') or None,  # Áudio em MP3 (downloads só de áudio)
+            'platform': 'TikTok'
+        }
+    
+    async def _snaptik(self, url: str, client=None) -> Optional[Dict[str, Any]]:
+        """API 2: SnapTik (backup); o HTML é lido fora do event loop"""
+        response = await self._client(client).post(
+            "https://snaptik.app/abc2.php", data={'url': url, 'lang': 'en'}, headers=API_HEADERS
+        )
+        if response.status_code != 200:
+            return None
+        
+        download_url = await asyncio.to_thread(self._parse_snaptik, response.text)
+        if not download_url:
+            return None
+        
+        return {
+            'url': url,
+            'title': 'TikTok Video',
+            'description': None,
+            'thumbnail': None,
+            'duration': 0,
+            'uploader': 'Unknown',
+            'view_count': None,
+            'download_url': download_url,
+            'hd_download_url': None,
+            'audio_url': None,
+            'platform': 'TikTok'
+        }
+    
+    @staticmethod
+    def _parse_snaptik(html: str) -> Optional[str]:
+        """Link de download da página do SnapTik"""
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        # Procura por links de download
+        download_link = soup.find('a', {'class': 'download-file'})
+        if download_link and download_link.get('href'):
+            return download_link['href']
+        return None
+    
+    def download_video(self, url: str, output_path: str) -> bool:
+        """Baixa o vídeo diretamente da URL de download (intervalos em paralelo quando a CDN aceita)"""
+        from app.services.direct_fetcher import direct_fetcher, FetchError
+        try:
+            direct_fetcher.fetch(url, Path(output_path), headers=DOWNLOAD_HEADERS)
+            return True
+        except FetchError as e:
+            print(f"Erro ao baixar vídeo do TikTok: {e}")
+        return False
+
+
+# Instância global do fallback do TikTok
+tiktok_fallback = TikTokFallback(
+    hedge_delay=settings.TIKTOK_HEDGE_DELAY_SECONDS,
+    provider_timeout=settings.TIKTOK_PROVIDER_TIMEOUT_SECONDS
+)
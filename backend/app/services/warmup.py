@@ -0,0 +1,84 @@
+"""
+Aquecimento em segundo plano depois do startup.
+
+No cold start (Render acordando a instância), importar o yt-dlp, carregar os
+extractors, procurar o FFmpeg e tentar ler cookies de navegadores custava
+segundos antes de a porta aceitar conexões: até /health esperava. Agora o
+import da aplicação só carrega o necessário para servir requisições e essas
+etapas rodam aqui, depois que o servidor já responde. O mesmo vale para o
+estado (conexão com o Redis, índice do armazenamento, fila em disco e
+limpeza de órfãos): o uvicorn só abre a porta quando o startup termina.
+
+- Etapas síncronas rodam numa thread; coroutines rodam no próprio loop
+- Nada depende do aquecimento: uma requisição que chega antes faz a mesma
+  inicialização sob demanda (os valores são calculados uma única vez)
+- Uma etapa que falha é registrada e não impede as seguintes; se ela é
+  obrigatória (estado), o aquecimento termina como 'failed'
+- /api/health/ready responde 503 até o aquecimento terminar (e se falhou)
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+Step = Tuple[str, Callable[[], Any]]
+
+
+class StartupWarmup:
+    def __init__(self):
+        self.state = 'pending'  # pending -> running -> ready (ou failed)
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.import_seconds: Optional[float] = None  # Import da aplicação (medido em app.main)
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == 'ready'
+
+    def start(self, steps: List[Step], required: Iterable[str] = ()):
+        """Agenda as etapas em segundo plano (não bloqueia o startup)"""
+        self.state = 'running'
+        self.started_at = time.monotonic()
+        self._task = asyncio.create_task(self._run(steps, set(required)))
+
+    async def _run(self, steps: List[Step], required: set):
+        failed = False
+        for name, func in steps:
+            started = time.perf_counter()
+            try:
+                if asyncio.iscoroutinefunction(func):
+                    await func()
+                else:
+                    await asyncio.to_thread(func)
+                self.steps[name] = {'ok': True, 'seconds': round(time.perf_counter() - started, 3)}
+            except Exception as e:
+                self.steps[name] = {'ok': False, 'seconds': round(time.perf_counter() - started, 3), 'error': str(e)}
+                failed = failed or name in required
+                print(f"⚠ Aquecimento: etapa '{name}' falhou: {e}")
+        self.finished_at = time.monotonic()
+        self.state = 'failed' if failed else 'ready'
+        print(f"{'⚠' if failed else '✓'} Aquecimento concluído em {self.finished_at - self.started_at:.2f}s ({self.state})")
+
+    async def stop(self):
+        """Cancela a espera do aquecimento (a etapa em andamento termina na própria thread)"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        total = None
+        if self.started_at is not None:
+            total = round((self.finished_at or time.monotonic()) - self.started_at, 3)
+        return {
+            'state': self.state,
+            'ready': self.ready,
+            'import_seconds': self.import_seconds,
+            'warmup_seconds': total,
+            'steps': dict(self.steps),
+        }
+
+
+# Instância global do aquecimento
+startup_warmup = StartupWarmup()
@@ -0,0 +1,146 @@
+"""
+Pool de instâncias do yt-dlp (YoutubeDL) já configuradas.
+
+Criar um YoutubeDL a cada extração recarrega os extractors e abre sessões
+HTTP novas: cada requisição paga DNS + TCP + TLS de novo para os mesmos
+hosts da plataforma. O pool mantém instâncias ociosas por perfil
+(plataforma + opções) e as reaproveita com as conexões ainda abertas.
+
+- Confinada: uma instância emprestada é usada por uma única thread até voltar
+- Reset entre usos: contadores de download/playlist zerados a cada devolução
+- Instância que terminou com erro, ficou ociosa demais ou atingiu o máximo de
+  usos é fechada (cookies salvos, conexões encerradas) em vez de voltar
+- Downloads também selecionam os formatos com uma instância do pool; só
+  quando o próprio yt-dlp baixa (hooks e nome de arquivo por requisição,
+  fixados na criação) é criada uma instância dedicada
+"""
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Tuple
+
+from app.config import settings
+
+
+PoolKey = Tuple[str, str]
+
+
+class YoutubeDLPool:
+    def __init__(self, max_idle_per_key: int = 4, max_uses: int = 200, idle_seconds: float = 300):
+        self.max_idle_per_key = max_idle_per_key
+        self.max_uses = max_uses
+        self.idle_seconds = idle_seconds
+
+        # (perfil, opções) -> instâncias ociosas (instância, devolvida em, usos)
+        self._idle: Dict[PoolKey, Deque[Tuple[Any, float, int]]] = defaultdict(deque)
+        self._lock = threading.Lock()
+
+        # Contadores
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    @staticmethod
+    def _fingerprint(opts: Dict[str, Any]) -> str:
+        """Opções equivalentes compartilham instâncias"""
+        return json.dumps(opts, sort_keys=True, default=repr)
+
+    @contextmanager
+    def acquire(self, profile: str, opts: Dict[str, Any]) -> Iterator[Any]:
+        """Empresta uma instância configurada com `opts` (criada se não houver ociosa)"""
+        key = (profile, self._fingerprint(opts))
+        ydl, uses = self._checkout(key, opts)
+        ok = False
+        try:
+            yield ydl
+            ok = True
+        finally:
+            self._checkin(key, ydl, uses + 1, ok)
+
+    def _checkout(self, key: PoolKey, opts: Dict[str, Any]) -> Tuple[Any, int]:
+        expired = []
+        found = None
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle[key]
+            while idle:
+                ydl, returned_at, uses = idle.pop()  # Mais recente primeiro: conexões mais novas
+                if now - returned_at > self.idle_seconds:
+                    expired.append(ydl)
+                    continue
+                found = (ydl, uses)
+                self.reused += 1
+                break
+            self.discarded += len(expired)
+
+        for ydl in expired:
+            self._close(ydl)
+
+        if found:
+            return found
+
+        # Importado no primeiro uso: o import do yt-dlp pesa no cold start
+        import yt_dlp
+
+        with self._lock:
+            self.created += 1
+        return yt_dlp.YoutubeDL(dict(opts)), 0
+
+    def _checkin(self, key: PoolKey, ydl: Any, uses: int, ok: bool):
+        if ok and uses < self.max_uses:
+            self._reset(ydl)
+            with self._lock:
+                idle = self._idle[key]
+                if len(idle) < self.max_idle_per_key:
+                    idle.append((ydl, time.monotonic(), uses))
+                    return
+        with self._lock:
+            self.discarded += 1
+        self._close(ydl)
+
+    @staticmethod
+    def _reset(ydl: Any):
+        """Estado por execução do YoutubeDL (as sessões HTTP e os extractors ficam)"""
+        ydl._download_retcode = 0
+        ydl._num_downloads = 0
+        ydl._num_videos = 0
+        ydl._playlist_level = 0
+        ydl._playlist_urls = set()
+        ydl._printed_messages = set()
+
+    @staticmethod
+    def _close(ydl: Any):
+        try:
+            ydl.close()
+        except Exception as e:
+            print(f"⚠ Erro ao fechar instância do yt-dlp: {e}")
+
+    def close(self):
+        """Fecha todas as instâncias ociosas (shutdown)"""
+        with self._lock:
+            instances = [ydl for idle in self._idle.values() for ydl, _, _ in idle]
+            self._idle.clear()
+        for ydl in instances:
+            self._close(ydl)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            idle_by_profile: Dict[str, int] = defaultdict(int)
+            for (profile, _), idle in self._idle.items():
+                idle_by_profile[profile] += len(idle)
+        return {
+            'created': self.created,
+            'reused': self.reused,
+            'discarded': self.discarded,
+            'idle_by_profile': dict(idle_by_profile),
+        }
+
+
+# Instância global do pool
+ydl_pool = YoutubeDLPool(
+    max_idle_per_key=settings.YDL_POOL_MAX_IDLE,
+    max_uses=settings.YDL_POOL_MAX_USES,
+    idle_seconds=settings.YDL_POOL_IDLE_SECONDS
+)
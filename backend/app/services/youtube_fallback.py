@@ -9,7 +9,8 @@ from typing import Optional, Dict, Any
 
 
 class YouTubeFallback:
-    def __init__(self):
+    def __init__(self, timeout: float = 15):
+        self.timeout = timeout
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -44,7 +45,7 @@ class YouTubeFallback:
             
             # Tenta buscar a página do vídeo
             watch_url = f'https://www.youtube.com/watch?v={video_id}'
-            response = self.session.get(watch_url, timeout=15)
+            response = self.session.get(watch_url, timeout=self.timeout)
             
             if response.status_code != 200:
                 print(f"❌ Erro ao acessar página: {response.status_code}")
@@ -52,18 +53,15 @@ class YouTubeFallback:
             
             html = response.text
             
-            # Extrai dados do player usando regex
-            # Procura por ytInitialPlayerResponse que contém todas as infos
-            player_response_match = re.search(
-                r'var ytInitialPlayerResponse\s*=\s*({.+?});',
-                html
-            )
+            # Extrai dados do player: ytInitialPlayerResponse contém todas as infos
+            # (o JSON é lido inteiro a partir do '{'; um regex não-guloso parava no primeiro '};' de uma string)
+            player_response_match = re.search(r'ytInitialPlayerResponse\s*=\s*(?={)', html)
             
             if not player_response_match:
                 print("❌ Não foi possível extrair ytInitialPlayerResponse")
                 return None
             
-            player_data = json.loads(player_response_match.group(1))
+            player_data, _ = json.JSONDecoder().raw_decode(html, player_response_match.end())
             
             # Extrai informações do vídeo
             video_details = player_data.get('videoDetails', {})
@@ -0,0 +1,236 @@
+"""
+Cadeia de estratégias para extrair informações do YouTube: yt-dlp, scraping
+da página (youtube_fallback) e pytubefix (youtube_api_fallback).
+
+- Cada estratégia tem o seu tempo limite, contado de quando ela começa a
+  rodar: uma que trava não segura a cadeia, a próxima começa quando o tempo
+  dela acaba. Com o pool ocupado por estratégias travadas, a estratégia é
+  pulada em vez de esperar na fila (e virar um timeout que não é dela)
+- Todas retornam a mesma estrutura normalizada (as chaves do info do yt-dlp
+  que o VideoInfo usa), então quem chama não sabe de onde veio a resposta
+- A última estratégia que funcionou para a classe do vídeo (shorts, live,
+  regular) vai primeiro por YOUTUBE_STRATEGY_MEMORY_SECONDS: se o scraping
+  barato acabou de funcionar, ele roda antes do yt-dlp
+- Latência e sucesso de cada estratégia ficam no source_health (plataforma
+  'YouTube'), que reordena as demais e pula as de circuito aberto
+"""
+import importlib.util
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.rate_limiter import RateLimitedError
+from app.services.source_health import source_health
+
+
+PLATFORM = 'YouTube'
+
+
+@dataclass
+class YouTubeStrategy:
+    name: str
+    extract: Callable[[str], Optional[Dict[str, Any]]]  # Info no formato do yt-dlp ou None
+    timeout: float
+
+
+def video_class(url: str) -> str:
+    """Classe do vídeo para lembrar a estratégia que funcionou (shorts e lives costumam se comportar diferente)"""
+    lowered = url.lower()
+    if '/shorts/' in lowered:
+        return 'shorts'
+    if '/live/' in lowered:
+        return 'live'
+    return 'regular'
+
+
+def _normalize_format(fmt: Dict[str, Any]) -> Dict[str, Any]:
+    width, height = fmt.get('width'), fmt.get('height')
+    # 'quality' é numérico no yt-dlp e o rótulo ('720p') no scraping e no pytubefix
+    quality = fmt.get('quality') if isinstance(fmt.get('quality'), str) else None
+    return {
+        'format_id': str(fmt['format_id']),
+        'url': fmt.get('url'),
+        'ext': fmt.get('ext') or 'mp4',
+        'format_note': fmt.get('format_note') or quality,
+        'resolution': f"{width}x{height}" if width and height else fmt.get('resolution'),
+        'width': width,
+        'height': height,
+        'filesize': fmt.get('filesize') or fmt.get('filesize_approx'),
+        'fps': fmt.get('fps'),
+        'vcodec': fmt.get('vcodec'),
+        'acodec': fmt.get('acodec'),
+    }
+
+
+def normalize_info(raw: Dict[str, Any], source: str) -> Dict[str, Any]:
+    """Estrutura comum a todas as estratégias"""
+    duration = raw.get('duration')
+    return {
+        'url': raw.get('webpage_url') or raw.get('url'),
+        'title': raw.get('title') or 'Unknown',
+        'description': raw.get('description'),
+        'thumbnail': raw.get('thumbnail'),
+        'duration': int(duration) if duration else None,
+        'uploader': raw.get('uploader') or raw.get('channel') or raw.get('uploader_id'),
+        'uploader_url': raw.get('uploader_url') or raw.get('channel_url'),
+        'view_count': raw.get('view_count'),
+        'filesize_approx': raw.get('filesize') or raw.get('filesize_approx'),
+        'formats': [_normalize_format(fmt) for fmt in raw.get('formats') or [] if fmt.get('format_id')],
+        'source': source,
+    }
+
+
+class YouTubeStrategyChain:
+    def __init__(self, preferred_order: List[str], memory_seconds: float = 1800, max_workers: int = 8):
+        self.preferred_order = preferred_order
+        self.memory_seconds = memory_seconds
+        self.strategies: Dict[str, YouTubeStrategy] = {}
+
+        # Classe do vídeo -> (estratégia, quando funcionou)
+        self._last_success: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        # Estratégia que estoura o tempo fica rodando aqui até terminar; a cadeia segue em frente
+        self.max_workers = max(1, max_workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='mediavid-youtube')
+        self._busy = 0
+
+    def register(self, strategy: YouTubeStrategy):
+        self.strategies[strategy.name] = strategy
+
+    def order(self, url: str) -> List[str]:
+        """Ordem das tentativas: a última que funcionou para a classe, depois as demais pela saúde recente"""
+        names = [name for name in self.preferred_order if name in self.strategies]
+        names += [name for name in self.strategies if name not in names]
+        ordered = source_health.order(PLATFORM, names)
+
+        with self._lock:
+            last = self._last_success.get(video_class(url))
+        if last and time.monotonic() - last[1] < self.memory_seconds and last[0] in ordered:
+            ordered.remove(last[0])
+            ordered.insert(0, last[0])
+        return ordered
+
+    def _run(self, strategy: YouTubeStrategy, url: str, running: threading.Event) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._busy += 1
+        running.set()
+        try:
+            return strategy.extract(url)
+        finally:
+            with self._lock:
+                self._busy -= 1
+
+    def extract(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Tenta as estratégias na ordem até uma responder. Retorna a info normalizada,
+        ou None se todas falharam. Erro do conteúdo (privado, removido) sobe na hora;
+        429 sobe no fim para o rate_limiter reduzir a taxa do YouTube.
+        """
+        errors: Dict[str, BaseException] = {}
+        attempted = False
+        for name in self.order(url):
+            strategy = self.strategies[name]
+            with self._lock:
+                saturated = self._busy >= self.max_workers
+            if saturated:
+                attempted = True
+                print(f"⏭ YouTube: pool ocupado, {name} pulada...")
+                continue
+            if not source_health.allow(name, PLATFORM):
+                continue
+            attempted = True
+
+            running = threading.Event()
+            future = self._pool.submit(self._run, strategy, url, running)
+            # O tempo limite conta de quando a estratégia começa, não da espera na fila do pool
+            if not running.wait(timeout=strategy.timeout) and future.cancel():
+                source_health.release(name, PLATFORM)
+                print(f"⏭ YouTube: {name} não começou em {strategy.timeout:.0f}s (pool ocupado), próxima estratégia...")
+                continue
+            started = time.perf_counter()
+            try:
+                raw = future.result(timeout=strategy.timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                error = TimeoutError(f"{name} sem resposta em {strategy.timeout:.0f}s")
+                source_health.record(name, PLATFORM, False, time.perf_counter() - started, error)
+                print(f"⏱ YouTube: {error}, próxima estratégia...")
+                errors[name] = error
+                continue
+            except Exception as e:
+                content_error = not source_health.is_failure(e)
+                source_health.record(name, PLATFORM, content_error, time.perf_counter() - started, e)
+                if content_error:
+                    raise
+                print(f"❌ YouTube: {name} falhou ({str(e)[:120]}), próxima estratégia...")
+                errors[name] = e
+                continue
+
+            seconds = time.perf_counter() - started
+            if not raw:
+                source_health.record(name, PLATFORM, False, seconds)
+                print(f"❌ YouTube: {name} sem resultado, próxima estratégia...")
+                continue
+
+            source_health.record(name, PLATFORM, True, seconds)
+            with self._lock:
+                self._last_success[video_class(url)] = (name, time.monotonic())
+            print(f"✅ YouTube: {name} respondeu em {seconds:.2f}s")
+            return normalize_info(raw, name)
+
+        if not attempted:
+            raise source_health.unavailable(PLATFORM, list(self.strategies))
+        for error in errors.values():
+            if isinstance(error, RateLimitedError):
+                raise error
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            last = {
+                cls: {'strategy': name, 'age_seconds': round(now - at, 1)}
+                for cls, (name, at) in self._last_success.items()
+                if now - at < self.memory_seconds
+            }
+        return {
+            'strategies': {name: {'timeout': strategy.timeout} for name, strategy in self.strategies.items()},
+            'preferred_order': self.preferred_order,
+            'last_success': last,
+            'busy_workers': self._busy,
+            'max_workers': self.max_workers,
+        }
+
+
+_scraper = None
+
+
+def _scrape(url: str) -> Optional[Dict[str, Any]]:
+    """Scraping da página do vídeo (requests importado só no primeiro uso)"""
+    global _scraper
+    if _scraper is None:
+        from app.services.youtube_fallback import YouTubeFallback
+        # O timeout do requests vale para a conexão e para cada leitura: metade de cada
+        # cabe no tempo da estratégia e a thread termina junto com ela
+        _scraper = YouTubeFallback(timeout=settings.YOUTUBE_SCRAPER_TIMEOUT_SECONDS / 2)
+    return _scraper.get_video_info(url)
+
+
+def _pytubefix(url: str) -> Optional[Dict[str, Any]]:
+    from app.services.youtube_api_fallback import YouTubeApiFallback
+    return YouTubeApiFallback().get_video_info(url)
+
+
+# Instância global da cadeia (o yt-dlp é registrado pelo downloader)
+youtube_strategies = YouTubeStrategyChain(
+    preferred_order=settings.youtube_strategies,
+    memory_seconds=settings.YOUTUBE_STRATEGY_MEMORY_SECONDS,
+    max_workers=settings.INFO_WORKERS * 2
+)
+youtube_strategies.register(YouTubeStrategy('scraper', _scrape, settings.YOUTUBE_SCRAPER_TIMEOUT_SECONDS))
+# pytubefix é opcional: sem o pacote instalado a estratégia fica de fora
+if importlib.util.find_spec('pytubefix') is not None:
+    youtube_strategies.register(YouTubeStrategy('pytubefix', _pytubefix, settings.YOUTUBE_PYTUBEFIX_TIMEOUT_SECONDS))
@@ -0,0 +1,212 @@
+"""
+Resposta de arquivo com suporte a HTTP Range e requisições condicionais.
+
+- Range / multipart/byteranges (retomar downloads, downloads em paralelo por partes)
+- If-Range, If-None-Match, If-Modified-Since
+- ETag e Last-Modified
+- Content-Type correto a partir da extensão
+"""
+import mimetypes
+import os
+import re
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from typing import AsyncIterator, List, Optional, Tuple
+
+import aiofiles
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+
+
+CHUNK_SIZE = 256 * 1024
+
+mimetypes.add_type('audio/mp4', '.m4a')
+mimetypes.add_type('audio/ogg', '.opus')
+mimetypes.add_type('video/webm', '.webm')
+
+RANGE_PATTERN = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+
+def guess_media_type(filename: str) -> str:
+    """Content-Type a partir da extensão do arquivo"""
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def parse_range_header(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Interpreta o cabeçalho Range ('bytes=0-99,200-').
+    Retorna lista de intervalos (início, fim inclusivo), [] se nenhum for
+    satisfatível, ou None se o cabeçalho for inválido (deve ser ignorado).
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec:
+        return None
+
+    ranges = []
+    for part in spec.split(','):
+        match = RANGE_PATTERN.match(part)
+        if not match:
+            return None
+
+        start_str, end_str = match.groups()
+        if not start_str and not end_str:
+            return None
+
+        if not start_str:
+            # Sufixo: últimos N bytes
+            length = int(end_str)
+            if length == 0:
+                continue
+            start, end = max(0, size - length), size - 1
+        else:
+            start = int(start_str)
+            if end_str and int(end_str) < start:
+                return None
+            if start >= size:
+                continue
+            end = min(int(end_str), size - 1) if end_str else size - 1
+
+        ranges.append((start, end))
+
+    return ranges
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Compara If-None-Match / If-Range com o ETag (comparação fraca)"""
+    if header.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in header.split(',')]
+    bare = etag.removeprefix('W/')
+    return any(tag.removeprefix('W/') == bare for tag in candidates)
+
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+async def _iter_file(path: str, start: int, end: int) -> AsyncIterator[bytes]:
+    """Lê o intervalo [start, end] do arquivo em blocos"""
+    remaining = end - start + 1
+    async with aiofiles.open(path, 'rb') as f:
+        await f.seek(start)
+        while remaining > 0:
+            chunk = await f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def _iter_multipart(path: str, ranges: List[Tuple[int, int]], size: int,
+                          media_type: str, boundary: str) -> AsyncIterator[bytes]:
+    for start, end in ranges:
+        yield (
+            f"\r\n--{boundary}\r\n"
+            f"Content-Type: {media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode()
+        async for chunk in _iter_file(path, start, end):
+            yield chunk
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+
+def ranged_file_response(
+    request: Request,
+    path: str,
+    filename: str,
+    media_type: Optional[str] = None,
+    etag: Optional[str] = None,
+    headers: Optional[dict] = None,
+    background: Optional[BackgroundTask] = None,
+) -> Response:
+    """
+    Responde com o arquivo (ou partes dele) conforme os cabeçalhos da requisição.
+    `background` é executado depois do envio (ex: liberar a referência no armazenamento).
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    media_type = media_type or guess_media_type(filename)
+    etag = f'"{etag}"' if etag else f'"{int(stat.st_mtime):x}-{size:x}"'
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+
+    base_headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': last_modified,
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'private, max-age=3600',
+    }
+    base_headers.update(headers or {})
+
+    # Requisições condicionais: cliente já tem a versão atual
+    if_none_match = request.headers.get('if-none-match')
+    if_modified_since = request.headers.get('if-modified-since')
+    if (if_none_match and _etag_matches(if_none_match, etag)) or (
+        not if_none_match and if_modified_since and _not_modified_since(if_modified_since, stat.st_mtime)
+    ):
+        return Response(status_code=304, headers=base_headers, background=background)
+
+    ranges = None
+    range_header = request.headers.get('range')
+    if range_header:
+        # If-Range: só atende o intervalo se o arquivo não mudou desde a primeira parte
+        if_range = request.headers.get('if-range')
+        range_valid = (
+            not if_range
+            or (if_range.strip().startswith(('"', 'W/')) and _etag_matches(if_range, etag))
+            or (not if_range.strip().startswith(('"', 'W/')) and _not_modified_since(if_range, stat.st_mtime))
+        )
+        if range_valid:
+            ranges = parse_range_header(range_header, size)
+
+    if ranges is not None and not ranges:
+        return Response(
+            status_code=416,
+            headers={**base_headers, 'Content-Range': f'bytes */{size}'},
+            background=background
+        )
+
+    is_head = request.method == 'HEAD'
+
+    if not ranges:
+        response_headers = {**base_headers, 'Content-Length': str(size)}
+        if is_head:
+            return Response(status_code=200, headers=response_headers, media_type=media_type, background=background)
+        return StreamingResponse(
+            _iter_file(path, 0, size - 1),
+            status_code=200,
+            media_type=media_type,
+            headers=response_headers,
+            background=background
+        )
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        response_headers = {
+            **base_headers,
+            'Content-Range': f'bytes {start}-{end}/{size}',
+            'Content-Length': str(end - start + 1),
+        }
+        if is_head:
+            return Response(status_code=206, headers=response_headers, media_type=media_type, background=background)
+        return StreamingResponse(
+            _iter_file(path, start, end),
+            status_code=206,
+            media_type=media_type,
+            headers=response_headers,
+            background=background
+        )
+
+    # Vários intervalos: multipart/byteranges
+    boundary = uuid.uuid4().hex
+    return StreamingResponse(
+        _iter_multipart(path, ranges, size, media_type, boundary) if not is_head else iter([]),
+        status_code=206,
+        media_type=f'multipart/byteranges; boundary={boundary}',
+        headers=base_headers,
+        background=background
+    )
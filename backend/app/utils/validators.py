@@ -1,5 +1,72 @@
 import re
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, Tuple
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+
+# Domínios de cada plataforma (comparados pelo hostname, não por substring)
+PLATFORM_DOMAINS = {
+    'YouTube': ('youtube.com', 'youtu.be', 'youtube-nocookie.com'),
+    'Instagram': ('instagram.com', 'instagr.am'),
+    'TikTok': ('tiktok.com',),
+    'Twitter': ('twitter.com', 'x.com', 't.co', 'fxtwitter.com', 'vxtwitter.com', 'fixupx.com'),
+    'Facebook': ('facebook.com', 'fb.watch', 'fb.com'),
+    'Reddit': ('reddit.com', 'redd.it'),
+    'Pinterest': ('pinterest.com', 'pin.it'),
+}
+
+# YouTube TEMPORARIAMENTE DESABILITADO
+DISABLED_PLATFORMS = {'YouTube'}
+
+# Links curtos que só revelam o conteúdo depois do redirecionamento
+SHORT_LINK_PATTERNS = [
+    re.compile(r'^(?:vm|vt)\.tiktok\.com$'),
+    re.compile(r'^t\.co$'),
+    re.compile(r'^fb\.watch$'),
+    re.compile(r'^pin\.it$'),
+]
+SHORT_LINK_PATHS = [
+    ('tiktok.com', re.compile(r'^/t/[\w-]+')),
+    ('facebook.com', re.compile(r'^/share/(?:v|r|p)/[\w-]+')),
+    ('reddit.com', re.compile(r'^/r/[\w-]+/s/[\w-]+')),
+]
+
+# Parâmetros de rastreamento removidos na normalização
+TRACKING_PARAMS = {
+    'igsh', 'igshid', 'img_index', 's', 't', 'si', 'ref', 'ref_src', 'ref_url', 'share_id',
+    'is_from_webapp', 'is_copy_url', 'sender_device', 'sender_web_id', 'web_id', '_r', '_t',
+    'feature', 'fbclid', 'mibextid', 'rdid', 'share_app_id', 'share_link_id', 'context',
+    'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content', 'utm_name',
+}
+
+# Padrões de ID de conteúdo por plataforma (aplicados ao path normalizado)
+CONTENT_ID_PATTERNS = {
+    'Instagram': [
+        re.compile(r'^/(?:[\w.]+/)?(?:p|reel|reels|tv)/([\w-]+)'),
+        re.compile(r'^/stories/[\w.]+/(\d+)'),
+    ],
+    'TikTok': [
+        re.compile(r'/video/(\d+)'),
+        re.compile(r'^/v/(\d+)'),
+        re.compile(r'/photo/(\d+)'),
+    ],
+    'Twitter': [
+        re.compile(r'/status(?:es)?/(\d+)'),
+    ],
+    'Facebook': [
+        re.compile(r'/videos/(?:[\w.-]+/)?(\d+)'),
+        re.compile(r'^/reel/(\d+)'),
+    ],
+    'Reddit': [
+        re.compile(r'/comments/(\w+)'),
+    ],
+    'Pinterest': [
+        re.compile(r'^/pin/(?:[\w-]*--)?(\d+)'),
+    ],
+    'YouTube': [
+        re.compile(r'^/(?:shorts|embed|live|v)/([\w-]{11})'),
+    ],
+}
 
 
 def validate_url(url: str) -> bool:
@@ -14,28 +81,144 @@ def validate_url(url: str) -> bool:
     return url_pattern.match(url) is not None
 
 
+def _parse(url: str):
+    """urlparse tolerante a URLs sem esquema"""
+    if '://' not in url:
+        url = 'https://' + url
+    return urlparse(url.strip())
+
+
+def _hostname(url: str) -> str:
+    """Hostname em minúsculas, sem 'www.' e 'm.'"""
+    host = (_parse(url).hostname or '').lower()
+    for prefix in ('www.', 'm.', 'mobile.', 'web.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return host
+
+
+def _matches_domain(host: str, domain: str) -> bool:
+    return host == domain or host.endswith('.' + domain)
+
+
+def _platform_for_host(host: str) -> str:
+    for platform, domains in PLATFORM_DOMAINS.items():
+        if any(_matches_domain(host, domain) for domain in domains):
+            return platform
+    return 'Unknown'
+
+
 def detect_platform(url: str) -> Optional[str]:
-    """Detecta a plataforma baseada na URL"""
-    url_lower = url.lower()
+    """Detecta a plataforma baseada no domínio da URL"""
+    platform = _platform_for_host(_hostname(url))
+    if platform in DISABLED_PLATFORMS:
+        return 'Unknown'
+    return platform
+
+
+def is_short_link(url: str) -> bool:
+    """Verifica se a URL é um link curto/compartilhamento que precisa ser resolvido"""
+    host = _hostname(url)
+    if any(pattern.match(host) for pattern in SHORT_LINK_PATTERNS):
+        return True
+    path = _parse(url).path
+    return any(
+        _matches_domain(host, domain) and pattern.match(path)
+        for domain, pattern in SHORT_LINK_PATHS
+    )
+
+
+@lru_cache(maxsize=4096)
+def _resolve_short_url(url: str) -> str:
+    """
+    Segue os redirecionamentos de um link curto (HEAD, com GET como reserva).
+    Resultado fica em cache: o destino de um link curto não muda.
+    Exceções não são cacheadas.
+    """
+    import requests
     
-    # Detecta plataformas com padrões específicos
-    # YouTube TEMPORARIAMENTE DESABILITADO
-    # if 'youtube.com' in url_lower or 'youtu.be' in url_lower:
-    #     return 'YouTube'
-    if 'instagram.com' in url_lower:
-        return 'Instagram'
-    elif 'tiktok.com' in url_lower:
-        return 'TikTok'
-    elif 'twitter.com' in url_lower or 'x.com' in url_lower:
-        return 'Twitter'
-    elif 'facebook.com' in url_lower or 'fb.watch' in url_lower:
-        return 'Facebook'
-    elif 'reddit.com' in url_lower:
-        return 'Reddit'
-    elif 'pinterest.com' in url_lower or 'pin.it' in url_lower:
-        return 'Pinterest'
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    }
+    response = requests.head(url, headers=headers, allow_redirects=True, timeout=5)
+    if response.status_code >= 400 or response.url == url:
+        # Alguns encurtadores não aceitam HEAD
+        response = requests.get(url, headers=headers, allow_redirects=True, timeout=5, stream=True)
+        response.close()
+    return response.url
+
+
+def resolve_short_url(url: str) -> str:
+    """Resolve um link curto; retorna a própria URL se falhar"""
+    import requests
     
-    return 'Unknown'
+    try:
+        return _resolve_short_url(url)
+    except requests.RequestException as e:
+        print(f"⚠ Não foi possível resolver link curto {url}: {e}")
+        return url
+
+
+def normalize_url(url: str) -> str:
+    """Normaliza a URL: domínio sem www, sem parâmetros de rastreamento, sem fragmento"""
+    parsed = _parse(url)
+    host = _hostname(url)
+    path = re.sub(r'/{2,}', '/', parsed.path).rstrip('/') or '/'
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=False)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith('utm_')
+    )
+    normalized = f"https://{host}{path}"
+    if query:
+        normalized += '?' + urlencode(query)
+    return normalized
+
+
+def canonicalize_url(url: str, resolve_short_links: bool = True) -> Tuple[str, str]:
+    """
+    Retorna a chave canônica (plataforma, id_do_conteúdo) de uma URL.
+    
+    Variações do mesmo conteúdo (x.com/twitter.com, ?s=20, ?igsh=..., links
+    curtos vm.tiktok.com, etc) geram a mesma chave. Quando o ID não é
+    reconhecido, usa a URL normalizada como ID.
+    """
+    if resolve_short_links and is_short_link(url):
+        url = resolve_short_url(url)
+
+    host = _hostname(url)
+    platform = _platform_for_host(host)
+    parsed = _parse(url)
+    path = re.sub(r'/{2,}', '/', parsed.path)
+    query = dict(parse_qsl(parsed.query))
+
+    # IDs que ficam na query string
+    if platform == 'YouTube':
+        if host == 'youtu.be' and len(path.strip('/')) >= 11:
+            return platform, path.strip('/')[:11]
+        if query.get('v'):
+            return platform, query['v'][:11]
+    if platform == 'Facebook':
+        if query.get('v'):
+            return platform, query['v']
+        if query.get('story_fbid'):
+            return platform, query['story_fbid']
+    if platform == 'Reddit' and host == 'redd.it' and path.strip('/'):
+        return platform, path.strip('/').split('/')[0].lower()
+
+    for pattern in CONTENT_ID_PATTERNS.get(platform, []):
+        match = pattern.search(path)
+        if match and match.groups():
+            content_id = match.group(1)
+            # IDs do Reddit não diferenciam maiúsculas
+            return platform, content_id.lower() if platform == 'Reddit' else content_id
+
+    return platform, normalize_url(url)
+
+
+def canonical_key(url: str, resolve_short_links: bool = True) -> str:
+    """Chave canônica em formato texto: 'Plataforma:id' (usada em caches e deduplicação)"""
+    platform, content_id = canonicalize_url(url, resolve_short_links)
+    return f"{platform}:{content_id}"
 
 
 def format_filesize(size_bytes: Optional[int]) -> str:
@@ -0,0 +1,130 @@
+"""
+Benchmark do download direto (app/services/direct_fetcher.py): uma conexão
+vs. intervalos de bytes em paralelo.
+
+Sem argumentos, usa um servidor HTTP local que limita a taxa por conexão
+(como as CDNs) e aceita Range. --drop faz o servidor derrubar algumas
+conexões no meio para exercitar a retomada de intervalos.
+Com uma URL real, mede contra a CDN de verdade.
+
+Uso:
+    python benchmark_direct_fetch.py                       # servidor local, 32MB a 4MB/s por conexão
+    python benchmark_direct_fetch.py --size-mb 64 --rate-mb 2 --drop 0.2
+    python benchmark_direct_fetch.py URL
+"""
+import argparse
+import hashlib
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Adiciona o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.direct_fetcher import DirectFetcher
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    payload = b''
+    rate = 4 * 1024 * 1024  # bytes/s por conexão
+    drop = 0.0  # probabilidade de derrubar a conexão no meio da resposta
+
+    def do_GET(self):
+        total = len(self.payload)
+        start, end = 0, total - 1
+        header = self.headers.get('Range')
+        if header and header.startswith('bytes='):
+            first, _, last = header[len('bytes='):].partition('-')
+            start = int(first)
+            end = min(int(last), total - 1) if last else total - 1
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{total}')
+        else:
+            self.send_response(200)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+
+        drop_at = None
+        if end - start > 1024 * 1024 and random.random() < self.drop:
+            drop_at = random.randint(start, end)
+
+        block = 64 * 1024
+        position = start
+        while position <= end:
+            chunk = self.payload[position:min(position + block, end + 1)]
+            if drop_at is not None and position + len(chunk) > drop_at:
+                self.close_connection = True
+                return
+            self.wfile.write(chunk)
+            position += len(chunk)
+            time.sleep(len(chunk) / self.rate)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+def start_local_server(size: int, rate: float, drop: float) -> str:
+    _Handler.payload = os.urandom(size)
+    _Handler.rate = rate
+    _Handler.drop = drop
+    server = _Server(('127.0.0.1', 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/video.mp4"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download direto: uma conexão vs. intervalos em paralelo")
+    parser.add_argument('url', nargs='?', help="URL de mídia (padrão: servidor local)")
+    parser.add_argument('--size-mb', type=float, default=32)
+    parser.add_argument('--rate-mb', type=float, default=4, help="Limite por conexão do servidor local (MB/s)")
+    parser.add_argument('--drop', type=float, default=0.0, help="Probabilidade de o servidor local derrubar uma resposta")
+    parser.add_argument('-c', '--connections', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('-n', '--iterations', type=int, default=3)
+    options = parser.parse_args()
+
+    url = options.url or start_local_server(
+        int(options.size_mb * 1024 * 1024), options.rate_mb * 1024 * 1024, options.drop
+    )
+    expected = hashlib.sha256(_Handler.payload).hexdigest() if not options.url else None
+
+    fetcher = DirectFetcher(max_connections=max(options.connections), min_segment_bytes=1024 * 1024)
+    dest = Path(tempfile.gettempdir()) / 'mediavid-direct-fetch.bin'
+
+    print(f"{url}\n")
+    baseline = None
+    for connections in options.connections:
+        timings = []
+        retries = 0
+        for _ in range(options.iterations):
+            result = fetcher.fetch(url, dest, connections=connections)
+            timings.append(result.seconds)
+            retries += result.retries
+            if expected and hashlib.sha256(dest.read_bytes()).hexdigest() != expected:
+                raise SystemExit(f"Arquivo corrompido com {connections} conexões")
+        median = statistics.median(timings)
+        baseline = baseline or median
+        print(f"{connections} conexões: mediana={median:6.2f}s  "
+              f"{result.size / median / 1024 / 1024:7.1f}MB/s  ganho={baseline / median:4.1f}x  retomadas={retries}")
+
+    dest.unlink(missing_ok=True)
+    fetcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark do cold start: tempo de import de app.main e tempo até o primeiro
+/health e até /api/health/ready (aquecimento concluído).
+
+Cada medição roda num interpretador novo, como um processo recém-acordado
+no Render. Também verifica que os módulos pesados (yt-dlp, requests, bs4,
+browser_cookie3, pytubefix) não são carregados no import da aplicação.
+
+Uso:
+    python benchmark_startup.py            # 5 execuções
+    python benchmark_startup.py -n 10 --top 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+HEAVY_MODULES = ('yt_dlp', 'requests', 'bs4', 'browser_cookie3', 'pytubefix')
+
+# Executado no processo filho: t0 = instante em que o pai iniciou o processo
+CHILD = r"""
+import json, sys, time
+t0 = float(sys.argv[1])
+started = time.time()
+import app.main
+imported = time.time()
+heavy = [name for name in %r if name in sys.modules]
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    assert client.get('/health').status_code == 200
+    health = time.time()
+    while client.get('/api/health/ready').status_code != 200:
+        time.sleep(0.01)
+    ready = time.time()
+    warmup = client.get('/api/health/ready').json()
+print(json.dumps({
+    'interpreter': started - t0,
+    'import': imported - started,
+    'health': health - t0,
+    'ready': ready - t0,
+    'heavy': heavy,
+    'steps': {name: step['seconds'] for name, step in warmup['steps'].items()},
+}))
+""" % (HEAVY_MODULES,)
+
+
+def child_env() -> dict:
+    env = dict(os.environ)
+    # Pasta temporária isolada e sem fila em disco: mede só a inicialização
+    env.setdefault('TEMP_DOWNLOAD_PATH', os.path.join(tempfile.gettempdir(), 'mediavid-startup-bench'))
+    env.setdefault('QUEUE_PERSISTENCE', 'false')
+    return env
+
+
+def run_once() -> dict:
+    t0 = time.time()
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD, str(t0)],
+        cwd=BACKEND_DIR, env=child_env(), capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Processo de medição falhou:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def top_imports(limit: int):
+    """Módulos com maior tempo acumulado de import (python -X importtime)"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app.main'],
+        cwd=BACKEND_DIR, env=child_env(), capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(cumulative), depth, name.strip()))
+    # Só os dois primeiros níveis: abaixo disso é detalhe interno das bibliotecas
+    rows = [row for row in rows if row[1] <= 2]
+    rows.sort(reverse=True)
+    return rows[:limit]
+
+
+def summary(label: str, values):
+    values = [v * 1000 for v in values]
+    print(f"{label:<22} mediana={statistics.median(values):8.1f} ms  "
+          f"min={min(values):8.1f} ms  max={max(values):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de startup da API")
+    parser.add_argument('-n', '--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help="Módulos mais lentos a listar")
+    options = parser.parse_args()
+
+    runs = [run_once() for _ in range(options.runs)]
+
+    print(f"{options.runs} execuções (interpretador novo a cada uma)\n")
+    summary('interpretador', [r['interpreter'] for r in runs])
+    summary('import app.main', [r['import'] for r in runs])
+    summary('primeiro /health', [r['health'] for r in runs])
+    summary('pronto (aquecido)', [r['ready'] for r in runs])
+
+    print("\nEtapas do aquecimento (fora do caminho do /health):")
+    for step in runs[0]['steps']:
+        summary(f"  {step}", [r['steps'][step] for r in runs])
+
+    heavy = sorted({name for r in runs for name in r['heavy']})
+    print(f"\nMódulos pesados carregados no import: {', '.join(heavy) if heavy else 'nenhum'}")
+
+    print(f"\nImports mais lentos (acumulado):")
+    for cumulative, depth, name in top_imports(options.top):
+        print(f"  {cumulative / 1000:8.1f} ms  {'  ' * depth}{name}")
+
+    if heavy:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Microbenchmark: extração de metadados com YoutubeDL novo a cada chamada
+vs. instâncias reaproveitadas do pool (app/services/ydl_pool.py).
+
+Sem argumentos, usa um servidor HTTP local (keep-alive) com uma página que
+contém um vídeo: mede o custo de criar a instância + abrir a conexão.
+Com URLs reais, inclui DNS/TLS da plataforma e mostra o ganho em produção.
+
+Uso:
+    python benchmark_ydl_pool.py                      # servidor local
+    python benchmark_ydl_pool.py -n 20 URL [URL ...]  # plataformas reais
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Adiciona o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import yt_dlp
+
+from app.services.ydl_pool import YoutubeDLPool
+
+
+PAGE = (
+    b"<html><head><title>clip</title>"
+    b'<meta property="og:video" content="/clip.mp4">'
+    b"</head><body>" + b"<p>MediaVid</p>" * 200 + b"</body></html>"
+)
+
+OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'skip_download': True,
+    'socket_timeout': 30,
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Mantém a conexão aberta entre requisições
+    connections = set()
+
+    def do_GET(self):
+        _Handler.connections.add(self.client_address)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Conexões fechadas pelo cliente (instâncias descartadas) não interessam aqui
+        pass
+
+
+def start_local_server() -> str:
+    server = _Server(('127.0.0.1', 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/watch"
+
+
+def run(label: str, extract, urls, iterations: int):
+    timings = []
+    for _ in range(iterations):
+        for url in urls:
+            started = time.perf_counter()
+            extract(url)
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{label:<8} n={len(timings):<4} mediana={statistics.median(timings):8.2f} ms  "
+          f"p95={p95:8.2f} ms  média={statistics.mean(timings):8.2f} ms")
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="YoutubeDL novo vs. pool")
+    parser.add_argument('urls', nargs='*', help="URLs para extrair (padrão: servidor local)")
+    parser.add_argument('-n', '--iterations', type=int, default=50)
+    options = parser.parse_args()
+
+    local = not options.urls
+    urls = options.urls or [start_local_server()]
+    iterations = options.iterations if local else min(options.iterations, 20)
+
+    def fresh(url):
+        with yt_dlp.YoutubeDL(dict(OPTS)) as ydl:
+            ydl.extract_info(url, download=False)
+
+    pool = YoutubeDLPool()
+
+    def pooled(url):
+        with pool.acquire('benchmark', OPTS) as ydl:
+            ydl.extract_info(url, download=False)
+
+    # Aquecimento (imports internos do yt-dlp, resolução DNS)
+    fresh(urls[0])
+    pooled(urls[0])
+
+    print(f"{len(urls)} URL(s), {iterations} iterações\n")
+    _Handler.connections.clear()
+    fresh_median = run('novo', fresh, urls, iterations)
+    fresh_connections = len(_Handler.connections)
+    _Handler.connections.clear()
+    pooled_median = run('pool', pooled, urls, iterations)
+    pooled_connections = len(_Handler.connections)
+    pool.close()
+
+    print(f"\nGanho na mediana: {fresh_median / pooled_median:.1f}x ({fresh_median - pooled_median:.2f} ms por extração)")
+    if local:
+        print(f"Conexões TCP abertas: novo={fresh_connections}, pool={pooled_connections}")
+    print(f"Pool: {pool.stats()}")
+
+
+if __name__ == "__main__":
+    main()
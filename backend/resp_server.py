@@ -0,0 +1,320 @@
+"""
+Servidor RESP mínimo (subconjunto do Redis) para testar localmente o
+estado compartilhado entre vários workers sem instalar o Redis.
+
+Suporta os comandos usados pelo backend 'redis' (strings com expiração,
+hashes, SET NX, pub/sub) e alguns de diagnóstico. Tudo fica em memória.
+
+Uso:
+    python resp_server.py [--port 6390]
+
+    # Em outros terminais (dois workers compartilhando a fila e o progresso)
+    SHARED_STATE_BACKEND=redis REDIS_URL=redis://localhost:6390/0 uvicorn app.main:app --port 8000 --workers 2
+"""
+import argparse
+import asyncio
+import fnmatch
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+
+
+class RespError(Exception):
+    pass
+
+
+class Push(list):
+    """Mensagem de pub/sub (tipo push no RESP3, array no RESP2)"""
+
+
+def encode(value, resp3: bool = False) -> bytes:
+    """Codifica uma resposta no protocolo RESP2 (ou RESP3 depois de HELLO 3)"""
+    if value is None:
+        return b"_\r\n" if resp3 else b"$-1\r\n"
+    if isinstance(value, RespError):
+        return f"-{value}\r\n".encode()
+    if isinstance(value, bool):
+        return b":1\r\n" if value else b":0\r\n"
+    if isinstance(value, int):
+        return f":{value}\r\n".encode()
+    if isinstance(value, str):
+        # Respostas de status (+OK, +PONG)
+        return f"+{value}\r\n".encode()
+    if isinstance(value, bytes):
+        return b"$" + str(len(value)).encode() + b"\r\n" + value + b"\r\n"
+    if isinstance(value, dict):
+        if resp3:
+            return b"%" + str(len(value)).encode() + b"\r\n" + b"".join(
+                encode(k, resp3) + encode(v, resp3) for k, v in value.items()
+            )
+        return encode([part for pair in value.items() for part in pair])
+    if isinstance(value, (list, tuple)):
+        prefix = b">" if resp3 and isinstance(value, Push) else b"*"
+        return prefix + str(len(value)).encode() + b"\r\n" + b"".join(encode(item, resp3) for item in value)
+    raise TypeError(f"Tipo não suportado: {type(value)}")
+
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    """Lê um comando (array de bulk strings ou comando inline)"""
+    line = await reader.readline()
+    if not line:
+        return None
+    line = line.rstrip(b"\r\n")
+    if not line.startswith(b"*"):
+        return line.split()
+
+    count = int(line[1:])
+    args = []
+    for _ in range(count):
+        header = (await reader.readline()).rstrip(b"\r\n")
+        if not header.startswith(b"$"):
+            raise RespError("ERR Protocol error: expected '$'")
+        length = int(header[1:])
+        data = await reader.readexactly(length + 2)
+        args.append(data[:-2])
+    return args
+
+
+class RespServer:
+    def __init__(self):
+        self.strings: Dict[bytes, bytes] = {}
+        self.hashes: Dict[bytes, Dict[bytes, bytes]] = {}
+        self.expires: Dict[bytes, float] = {}
+        # Canal -> conexões inscritas (writer, usa RESP3)
+        self.channels: Dict[bytes, Dict[asyncio.StreamWriter, bool]] = defaultdict(dict)
+
+    # Expiração
+
+    def _expired(self, key: bytes) -> bool:
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.time():
+            self._delete(key)
+            return True
+        return False
+
+    def _delete(self, key: bytes) -> bool:
+        self.expires.pop(key, None)
+        found = self.strings.pop(key, None) is not None
+        found = self.hashes.pop(key, None) is not None or found
+        return found
+
+    def _exists(self, key: bytes) -> bool:
+        return not self._expired(key) and (key in self.strings or key in self.hashes)
+
+    # Comandos
+
+    def execute(self, args: List[bytes]):
+        name = args[0].decode().upper()
+        handler = getattr(self, f"cmd_{name.lower()}", None)
+        if handler is None:
+            return RespError(f"ERR unknown command '{name}'")
+        try:
+            return handler(*args[1:])
+        except TypeError:
+            return RespError(f"ERR wrong number of arguments for '{name.lower()}' command")
+        except RespError as e:
+            return e
+
+    def cmd_ping(self, message: bytes = None):
+        return message if message is not None else "PONG"
+
+    def cmd_echo(self, message: bytes):
+        return message
+
+    def cmd_select(self, index: bytes):
+        return "OK"
+
+    def cmd_client(self, *args):
+        # CLIENT SETINFO / SETNAME enviados pelos clientes na conexão
+        return "OK"
+
+    def cmd_info(self, *args):
+        return b"# Server\r\nredis_version:7.0.0-resp_server\r\n"
+
+    def cmd_get(self, key: bytes):
+        if self._expired(key):
+            return None
+        if key in self.hashes:
+            return RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return self.strings.get(key)
+
+    def cmd_set(self, key: bytes, value: bytes, *options: bytes):
+        ttl = None
+        nx = xx = False
+        options = [option.upper() for option in options]
+        i = 0
+        while i < len(options):
+            option = options[i]
+            if option in (b"EX", b"PX"):
+                amount = int(options[i + 1])
+                ttl = amount if option == b"EX" else amount / 1000
+                i += 2
+                continue
+            if option == b"NX":
+                nx = True
+            elif option == b"XX":
+                xx = True
+            else:
+                raise RespError("ERR syntax error")
+            i += 1
+
+        exists = self._exists(key)
+        if (nx and exists) or (xx and not exists):
+            return None
+
+        self._delete(key)
+        self.strings[key] = value
+        if ttl is not None:
+            self.expires[key] = time.time() + ttl
+        return "OK"
+
+    def cmd_del(self, *keys: bytes):
+        return sum(1 for key in keys if not self._expired(key) and self._delete(key))
+
+    def cmd_exists(self, *keys: bytes):
+        return sum(1 for key in keys if self._exists(key))
+
+    def cmd_expire(self, key: bytes, seconds: bytes):
+        if not self._exists(key):
+            return 0
+        self.expires[key] = time.time() + int(seconds)
+        return 1
+
+    def cmd_ttl(self, key: bytes):
+        if not self._exists(key):
+            return -2
+        deadline = self.expires.get(key)
+        return -1 if deadline is None else max(0, int(deadline - time.time()))
+
+    def cmd_keys(self, pattern: bytes):
+        keys = [key for key in list(self.strings) + list(self.hashes) if not self._expired(key)]
+        return [key for key in keys if fnmatch.fnmatchcase(key.decode(), pattern.decode())]
+
+    def cmd_flushdb(self, *args):
+        self.strings.clear()
+        self.hashes.clear()
+        self.expires.clear()
+        return "OK"
+
+    cmd_flushall = cmd_flushdb
+
+    def _hash(self, key: bytes, create: bool = False) -> Optional[Dict[bytes, bytes]]:
+        self._expired(key)  # Remove a chave se já expirou
+        if key in self.strings:
+            raise RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        if create:
+            return self.hashes.setdefault(key, {})
+        return self.hashes.get(key)
+
+    def cmd_hset(self, key: bytes, *pairs: bytes):
+        if not pairs or len(pairs) % 2:
+            raise TypeError
+        data = self._hash(key, create=True)
+        added = 0
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            added += field not in data
+            data[field] = value
+        return added
+
+    def cmd_hget(self, key: bytes, field: bytes):
+        data = self._hash(key)
+        return data.get(field) if data else None
+
+    def cmd_hgetall(self, key: bytes):
+        return dict(self._hash(key) or {})
+
+    def cmd_hdel(self, key: bytes, *fields: bytes):
+        data = self._hash(key)
+        if not data:
+            return 0
+        removed = sum(1 for field in fields if data.pop(field, None) is not None)
+        if not data:
+            self.hashes.pop(key, None)
+        return removed
+
+    def cmd_hlen(self, key: bytes):
+        return len(self._hash(key) or {})
+
+    def cmd_publish(self, channel: bytes, message: bytes):
+        receivers = list(self.channels.get(channel, {}).items())
+        for writer, resp3 in receivers:
+            if writer.is_closing():
+                self.channels[channel].pop(writer, None)
+                continue
+            writer.write(encode(Push([b"message", channel, message]), resp3))
+        return len(receivers)
+
+    # Conexões
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscriptions: Set[bytes] = set()
+        resp3 = False
+        try:
+            while True:
+                try:
+                    args = await read_command(reader)
+                except RespError as e:
+                    writer.write(encode(e))
+                    break
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if args is None:
+                    break
+                if not args:
+                    continue
+
+                name = args[0].upper()
+                if name == b"QUIT":
+                    writer.write(encode("OK"))
+                    break
+
+                if name == b"HELLO":
+                    version = int(args[1]) if len(args) > 1 else 2
+                    if version not in (2, 3):
+                        writer.write(encode(RespError("NOPROTO unsupported protocol version")))
+                    else:
+                        resp3 = version == 3
+                        writer.write(encode({
+                            b"server": b"resp_server", b"version": b"7.0.0", b"proto": version,
+                            b"mode": b"standalone", b"role": b"master", b"modules": [],
+                        }, resp3))
+                elif name == b"SUBSCRIBE":
+                    for channel in args[1:]:
+                        subscriptions.add(channel)
+                        self.channels[channel][writer] = resp3
+                        writer.write(encode(Push([b"subscribe", channel, len(subscriptions)]), resp3))
+                elif name == b"UNSUBSCRIBE":
+                    for channel in (args[1:] or list(subscriptions)):
+                        subscriptions.discard(channel)
+                        self.channels[channel].pop(writer, None)
+                        writer.write(encode(Push([b"unsubscribe", channel, len(subscriptions)]), resp3))
+                elif subscriptions and name == b"PING" and not resp3:
+                    writer.write(encode([b"pong", args[1] if len(args) > 1 else b""]))
+                else:
+                    writer.write(encode(self.execute(args), resp3))
+
+                await writer.drain()
+        finally:
+            for channel in subscriptions:
+                self.channels[channel].pop(writer, None)
+            writer.close()
+
+
+async def serve(host: str, port: int):
+    server = RespServer()
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f"✓ Servidor RESP em {host}:{port} (use REDIS_URL=redis://{host}:{port}/0)")
+    async with listener:
+        await listener.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor RESP mínimo para testes locais")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    options = parser.parse_args()
+
+    try:
+        asyncio.run(serve(options.host, options.port))
+    except KeyboardInterrupt:
+        pass
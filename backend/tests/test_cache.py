@@ -0,0 +1,73 @@
+"""
+Single-flight do TTLCache: cancelar quem iniciou a carga não pode
+envenenar os que aguardam a mesma chave.
+"""
+import asyncio
+
+from app.services.cache import TTLCache
+
+
+def test_owner_cancelled_does_not_poison_waiters():
+    cache = TTLCache(name="test")
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "info"
+
+    async def scenario():
+        owner = asyncio.create_task(cache.aget_or_load("k", loader))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.aget_or_load("k", loader))
+        await asyncio.sleep(0.01)
+
+        # Dono desiste (timeout do prefetch, cliente desconectou)
+        owner.cancel()
+        try:
+            await owner
+        except asyncio.CancelledError:
+            pass
+
+        return await waiter
+
+    assert asyncio.run(scenario()) == "info"
+    assert len(calls) == 1
+    # A carga terminou mesmo sem o dono e ficou no cache
+    assert cache.get("k") == "info"
+
+
+def test_owner_timeout_keeps_loading_into_cache():
+    cache = TTLCache(name="test")
+
+    async def loader():
+        await asyncio.sleep(0.05)
+        return "info"
+
+    async def scenario():
+        try:
+            await asyncio.wait_for(cache.aget_or_load("k", loader), timeout=0.01)
+        except asyncio.TimeoutError:
+            pass
+        await asyncio.sleep(0.1)
+
+    asyncio.run(scenario())
+    assert cache.get("k") == "info"
+
+
+def test_loader_error_reaches_waiters():
+    cache = TTLCache(name="test")
+
+    async def loader():
+        await asyncio.sleep(0.01)
+        raise ValueError("falhou")
+
+    async def scenario():
+        results = await asyncio.gather(
+            cache.aget_or_load("k", loader), cache.aget_or_load("k", loader), return_exceptions=True
+        )
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert cache.get("k") is None
@@ -0,0 +1,34 @@
+"""
+Gravação em lote da fila: uma escrita que falha no SQLite não pode perder
+as alterações; o lote volta para os pendentes e é gravado na nova tentativa.
+"""
+import asyncio
+
+from app.services.queue_manager import DownloadQueueManager
+from app.services.queue_store import QueueStore
+from app.services.shared_state import MemoryBackend
+
+
+def test_failed_store_write_keeps_batch_for_retry(tmp_path):
+    store = QueueStore(tmp_path / "queue.db")
+    manager = DownloadQueueManager(backend=MemoryBackend(), store=store)
+    manager.SYNC_RETRY_SECONDS = 0.05
+
+    async def scenario():
+        # Tabela some: o INSERT falha e o lote é desfeito
+        store._conn.execute("DROP TABLE queue_items")
+        item_id = manager.add_to_queue('https://www.tiktok.com/@a/video/1', None, 'mp4', False)
+        await asyncio.sleep(0.2)
+        assert item_id in manager._dirty
+        assert store.errors >= 1
+
+        store._conn.execute(
+            "CREATE TABLE queue_items (id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        await asyncio.sleep(0.3)
+        assert not manager._dirty
+        return item_id
+
+    item_id = asyncio.run(scenario())
+    assert item_id in store.load()
+    store.close()
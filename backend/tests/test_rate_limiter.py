@@ -0,0 +1,62 @@
+"""
+Espera máxima no rate limiter: depois de um 429 com bloqueio longo, quem
+chega não fica preso na fila; recebe na hora um RateLimitWaitExceeded com
+o Retry-After previsto, e a rota responde 429.
+"""
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.rate_limiter import RateLimiter, RateLimitWaitExceeded, rate_limiter
+
+
+def _limiter() -> RateLimiter:
+    return RateLimiter(host_rate=10.0, host_burst=20, ramp_after=10, max_backoff=300)
+
+
+def test_blocked_bucket_fails_fast_with_retry_after():
+    limiter = _limiter()
+    limiter.report('TikTok', throttled=True, retry_after=120)
+
+    started = time.monotonic()
+    with pytest.raises(RateLimitWaitExceeded) as info:
+        asyncio.run(limiter.acquire('TikTok', max_wait=0.5))
+
+    assert time.monotonic() - started < 0.5
+    assert 100 < info.value.retry_after <= 120
+    assert limiter.snapshot()['platform:TikTok']['rejected'] == 1
+
+
+def test_queued_callers_give_up_at_max_wait():
+    limiter = _limiter()
+    bucket = limiter.bucket('platform:TikTok')
+    bucket.tokens = 0
+    bucket.rate = 1.0  # próximo token em ~1s
+
+    async def scenario():
+        # O primeiro segura a trava esperando o token; o segundo desiste na fila
+        first = asyncio.ensure_future(limiter.acquire('TikTok', max_wait=5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(RateLimitWaitExceeded):
+            await limiter.acquire('TikTok', max_wait=0.2)
+        await first
+
+    asyncio.run(scenario())
+    assert bucket.acquired == 1
+    assert bucket.waiting == 0
+
+
+def test_info_route_returns_429_with_retry_after():
+    from app.main import app
+
+    rate_limiter.report('Reddit', throttled=True, retry_after=90)
+    try:
+        with TestClient(app) as client:
+            response = client.post('/api/video/info', json={'url': 'https://www.reddit.com/r/test/comments/abc123/video/'})
+    finally:
+        rate_limiter.bucket('platform:Reddit').blocked_until = 0.0
+
+    assert response.status_code == 429
+    assert 60 < int(response.headers['retry-after']) <= 90
@@ -0,0 +1,36 @@
+"""
+Corrida dos provedores do TikTok: um provedor liberado pelo circuito que
+não chega a começar (outro venceu antes do atraso dele) devolve o teste
+do meio-aberto.
+"""
+import asyncio
+
+from app.services.source_health import HALF_OPEN, source_health
+from app.services.tiktok_fallback import Provider, TikTokFallback
+
+
+def _half_open(name: str):
+    state = source_health._state(name, 'TikTok')
+    state.state = HALF_OPEN
+    state.probing = False
+
+
+def test_provider_that_never_started_releases_probe_slot():
+    _half_open('test-late')
+
+    async def fast():
+        return {'title': 'ok'}
+
+    async def late():
+        raise AssertionError("não deveria começar")
+
+    fallback = TikTokFallback(hedge_delay=5)
+    result = asyncio.run(fallback.race([
+        Provider('test-fast', 0, fast),
+        Provider('test-late', 5, late),
+    ]))
+
+    assert result.source == 'test-fast'
+    assert source_health._state('test-late', 'TikTok').probing is False
+    # O próximo pedido ainda pode testar a fonte
+    assert source_health.allow('test-late', 'TikTok')